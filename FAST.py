@@ -23,7 +23,7 @@ try:
             manage = Manage()
             app_path = './gui_program.py'
             try:
-                manage.checkForUpdates()
+                manage.checkForUpdatesInBackground()
                 manage.startApp(app_path)
             except Exception as e:
                 print(e)
@@ -0,0 +1,70 @@
+"""Tabulated DDF benchmark
+
+Compares damage from pre-tabulated DDF curves (UDF ddf_resolution) against
+the exact piecewise-linear interpolation of get_fused_losses: runtime and
+maximum deviation (observed vs documented bound) per curve family.
+
+Usage:
+    python benchmarks/ddf_tabulation.py [structures] [resolution]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hazpy.flood.modules.UDF import UDF
+
+
+def get_damage(udf, depth, keys, repeat=3):
+    """Time get_fused_losses (best of repeat)
+
+    Args:
+        udf (UDF): UDF instance
+        depth (array): Depth in structure
+        keys (dict): Curve key fields
+        repeat (int, optional): Number of runs. Defaults to 3.
+
+    Returns:
+        tuple: Damage arrays & seconds
+    """
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        damage = udf.get_fused_losses(depth, keys)
+        elapsed.append(time.perf_counter() - start)
+    return damage, min(elapsed)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    resolution = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    lut_dir = os.path.join(root, 'Lookuptables')
+    rng = np.random.default_rng(0)
+    for flood_type in ['Riverine', 'Coastal A', 'Coastal V']:
+        exact = UDF(None, lut_dir, None, [], 'False', [], flood_type)
+        tabulated = UDF(None, lut_dir, None, [], 'False', [], flood_type, ddf_resolution=resolution)
+        soids = exact.get_ddf_table('building')['keys'][0].values
+        occs = exact.get_ddf_table('inventory')['keys'][0].values
+        # Categorical keys (as from the structure store) so the timing is the curve lookup
+        keys = {'SOID': pd.Categorical(rng.choice(soids, size)), 'Occ': pd.Categorical(rng.choice(occs, size))}
+        depth = rng.uniform(-6, 30, size).round(6)
+        exact_damage, exact_time = get_damage(exact, depth, keys)
+        tabulated_damage, tabulated_time = get_damage(tabulated, depth, keys)
+        print(f'\n{flood_type}: {size} structures, {resolution} ft resolution')
+        print(f'  exact {exact_time:.3f} s, tabulated {tabulated_time:.3f} s ({exact_time / tabulated_time:.1f}x)')
+        for family, field in [('building', 'BldgDmgPct'), ('content', 'ContDmgPct'), ('inventory', 'InvDmgPct')]:
+            deviation = np.nanmax(np.abs(exact_damage[field] - tabulated_damage[field]))
+            # Tabulated damage is rounded to 0.01
+            bound = tabulated.get_ddf_table(family)['max_deviation'] + 0.005
+            print(f'  {family}: max deviation {deviation:.4f} (bound {bound:.4f})')
+        table_size = sum(tabulated.get_ddf_table(family)['tabulated'].nbytes for family in ['building', 'content', 'inventory'])
+        print(f'  tabulated curves: {table_size / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
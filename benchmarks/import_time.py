@@ -0,0 +1,124 @@
+"""Import time benchmark
+
+Times the import statements of the GUI & hazpy.flood entry points in fresh
+interpreters (best & median of --repeat runs) and lists the heavy dependencies
+each one loads, so lazy imports can be checked: the GUI should show its window
+without waiting for pandas, geopandas, rasterio, pyodbc, GDAL...
+
+Usage:
+    python benchmarks/import_time.py [--repeat 5] [--output import_time.json] [--importtime]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Name: import statement
+STATEMENTS = {
+    'hazpy.flood': 'import hazpy.flood',
+    'hazpy.flood.modules': 'import hazpy.flood.modules',
+    'Flood()': 'from hazpy.flood import Flood; Flood()',
+    'GUI views': 'import python_env.views',
+    'UDF (modules)': 'from hazpy.flood import UDF',
+    'UDF (legacy)': 'from hazpy.flood.udf import UDF',
+    'PELV': 'from hazpy.flood.modules import PELV',
+}
+HEAVY_MODULES = ['numpy', 'pandas', 'geopandas', 'shapely', 'rasterio', 'pyodbc', 'requests', 'openpyxl', 'osgeo', 'utm']
+
+# Runs in a fresh interpreter: time the statement & list the heavy modules it loaded
+SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+error = None
+try:
+    exec({statement!r})
+except Exception as e:
+    error = f'{{type(e).__name__}}: {{e}}'
+seconds = time.perf_counter() - start
+loaded = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'seconds': seconds, 'loaded': loaded, 'error': error}}))
+'''
+
+
+def time_import(statement, repeat=5, importtime=False):
+    """Time an import statement in fresh interpreters
+
+    Args:
+        statement (str): Import statement
+        repeat (int, optional): Number of runs. Defaults to 5.
+        importtime (bool, optional): Also get the slowest modules (python -X importtime). Defaults to False.
+
+    Returns:
+        dict: Best & median seconds, heavy modules loaded, error & slowest modules
+    """
+    runs = []
+    slowest = None
+    for run in range(repeat):
+        command = [sys.executable]
+        if importtime and run == 0:
+            command += ['-X', 'importtime']
+        command += ['-c', SCRIPT.format(statement=statement, heavy=HEAVY_MODULES)]
+        process = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+        if importtime and run == 0:
+            slowest = get_slowest(process.stderr)
+            continue
+        runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+    seconds = [run['seconds'] for run in runs]
+    return {
+        'statement': statement,
+        'best_s': round(min(seconds), 4),
+        'median_s': round(statistics.median(seconds), 4),
+        'loaded': runs[-1]['loaded'],
+        'error': runs[-1]['error'],
+        'slowest': slowest,
+    }
+
+
+def get_slowest(importtime_output, count=5):
+    """Get the slowest top-level imports from python -X importtime output
+
+    Args:
+        importtime_output (str): stderr of python -X importtime
+        count (int, optional): Number of modules. Defaults to 5.
+
+    Returns:
+        list: (module, cumulative seconds) of the slowest imports
+    """
+    modules = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Top-level imports are not indented
+        if not name.startswith('  '):
+            modules.append((name.strip(), int(cumulative_us) / 1e6))
+    return sorted(modules, key=lambda module: -module[1])[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='hazpy.flood import time benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each statement (fresh interpreters)')
+    parser.add_argument('--output', default=None, help='Results JSON path')
+    parser.add_argument('--importtime', action='store_true', help='Show the slowest imports of each statement')
+    args = parser.parse_args()
+    results = {}
+    print(f"{'entry point':<22}{'best (s)':>10}{'median (s)':>12}  heavy modules loaded")
+    for name, statement in STATEMENTS.items():
+        result = time_import(statement, args.repeat, args.importtime)
+        results[name] = result
+        loaded = ', '.join(result['loaded']) or '-'
+        print(f"{name:<22}{result['best_s']:10.3f}{result['median_s']:12.3f}  {loaded}" + (f"  ({result['error']})" if result['error'] else ''))
+        if result['slowest']:
+            print('    ' + ', '.join(f'{module} {seconds:.3f}' for module, seconds in result['slowest']))
+    if args.output:
+        with open(args.output, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+        print(f'\nResults: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,451 @@
+"""Golden-output parity harness
+
+Runs the legacy row-loop engine (hazpy/flood/udf.py), the pandas/rasterio
+engine (hazpy/flood/modules/UDF.py) and its fast variants on the same
+synthetic inputs (see synthetic.py), aligns the outputs by FltyId and reports
+the maximum absolute & relative difference of every common column against a
+tolerance policy, with the runtime of each engine side by side.
+
+Engines are registered in ENGINES (name: runner, tolerance policy); a new
+engine only needs a runner returning the path of its output CSV. The first
+available engine of --reference is the reference (legacy needs GDAL & utm).
+
+Usage:
+    python benchmarks/parity.py [--size 2000] [--grid-size 512] [--engines legacy,modules,...]
+        [--reference legacy,modules] [--udf udf.csv --grid depth.tif] [--work folder]
+        [--output parity.json] [--tolerances overrides.json] [--verbose]
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+from pipeline import get_commit, get_environment, prepare_run_folder
+
+# Legacy fmap (positional): candidate UDF column names of each entry ('' if not supplied)
+LEGACY_FIELDS = [
+    ['UserDefinedFltyId', 'FltyId'],
+    ['OccupancyClass', 'Occ'],
+    ['Cost'],
+    ['Area'],
+    ['NumStories'],
+    ['FoundationType'],
+    ['FirstFloorHt'],
+    ['ContentCost'],
+    ['BldgDamageFnID'],
+    ['ContDamageFnId'],
+    ['InvDamageFnId'],
+    ['InvCost'],
+    ['SOI', 'SOID'],
+    ['Latitude', 'latitude'],
+    ['Longitude', 'longitude'],
+    ['flC'],
+]
+
+# Output columns named differently by the engines
+COLUMN_ALIASES = {
+    'UserDefinedFltyId': 'FltyId',
+    'OccupancyClass': 'Occ',
+    'BDDF_ID': 'BldgDamageFnID',
+}
+
+# Tolerance rules: exact match, or |diff| <= atol + rtol * |basis| (basis defaults to the reference value)
+EXACT = {'exact': True}
+TOLERANCES = {
+    'default': {
+        'columns': {
+            'Occ': EXACT,
+            'SOID': EXACT,
+            'BldgDamageFnID': EXACT,
+            'CDDF_ID': EXACT,
+            'IDDF_ID': EXACT,
+            'DebrisID': EXACT,
+            'GridName': EXACT,
+            'flExp': EXACT,
+            'Restor_Days_Min': EXACT,
+            'Restor_Days_Max': EXACT,
+            'Depth_Grid': {'atol': 1e-5, 'rtol': 1e-6},
+            'Depth_in_Struc': {'atol': 1e-5, 'rtol': 1e-6},
+            # Depth is written with 6 decimals: 1e-6 ft times the steepest DDF segment
+            'BldgDmgPct': {'atol': 1e-4, 'rtol': 0},
+            'ContDmgPct': {'atol': 1e-4, 'rtol': 0},
+            'InvDmgPct': {'atol': 1e-4, 'rtol': 0},
+            'BldgLossUSD': {'atol': 0.01, 'rtol': 1e-6, 'basis': 'Cost'},
+            'ContentCostUSD': {'atol': 0.01, 'rtol': 1e-9},
+            'ContentLossUSD': {'atol': 0.01, 'rtol': 1e-6, 'basis': 'ContentCostUSD'},
+            'InventoryCostUSD': {'atol': 0.01, 'rtol': 1e-9},
+            'InventoryLossUSD': {'atol': 0.01, 'rtol': 1e-6, 'basis': 'InventoryCostUSD'},
+        },
+        # Any other column (inputs passed through, debris)
+        'numeric': {'atol': 1e-6, 'rtol': 1e-9},
+        'text': EXACT,
+    },
+}
+# Tabulated DDF curves: damage within the documented tabulation bound (see benchmarks/ddf_tabulation.py),
+# losses within the same share of their cost basis
+TOLERANCES['tabulated'] = copy.deepcopy(TOLERANCES['default'])
+TOLERANCES['tabulated']['columns'].update({
+    'BldgDmgPct': {'atol': 0.4, 'rtol': 0},
+    'ContDmgPct': {'atol': 0.4, 'rtol': 0},
+    'InvDmgPct': {'atol': 0.4, 'rtol': 0},
+    'BldgLossUSD': {'atol': 0.01, 'rtol': 0.004, 'basis': 'Cost'},
+    'ContentLossUSD': {'atol': 0.01, 'rtol': 0.004, 'basis': 'ContentCostUSD'},
+    'InventoryLossUSD': {'atol': 0.01, 'rtol': 0.004, 'basis': 'InventoryCostUSD'},
+})
+
+
+def get_legacy_fmap(columns):
+    """Get the legacy fmap (16 UDF column names, '' if not supplied) from the UDF columns
+
+    Args:
+        columns (list): UDF column names
+
+    Returns:
+        list: Legacy fmap
+    """
+    return [next((name for name in names if name in columns), '') for names in LEGACY_FIELDS]
+
+
+def run_legacy(udf_path, grid, run_folder):
+    """Run the legacy engine (hazpy/flood/udf.py)
+
+    Args:
+        udf_path (str): UDF CSV path
+        grid (str): Depth grid path
+        run_folder (str): Run folder (current directory)
+
+    Returns:
+        str: Output CSV path
+    """
+    from hazpy.flood.udf import UDF as LegacyUDF
+
+    results_dir = os.path.join(run_folder, 'legacy')
+    os.makedirs(results_dir, exist_ok=True)
+    os.makedirs(os.path.join(run_folder, 'Log'), exist_ok=True)
+    fmap = get_legacy_fmap(list(pd.read_csv(udf_path, nrows=0).columns))
+    logger = logging.getLogger('FAST')
+    handlers = list(logger.handlers)
+    try:
+        completed, message = LegacyUDF.flood_damage(udf_path, os.path.join(ROOT, 'Lookuptables'), results_dir, [grid], 'False', fmap)
+    finally:
+        # flood_damage adds a log file handler on every call
+        for handler in logger.handlers[len(handlers):]:
+            handler.close()
+            logger.removeHandler(handler)
+    if not completed:
+        raise RuntimeError(f'legacy engine failed after {message} records')
+    udf_root = os.path.basename(udf_path).split('.')[0]
+    grid_root = os.path.basename(grid).split('.')[0]
+    return os.path.join(results_dir, f'{udf_root}_{grid_root}.csv')
+
+
+def get_modules_runner(**options):
+    """Get a runner of the pandas/rasterio engine (hazpy/flood/modules/UDF.py)
+
+    Args:
+        options (optional): UDF options (e.g. sparse, dedup, ddf_resolution)
+
+    Returns:
+        function: Runner (udf_path, grid, run_folder) returning the output CSV path
+    """
+    def run_modules(udf_path, grid, run_folder):
+        from hazpy.flood.modules.UDF import UDF
+
+        fmap = list(pd.read_csv(udf_path, nrows=0).columns)
+        udf = UDF(udf_path, os.path.join(run_folder, 'Lookuptables'), run_folder, [grid], 'False', fmap, 'Riverine', **options)
+        udf.get_flood_damage()
+        report = udf.get_run_report()
+        if report['info'].get('status') != 'completed':
+            raise RuntimeError(report['info'].get('error') or 'modules engine failed')
+        return os.path.join(run_folder, 'UDF', 'output', 'standard', f'{udf.get_grid_name(grid)}.csv')
+    return run_modules
+
+
+# Engine name: (runner, tolerance policy)
+ENGINES = {
+    'legacy': (run_legacy, 'default'),
+    'modules': (get_modules_runner(), 'default'),
+    'modules-dataframe': (get_modules_runner(sparse=False), 'default'),
+    'modules-nodedup': (get_modules_runner(sparse=False, dedup=False), 'default'),
+    'modules-tabulated': (get_modules_runner(ddf_resolution=0.01), 'tabulated'),
+}
+
+
+def run_engine(name, udf_path, grid, run_folder, verbose=False):
+    """Run an engine & read its output
+
+    Args:
+        name (str): Engine name (see ENGINES)
+        udf_path (str): UDF CSV path
+        grid (str): Depth grid path
+        run_folder (str): Run folder
+        verbose (bool, optional): Show the engine output. Defaults to False.
+
+    Returns:
+        tuple: Run record (status, wall_s, rows, path, error) & output dataframe (None if not available)
+    """
+    runner, policy = ENGINES[name]
+    record = {'engine': name, 'policy': policy, 'status': None, 'wall_s': None, 'rows': None, 'path': None, 'error': None}
+    cwd = os.getcwd()
+    os.chdir(run_folder)
+    output = sys.stdout if verbose else io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            path = runner(udf_path, grid, run_folder)
+        record['wall_s'] = round(time.perf_counter() - start, 6)
+        df = read_output(path)
+        record.update({'status': 'completed', 'rows': len(df), 'path': path})
+        return record, df
+    except ImportError as e:
+        record.update({'status': 'unavailable', 'error': str(e)})
+    except Exception as e:
+        record.update({'status': 'failed', 'error': f'{type(e).__name__}: {e}'})
+    finally:
+        os.chdir(cwd)
+    return record, None
+
+
+def read_output(path):
+    """Read an engine output CSV with normalized column names & values
+
+    Args:
+        path (str): Output CSV path
+
+    Returns:
+        dataframe: Output (as text, repeated columns dropped, GridName without extension)
+    """
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, skipinitialspace=True)
+    # pandas renames repeated columns (e.g. CDDF_ID.1)
+    df = df[[column for column in df.columns if column.rsplit('.', 1)[0] not in df.columns or '.' not in column]]
+    df = df.rename(columns=COLUMN_ALIASES)
+    df = df.apply(lambda column: column.str.strip())
+    if 'GridName' in df.columns:
+        df['GridName'] = df['GridName'].map(lambda name: os.path.splitext(name)[0])
+    return df
+
+
+def compare_column(reference, other, rule, basis=None):
+    """Compare a column of two aligned outputs
+
+    Args:
+        reference (series): Reference values (text)
+        other (series): Engine values (text)
+        rule (dict): Tolerance rule
+        basis (series, optional): Reference values of the tolerance basis column. Defaults to None.
+
+    Returns:
+        dict: Kind, max abs & rel difference, number of rows out of tolerance & first such row position
+    """
+    ref_values = pd.to_numeric(reference.replace('', np.nan), errors='coerce').values
+    other_values = pd.to_numeric(other.replace('', np.nan), errors='coerce').values
+    ref_text = reference.values != ''
+    other_text = other.values != ''
+    numeric = np.array_equal(~np.isnan(ref_values), ref_text) and np.array_equal(~np.isnan(other_values), other_text)
+    result = {'kind': 'numeric' if numeric else 'text', 'max_abs': None, 'max_rel': None}
+    if numeric:
+        both = ~np.isnan(ref_values) & ~np.isnan(other_values)
+        diff = np.abs(ref_values - other_values)
+        scale = np.abs(ref_values)
+        rel = np.divide(diff, scale, out=np.where(diff > 0, np.inf, 0.0), where=scale > 0)
+        if both.any():
+            result['max_abs'] = float(diff[both].max())
+            result['max_rel'] = float(rel[both].max())
+        # Missing on one side only never matches
+        within = np.isnan(ref_values) & np.isnan(other_values)
+        if rule.get('exact'):
+            within |= both & (diff == 0)
+        else:
+            tolerance_basis = scale if basis is None else np.abs(pd.to_numeric(basis.replace('', np.nan), errors='coerce').fillna(0).values)
+            within |= both & (diff <= rule['atol'] + rule['rtol'] * tolerance_basis)
+    else:
+        if not rule.get('exact'):
+            rule = EXACT
+        within = reference.values == other.values
+    rows = np.flatnonzero(~within)
+    result.update({'rule': rule, 'mismatches': int(len(rows)), 'first_mismatch': int(rows[0]) if len(rows) else None})
+    return result
+
+
+def compare_outputs(reference, other, policy):
+    """Align two outputs by FltyId & compare their common columns
+
+    Args:
+        reference (dataframe): Reference output
+        other (dataframe): Engine output
+        policy (dict): Tolerance policy
+
+    Returns:
+        dict: Row alignment counts, per-column comparison & number of violating columns
+    """
+    reference = reference.drop_duplicates('FltyId')
+    other = other.drop_duplicates('FltyId')
+    merged = reference.merge(other, on='FltyId', how='inner', suffixes=('_ref', '_engine'))
+    common = [column for column in reference.columns if column in other.columns and column != 'FltyId']
+    result = {
+        'aligned_rows': len(merged),
+        'only_reference': int((~reference['FltyId'].isin(other['FltyId'])).sum()),
+        'only_engine': int((~other['FltyId'].isin(reference['FltyId'])).sum()),
+        'only_reference_columns': [column for column in reference.columns if column not in other.columns],
+        'only_engine_columns': [column for column in other.columns if column not in reference.columns],
+        'columns': {},
+    }
+    for column in common:
+        rule = policy['columns'].get(column)
+        basis = None
+        if rule is not None and rule.get('basis') in common:
+            basis = merged[f"{rule['basis']}_ref"]
+        if rule is None:
+            numeric = pd.to_numeric(merged[f'{column}_ref'].replace('', np.nan), errors='coerce').notna().any()
+            rule = policy['numeric'] if numeric else policy['text']
+        comparison = compare_column(merged[f'{column}_ref'], merged[f'{column}_engine'], rule, basis)
+        if comparison['first_mismatch'] is not None:
+            row = merged.iloc[comparison['first_mismatch']]
+            comparison['first_mismatch'] = {'FltyId': row['FltyId'], 'reference': row[f'{column}_ref'], 'engine': row[f'{column}_engine']}
+        result['columns'][column] = comparison
+    result['violations'] = sum(1 for comparison in result['columns'].values() if comparison['mismatches'])
+    if result['only_reference'] or result['only_engine']:
+        result['violations'] += 1
+    return result
+
+
+def get_policy(name, overrides=None):
+    """Get a tolerance policy with optional overrides
+
+    Args:
+        name (str): Policy name (see TOLERANCES)
+        overrides (dict, optional): Column rules by policy name (or 'all'). Defaults to None.
+
+    Returns:
+        dict: Tolerance policy
+    """
+    policy = copy.deepcopy(TOLERANCES[name])
+    for key in ['all', name]:
+        policy['columns'].update((overrides or {}).get(key, {}))
+    return policy
+
+
+def print_comparison(name, comparison):
+    """Print the per-column differences of an engine
+
+    Args:
+        name (str): Engine name
+        comparison (dict): Comparison (see compare_outputs)
+    """
+    print(f"\n{name}: {comparison['aligned_rows']} rows aligned by FltyId, {comparison['only_reference']} only in reference, "
+          f"{comparison['only_engine']} only in {name}")
+    for key in ['only_reference_columns', 'only_engine_columns']:
+        if comparison[key]:
+            print(f"  {key.replace('_', ' ')}: {', '.join(comparison[key])}")
+    print(f"  {'column':<18}{'kind':<9}{'max abs':>14}{'max rel':>12}  {'tolerance':<34}{'out':>7}")
+    for column, result in comparison['columns'].items():
+        rule = result['rule']
+        if rule.get('exact'):
+            tolerance = 'exact'
+        else:
+            tolerance = f"{rule['atol']:g} + {rule['rtol']:g}*|{rule.get('basis', 'ref')}|"
+        max_abs = f"{result['max_abs']:.6g}" if result['max_abs'] is not None else '-'
+        max_rel = f"{result['max_rel']:.3g}" if result['max_rel'] is not None else '-'
+        flag = ' <' if result['mismatches'] else ''
+        print(f"  {column:<18}{result['kind']:<9}{max_abs:>14}{max_rel:>12}  {tolerance:<34}{result['mismatches']:>7}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UDF engine parity harness')
+    parser.add_argument('--size', type=int, default=2000, help='Synthetic structure count')
+    parser.add_argument('--grid-size', type=int, default=512, help='Synthetic depth grid width & height in pixels')
+    parser.add_argument('--engines', default=','.join(ENGINES), help='Engines to run (see ENGINES)')
+    parser.add_argument('--reference', default='legacy,modules', help='Reference engine (first available)')
+    parser.add_argument('--udf', default=None, help='UDF CSV instead of the synthetic one')
+    parser.add_argument('--grid', default=None, help='Depth grid instead of the synthetic one')
+    parser.add_argument('--work', default=None, help='Work folder for inputs & outputs. Defaults to a temporary folder.')
+    parser.add_argument('--output', default=None, help='Results JSON path. Defaults to <work>/parity.json')
+    parser.add_argument('--tolerances', default=None, help='JSON of column rules by policy name (or "all") overriding TOLERANCES')
+    parser.add_argument('--verbose', action='store_true', help='Show the engine output')
+    args = parser.parse_args()
+    engines = [engine.strip() for engine in args.engines.split(',')]
+    unknown = [engine for engine in engines if engine not in ENGINES]
+    if unknown:
+        parser.error(f"unknown engine(s) {', '.join(unknown)}, choose from {', '.join(ENGINES)}")
+    overrides = None
+    if args.tolerances:
+        with open(args.tolerances) as tolerances_file:
+            overrides = json.load(tolerances_file)
+    work = args.work or tempfile.mkdtemp(prefix='fast-parity-')
+    inputs = os.path.join(work, 'inputs')
+    os.makedirs(inputs, exist_ok=True)
+    udf_path = os.path.abspath(args.udf) if args.udf else os.path.join(inputs, f'udf-{args.size}.csv')
+    grid = os.path.abspath(args.grid) if args.grid else os.path.join(inputs, f'depth-{args.grid_size}.tif')
+    if not os.path.exists(udf_path):
+        synthetic.make_udf(udf_path, args.size)
+    if not os.path.exists(grid):
+        synthetic.make_depth_grid(grid, args.grid_size)
+
+    runs, outputs = [], {}
+    for engine in engines:
+        print(f'Running {engine}...')
+        # One run folder per engine (<work>/<engine>/run): the recorded output paths stay valid
+        run_folder = prepare_run_folder(os.path.join(work, engine))
+        record, df = run_engine(engine, udf_path, grid, run_folder, args.verbose)
+        runs.append(record)
+        if df is not None:
+            outputs[engine] = df
+
+    candidates = [engine.strip() for engine in args.reference.split(',')]
+    reference = next((engine for engine in candidates if engine in outputs), None)
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': get_commit(),
+        'environment': get_environment(),
+        'config': {'udf': udf_path, 'grid': grid, 'engines': engines, 'reference': reference},
+        'runs': runs,
+        'comparisons': {},
+    }
+    violations = 0
+    if reference is None:
+        print(f'\nNo reference engine available ({args.reference})')
+        violations += 1
+    else:
+        print(f'\nReference: {reference}')
+        for engine, df in outputs.items():
+            if engine == reference:
+                continue
+            record = next(run for run in runs if run['engine'] == engine)
+            comparison = compare_outputs(outputs[reference], df, get_policy(record['policy'], overrides))
+            results['comparisons'][engine] = comparison
+            print_comparison(engine, comparison)
+            violations += comparison['violations']
+    reference_time = next((run['wall_s'] for run in runs if run['engine'] == reference), None)
+    print(f"\n{'engine':<20}{'status':<13}{'wall (s)':>10}{'speedup':>9}{'rows':>10}{'violations':>12}")
+    for record in runs:
+        if reference_time and record['wall_s']:
+            record['speedup'] = round(reference_time / record['wall_s'], 3)
+        wall = f"{record['wall_s']:10.2f}" if record['wall_s'] is not None else ' ' * 10
+        speedup = f"{record['speedup']:8.2f}x" if record.get('speedup') else ' ' * 9
+        engine_violations = results['comparisons'].get(record['engine'], {}).get('violations', '')
+        print(f"{record['engine']:<20}{record['status']:<13}{wall}{speedup}{record['rows'] or '':>10}{engine_violations:>12}  {record['error'] or ''}")
+    output = args.output or os.path.join(work, 'parity.json')
+    with open(output, 'w') as results_file:
+        json.dump(results, results_file, indent=2, default=str)
+    print(f'\nResults: {output}')
+    if violations:
+        print(f'{violations} column(s) out of tolerance')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""Pipeline benchmark suite
+
+Runs the standard, AAL & PELV (local tract file) analyses of UDF on synthetic
+inputs (see synthetic.py) for a range of structure counts and records the
+per-stage wall & CPU time, rows & peak RSS of each run (UDF run report). The
+results are saved as JSON with the commit & environment, together with the
+scaling exponent of each stage (slope of log time vs log structures), so runs
+of different versions can be compared (--compare) and plotted (--plot).
+
+Usage:
+    python benchmarks/pipeline.py [--sizes 1000,10000,100000] [--grid-size 2048] [--tile-size 256]
+        [--analyses standard,aal,pelv] [--work folder] [--output results.json]
+        [--compare previous.json] [--threshold 0.2] [--plot scaling.png]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+from hazpy.flood.modules.UDF import UDF
+
+RETURN_PERIODS = ['10', '50', '100', '500']
+# Depth multiplier of the synthetic grid of each return period
+RETURN_PERIOD_SCALES = [0.6, 0.85, 1.0, 1.25]
+ANALYSIS_TYPES = {
+    'standard': None,
+    'aal': 'Average Annualized Loss (AAL)',
+    'pelv': 'Average Annualized Loss (AAL) with PELV',
+}
+PELV_CURVES = os.path.join('Lookuptables', 'BCS-Flood-PELV-Curves-50-DC.xlsx')
+
+
+def get_commit():
+    """Get the git commit of the tree (with a -dirty suffix for local changes)
+
+    Returns:
+        str: Commit hash (None outside a git repository)
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except Exception:
+        return None
+
+
+def get_environment():
+    """Get the platform & package versions
+
+    Returns:
+        dict: Platform, processor, CPU count & versions
+    """
+    import rasterio
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'rasterio': rasterio.__version__,
+    }
+
+
+def prepare_inputs(work, sizes, grid_size, tile_size):
+    """Generate (or reuse) the synthetic inputs in the work folder
+
+    Args:
+        work (str): Work folder
+        sizes (list): Structure counts
+        grid_size (int): Depth grid width & height in pixels
+        tile_size (int): GeoTIFF block size in pixels
+
+    Returns:
+        dict: Paths of the tracts, depth grids (by return period) & UDFs (by size)
+    """
+    inputs = os.path.join(work, 'inputs')
+    os.makedirs(inputs, exist_ok=True)
+    tract_ids = None
+    if os.path.exists(os.path.join(ROOT, PELV_CURVES)):
+        tract_ids = pd.read_excel(os.path.join(ROOT, PELV_CURVES), sheet_name='PELV A', engine='openpyxl')['tract'].astype(str).values
+    tracts_path = os.path.join(inputs, 'tracts.geojson')
+    tracts = synthetic.make_tracts(tracts_path, tract_ids=tract_ids)
+    grids = {}
+    for return_period, scale in zip(RETURN_PERIODS, RETURN_PERIOD_SCALES):
+        path = os.path.join(inputs, f'depth-{grid_size}-{tile_size}-{return_period}.tif')
+        if not os.path.exists(path):
+            print(f'Generating {os.path.basename(path)}...')
+            synthetic.make_depth_grid(path, grid_size, tile_size, scale=scale)
+        grids[return_period] = path
+    udfs = {}
+    for size in sizes:
+        path = os.path.join(inputs, f'udf-{size}.csv')
+        if not os.path.exists(path):
+            print(f'Generating {os.path.basename(path)}...')
+            synthetic.make_udf(path, size, tracts=tracts)
+        udfs[size] = path
+    return {'tracts': tracts_path, 'grids': grids, 'udfs': udfs}
+
+
+def prepare_run_folder(work):
+    """Create the run folder (UDF writes to ./UDF/output & reads ./Lookuptables)
+
+    Args:
+        work (str): Work folder
+
+    Returns:
+        str: Run folder
+    """
+    run_folder = os.path.join(work, 'run')
+    for sub_folder in ['standard', 'aal', 'pelv']:
+        os.makedirs(os.path.join(run_folder, 'UDF', 'output', sub_folder), exist_ok=True)
+    lookup_tables = os.path.join(run_folder, 'Lookuptables')
+    if not os.path.exists(lookup_tables):
+        try:
+            os.symlink(os.path.join(ROOT, 'Lookuptables'), lookup_tables, target_is_directory=True)
+        except OSError:
+            shutil.copytree(os.path.join(ROOT, 'Lookuptables'), lookup_tables)
+    return run_folder
+
+
+def run_analysis(analysis, udf_path, inputs, run_folder, verbose=False):
+    """Run one analysis & collect its run report
+
+    Args:
+        analysis (str): standard, aal or pelv
+        udf_path (str): UDF CSV path
+        inputs (dict): Synthetic inputs (see prepare_inputs)
+        run_folder (str): Run folder
+        verbose (bool, optional): Show the UDF output. Defaults to False.
+
+    Returns:
+        dict: Run report (status skipped without the PELV curves)
+    """
+    if analysis == 'pelv' and not os.path.exists(os.path.join(ROOT, PELV_CURVES)):
+        return {'info': {'status': 'skipped', 'error': f'{PELV_CURVES} not found'}, 'totals': {}, 'stages': []}
+    fmap = list(pd.read_csv(udf_path, nrows=0).columns)
+    if analysis == 'aal':
+        depth_grids, return_periods = [inputs['grids'][rp] for rp in RETURN_PERIODS], RETURN_PERIODS
+    else:
+        depth_grids, return_periods = [inputs['grids']['100']], None
+    cwd = os.getcwd()
+    os.chdir(run_folder)
+    try:
+        udf = UDF(
+            udf_path,
+            os.path.join(run_folder, 'Lookuptables'),
+            run_folder,
+            depth_grids,
+            'False',
+            fmap,
+            'Riverine',
+            ANALYSIS_TYPES[analysis],
+            return_periods,
+            tracts=inputs['tracts'] if analysis == 'pelv' else None,
+        )
+        output = sys.stdout if verbose else io.StringIO()
+        with contextlib.redirect_stdout(output):
+            udf.get_flood_damage()
+        return udf.get_run_report()
+    finally:
+        os.chdir(cwd)
+
+
+def get_scaling(runs):
+    """Fit the scaling exponent of the total & each stage (log wall time vs log structures)
+
+    Args:
+        runs (list): Run results
+
+    Returns:
+        dict: Analysis: stage: exponent (1 is linear)
+    """
+    scaling = {}
+    for analysis in dict.fromkeys(run['analysis'] for run in runs):
+        completed = [run for run in runs if run['analysis'] == analysis and run['status'] == 'completed']
+        if len(completed) < 2:
+            continue
+        stages = {'total': [(run['structures'], run['wall_s']) for run in completed]}
+        for run in completed:
+            for stage, total in run['stages'].items():
+                stages.setdefault(stage, []).append((run['structures'], total['wall_s']))
+        scaling[analysis] = {}
+        for stage, points in stages.items():
+            points = [(size, wall) for size, wall in points if wall > 0]
+            if len({size for size, wall in points}) >= 2:
+                sizes, walls = np.log(np.array(points)).T
+                scaling[analysis][stage] = round(float(np.polyfit(sizes, walls, 1)[0]), 3)
+    return scaling
+
+
+def compare(results, previous, threshold, min_seconds=0.05):
+    """Print the per-stage time ratios against previous results & flag regressions
+
+    Args:
+        results (dict): Current results
+        previous (dict): Previous results (same format)
+        threshold (float): Relative slowdown flagged as a regression (0.2 is 20 %)
+        min_seconds (float, optional): Ignore stages faster than this in both runs. Defaults to 0.05.
+
+    Returns:
+        list: Regressions (analysis, structures, stage, previous & current seconds)
+    """
+    regressions = []
+    previous_runs = {(run['analysis'], run['structures']): run for run in previous['runs']}
+    print(f"\nComparison with {previous.get('commit')} (ratio = current / previous)")
+    for run in results['runs']:
+        before = previous_runs.get((run['analysis'], run['structures']))
+        if before is None or run['status'] != 'completed' or before['status'] != 'completed':
+            continue
+        stages = [('total', before['wall_s'], run['wall_s'])]
+        stages += [(stage, before['stages'][stage]['wall_s'], total['wall_s']) for stage, total in run['stages'].items() if stage in before['stages']]
+        for stage, previous_seconds, seconds in stages:
+            if max(previous_seconds, seconds) < min_seconds:
+                continue
+            ratio = seconds / previous_seconds if previous_seconds > 0 else float('inf')
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  REGRESSION'
+                regressions.append((run['analysis'], run['structures'], stage, previous_seconds, seconds))
+            print(f"  {run['analysis']:<9}{run['structures']:>10}  {stage:<16}{previous_seconds:>9.3f} s {seconds:>9.3f} s  {ratio:5.2f}x{flag}")
+    return regressions
+
+
+def plot(results, path):
+    """Plot scaling curves (wall time vs structures, log-log) per analysis & stage
+
+    Args:
+        results (dict): Results
+        path (str): Image path
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    analyses = list(dict.fromkeys(run['analysis'] for run in results['runs'] if run['status'] == 'completed'))
+    if not analyses:
+        return
+    figure, axes = plt.subplots(1, len(analyses), figsize=(6 * len(analyses), 5), squeeze=False)
+    for axis, analysis in zip(axes[0], analyses):
+        runs = sorted((run for run in results['runs'] if run['analysis'] == analysis and run['status'] == 'completed'), key=lambda run: run['structures'])
+        sizes = [run['structures'] for run in runs]
+        axis.plot(sizes, [run['wall_s'] for run in runs], 'k-o', label='total')
+        for stage in dict.fromkeys(stage for run in runs for stage in run['stages']):
+            axis.plot(sizes, [run['stages'].get(stage, {}).get('wall_s', np.nan) for run in runs], '-', marker='.', label=stage)
+        axis.set_xscale('log')
+        axis.set_yscale('log')
+        axis.set_xlabel('Structures')
+        axis.set_ylabel('Wall time (s)')
+        axis.set_title(analysis)
+        axis.legend(fontsize='x-small')
+    figure.tight_layout()
+    figure.savefig(path, dpi=120)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='UDF pipeline benchmark suite')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='Structure counts (1k to 10M)')
+    parser.add_argument('--grid-size', type=int, default=2048, help='Depth grid width & height in pixels')
+    parser.add_argument('--tile-size', type=int, default=256, help='Depth grid block size in pixels')
+    parser.add_argument('--analyses', default='standard,aal,pelv', help='Analyses (standard, aal, pelv)')
+    parser.add_argument('--work', default=None, help='Work folder for inputs & outputs (reused between runs). Defaults to a temporary folder.')
+    parser.add_argument('--output', default=None, help='Results JSON path. Defaults to <work>/results.json')
+    parser.add_argument('--compare', default=None, help='Previous results JSON to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown flagged as a regression')
+    parser.add_argument('--plot', default=None, help='Scaling curves image path')
+    parser.add_argument('--verbose', action='store_true', help='Show the UDF output')
+    args = parser.parse_args()
+    sizes = [int(float(size)) for size in args.sizes.split(',')]
+    analyses = [analysis.strip() for analysis in args.analyses.split(',')]
+    work = args.work or tempfile.mkdtemp(prefix='fast-benchmark-')
+    os.makedirs(work, exist_ok=True)
+    start = time.perf_counter()
+    inputs = prepare_inputs(work, sizes, args.grid_size, args.tile_size)
+    print(f'Synthetic inputs: {time.perf_counter() - start:.1f} s ({work})')
+    run_folder = prepare_run_folder(work)
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': get_commit(),
+        'environment': get_environment(),
+        'config': {'sizes': sizes, 'grid_size': args.grid_size, 'tile_size': args.tile_size, 'analyses': analyses},
+        'runs': [],
+    }
+    print(f"\n{'analysis':<9}{'structures':>10}  {'status':<10}{'wall (s)':>10}{'cpu (s)':>10}{'peak MB':>10}  slowest stages")
+    for analysis in analyses:
+        for size in sizes:
+            report = run_analysis(analysis, inputs['udfs'][size], inputs, run_folder, args.verbose)
+            run = {
+                'analysis': analysis,
+                'structures': size,
+                'status': report['info'].get('status'),
+                'error': report['info'].get('error'),
+                'wall_s': report.get('wall_s'),
+                'cpu_s': report.get('cpu_s'),
+                'peak_rss_mb': report.get('peak_rss_mb'),
+                'stages': report['totals'],
+                'records': report['stages'],
+            }
+            results['runs'].append(run)
+            slowest = sorted(run['stages'].items(), key=lambda item: -item[1]['wall_s'])[:3]
+            slowest = ', '.join(f"{stage} {total['wall_s']:.2f}" for stage, total in slowest)
+            wall = f"{run['wall_s']:10.2f}{run['cpu_s']:10.2f}{run['peak_rss_mb'] or 0:10.0f}" if run['wall_s'] is not None else ' ' * 30
+            print(f"{analysis:<9}{size:>10}  {run['status']:<10}{wall}  {slowest or run['error'] or ''}")
+    results['scaling'] = get_scaling(results['runs'])
+    for analysis, stages in results['scaling'].items():
+        print(f'\nScaling exponents ({analysis}): ' + ', '.join(f'{stage} {exponent}' for stage, exponent in stages.items()))
+    output = args.output or os.path.join(work, 'results.json')
+    with open(output, 'w') as results_file:
+        json.dump(results, results_file, indent=2, default=str)
+    print(f'\nResults: {output}')
+    if args.plot:
+        try:
+            plot(results, args.plot)
+            print(f'Scaling curves: {args.plot}')
+        except ImportError:
+            print('Scaling curves need matplotlib')
+    if args.compare:
+        with open(args.compare) as previous_file:
+            regressions = compare(results, json.load(previous_file), args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} stage(s) slower than {1 + args.threshold:.2f}x')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
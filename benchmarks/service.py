@@ -0,0 +1,160 @@
+"""Analysis service turnaround benchmark
+
+Runs a small what-if UDF (a few structures, first floor heights raised by
+--raise-ft) three ways and compares the turnaround:
+
+    cold      fresh interpreter: imports, LUT parsing, raster opening & run (what a script or the GUI pays today)
+    in-process  second run in the same process without the service cache (LUTs & rasters read again)
+    service   job submitted to a warm local analysis service (submit, progress events & result download)
+
+The service results must match the cold run.
+
+Usage:
+    python benchmarks/service.py --udf udf.csv --depth-grid depth.tif [--fmap FltyId,Occ,...] [--structures 20] [--repeat 10] [--output service.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Runs in a fresh interpreter: time the imports & a memory run of the UDF
+COLD_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+from hazpy.flood.modules.UDF import UDF
+udf = UDF({udf!r}, {lut_dir!r}, None, [{depth_grid!r}], 'False', {fmap!r}, {flood_type!r}, output='memory')
+results = udf.get_flood_damage()
+seconds = time.perf_counter() - start
+results.grids[next(iter(results.grids))].to_csv({output!r}, index=False)
+print(json.dumps({{'seconds': seconds}}))
+'''
+
+
+def run_cold(udf, lut_dir, depth_grid, fmap, flood_type, output):
+    """Run the UDF in a fresh interpreter
+
+    Returns:
+        float: Seconds from start to results (imports included)
+    """
+    script = COLD_SCRIPT.format(root=ROOT, udf=udf, lut_dir=lut_dir, depth_grid=depth_grid, fmap=fmap, flood_type=flood_type, output=output)
+    process = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr)
+    return json.loads(process.stdout.strip().splitlines()[-1])['seconds']
+
+
+def summarize(seconds):
+    return {'best_s': round(min(seconds), 4), 'median_s': round(statistics.median(seconds), 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analysis service turnaround benchmark')
+    parser.add_argument('--udf', required=True, help='UDF CSV path')
+    parser.add_argument('--depth-grid', required=True, help='Depth grid path')
+    parser.add_argument('--fmap', default=None, help='UDF field map (comma separated, defaults to the UDF columns)')
+    parser.add_argument('--flood-type', default='Riverine', help='Flood type')
+    parser.add_argument('--lut-dir', default=os.path.join(ROOT, 'Lookuptables'), help='Lookup table folder')
+    parser.add_argument('--structures', type=int, default=20, help='Number of structures of the what-if UDF')
+    parser.add_argument('--raise-ft', type=float, default=2.0, help='First floor height increase of the what-if UDF')
+    parser.add_argument('--repeat', type=int, default=10, help='Runs of each way')
+    parser.add_argument('--output', default=None, help='Results JSON path')
+    args = parser.parse_args()
+
+    import pandas as pd
+    from hazpy.flood.modules.UDF import UDF
+    from hazpy.flood.modules.service import AnalysisService, ServiceClient
+    structures = pd.read_csv(args.udf).head(args.structures)
+    structures['FirstFloorHt'] = structures['FirstFloorHt'] + args.raise_ft
+    fmap = args.fmap.split(',') if args.fmap else list(structures.columns)
+    lut_dir = os.path.abspath(args.lut_dir)
+    depth_grid = os.path.abspath(args.depth_grid)
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        what_if = os.path.join(folder, 'what_if.csv')
+        structures.to_csv(what_if, index=False)
+        cold_output = os.path.join(folder, 'cold.csv')
+        cold = [run_cold(what_if, lut_dir, depth_grid, fmap, args.flood_type, cold_output) for run in range(max(args.repeat // 3, 1))]
+        results['cold'] = summarize(cold)
+
+        warm = []
+        for run in range(args.repeat):
+            start = time.perf_counter()
+            UDF(what_if, lut_dir, None, [depth_grid], 'False', fmap, args.flood_type, output='memory').get_flood_damage()
+            warm.append(time.perf_counter() - start)
+        results['in-process'] = summarize(warm)
+
+        service = AnalysisService(port=0, workers=1, lut_dir=lut_dir)
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(service.start())
+            started.set()
+            loop.run_until_complete(service.stopped.wait())
+            loop.run_until_complete(service.stop())
+        thread = threading.Thread(target=serve, daemon=True)
+        start = time.perf_counter()
+        thread.start()
+        started.wait()
+        results['service_start_s'] = round(time.perf_counter() - start, 4)
+        client = ServiceClient(f'http://127.0.0.1:{service.port}')
+        turnaround = []
+        events = []
+        try:
+            for run in range(args.repeat + 1):
+                start = time.perf_counter()
+                job_id = client.submit(structures=structures, depth_grids=[depth_grid], flood_type=args.flood_type, fmap=fmap)
+                job = client.wait(job_id, events.append if run == 0 else None)
+                if job['status'] != 'completed':
+                    raise RuntimeError(f"Job {job_id} {job['status']}: {job['error']}")
+                names = client.results(job_id)
+                df = client.results(job_id, 'grids', names['grids'][0])
+                # The first job also builds the depth grid sampler
+                if run > 0:
+                    turnaround.append(time.perf_counter() - start)
+            results['service'] = summarize(turnaround)
+            results['service']['events'] = len(events)
+            results['cache'] = client.status()['cache']
+        finally:
+            client.shutdown()
+            thread.join()
+        expected = pd.read_csv(cold_output)
+        # Same values as the cold run (JSON & CSV round trips)
+        df = pd.read_csv(pd.io.common.StringIO(df.to_csv(index=False)))
+        results['matches_cold'] = bool(
+            list(df.columns) == list(expected.columns)
+            and len(df) == len(expected)
+            and all(
+                ((df[column] - expected[column]).abs().max() <= 1e-6 if pd.api.types.is_numeric_dtype(expected[column]) and pd.api.types.is_numeric_dtype(df[column])
+                 else df[column].fillna('').astype(str).equals(expected[column].fillna('').astype(str)))
+                or (df[column].isna() & expected[column].isna()).all()
+                for column in expected.columns
+            )
+        )
+
+    print(f"{'run':<12}{'best (s)':>10}{'median (s)':>12}")
+    for name in ('cold', 'in-process', 'service'):
+        print(f"{name:<12}{results[name]['best_s']:10.4f}{results[name]['median_s']:12.4f}")
+    print(f"\nService start (LUT warm-up): {results['service_start_s']:.3f} s, {results['service']['events']} progress events per job")
+    print(f"Cache: {results['cache']}")
+    print(f"Service results match the cold run: {results['matches_cold']}")
+    if args.output:
+        with open(args.output, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+        print(f'\nResults: {args.output}')
+    sys.exit(0 if results['matches_cold'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""SOID parity check
+
+Compares the vectorized UDF.create_specific_occ_id against the original
+row-by-row SOID construction (create_somid per row) for every
+Occ x NumStories x FoundationType combination.
+
+Usage:
+    python benchmarks/soid_parity.py
+"""
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hazpy.flood.modules.UDF import UDF
+
+
+def get_reference_soids(udf, df):
+    """Original row-by-row SOID construction
+
+    Args:
+        udf (UDF): UDF instance
+        df (dataframe): Occ, NumStories & FoundationType
+
+    Returns:
+        list: SOIDs
+    """
+    sopre = [i[:1] + i[-(len(i) - 3):] if i != 'REL1' else 'RE1' for i in df['Occ']]
+    somid = [udf.create_somid(occ, num_stories) for occ, num_stories in zip(df['Occ'], df['NumStories'])]
+    sosuf = np.where(df['FoundationType'] == 4, 'B', 'N')
+    return [a + b + c for a, b, c in zip(sopre, somid, sosuf)]
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    occupancies = pd.read_csv(os.path.join(root, 'Lookuptables', 'OccupancyTypes.csv'))['Occupancy'].str.strip()
+    num_stories = np.r_[np.arange(0, 12.5, 0.5), [0.25, 1.75, 15, 20, 100]]
+    foundation_types = range(1, 8)
+    df = pd.DataFrame(
+        list(itertools.product(occupancies, num_stories, foundation_types)),
+        columns=['Occ', 'NumStories', 'FoundationType'],
+    )
+    udf = UDF(None, None, None, [], 'False', [], 'Riverine')
+    reference = get_reference_soids(udf, df)
+    start = time.time()
+    soids = udf.create_specific_occ_id(df.copy())['SOID']
+    elapsed = time.time() - start
+    mismatches = df[soids.values != np.array(reference, dtype=object)]
+    print(f'Combinations: {len(df)} ({len(occupancies)} Occ x {len(num_stories)} NumStories x {len(foundation_types)} FoundationType)')
+    print(f'Mismatches: {len(mismatches)}')
+    if len(mismatches) > 0:
+        print(mismatches.head(20).to_string())
+    print(f'Vectorized SOID time: {elapsed * 1000:.1f} ms')
+    return 1 if len(mismatches) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
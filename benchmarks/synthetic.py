@@ -0,0 +1,233 @@
+"""Synthetic benchmark inputs
+
+Generators for UDF structure inventories, GeoTIFF depth grids (one per return
+period) and census tract polygons covering the same extent, so the standard,
+AAL & PELV pipelines can be benchmarked at any size without user data.
+
+Usage:
+    python benchmarks/synthetic.py <folder> [structures] [grid size] [tile size]
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Default extent (WGS84): about 11 x 11 km
+BOUNDS = (-157.90, 21.28, -157.80, 21.38)
+
+# Approximate share of the building stock by occupancy category (structure counts)
+CATEGORY_SHARES = {
+    'Single Family': 0.72,
+    'Residential': 0.14,
+    'Commercial': 0.07,
+    'Industrial': 0.03,
+    'Agriculture': 0.015,
+    'Religion': 0.01,
+    'Government': 0.0075,
+    'Education': 0.0075,
+}
+
+# Number of stories: (values, weights) by occupancy prefix
+NUM_STORIES = {
+    'RES1': ([1, 1.5, 2, 2.5, 3], [0.55, 0.1, 0.3, 0.03, 0.02]),
+    'RES2': ([1], [1]),
+    'RES3': ([1, 2, 3, 4, 5, 8, 12], [0.1, 0.3, 0.25, 0.15, 0.1, 0.07, 0.03]),
+    'COM': ([1, 2, 3, 4, 6, 10], [0.45, 0.25, 0.12, 0.08, 0.06, 0.04]),
+    'IND': ([1, 2, 3], [0.7, 0.2, 0.1]),
+    'default': ([1, 2, 3, 4], [0.5, 0.3, 0.15, 0.05]),
+}
+
+# Foundation type (Hazus code: 1 pile, 2 pier, 3 solid wall, 4 basement, 5 crawl, 6 fill, 7 slab),
+# share & first floor height (ft) choices
+FOUNDATIONS = {
+    1: (0.03, [6, 8, 10]),
+    2: (0.07, [3, 4, 6]),
+    3: (0.03, [4, 6, 8]),
+    4: (0.2, [2, 3, 4]),
+    5: (0.25, [2, 3, 4]),
+    6: (0.04, [1, 2]),
+    7: (0.38, [0.5, 1, 1.5]),
+}
+
+
+def get_occupancy_weights():
+    """Get occupancy codes & weights from OccupancyTypes.csv
+
+    Each category share is split evenly among its occupancies.
+
+    Returns:
+        tuple: Occupancy codes & weights arrays
+    """
+    occupancy_types = pd.read_csv(os.path.join(ROOT, 'Lookuptables', 'OccupancyTypes.csv'))
+    occupancy = occupancy_types['Occupancy'].str.strip()
+    category = occupancy_types['Category'].str.strip()
+    shares = category.map(CATEGORY_SHARES).fillna(0) / category.map(category.value_counts())
+    return occupancy.values, (shares / shares.sum()).values
+
+
+def get_num_stories(occ, rng):
+    """Draw the number of stories of each structure by occupancy
+
+    Args:
+        occ (array): Occupancy codes
+        rng (Generator): Random generator
+
+    Returns:
+        array: Number of stories
+    """
+    num_stories = np.empty(len(occ))
+    prefixes = np.array([next((prefix for prefix in NUM_STORIES if code.startswith(prefix)), 'default') for code in np.unique(occ)])
+    prefix = prefixes[np.unique(occ, return_inverse=True)[1]]
+    for name, (values, weights) in NUM_STORIES.items():
+        rows = np.flatnonzero(prefix == name)
+        num_stories[rows] = rng.choice(values, len(rows), p=np.array(weights) / np.sum(weights))
+    return num_stories
+
+
+def make_udf(path, size, bounds=BOUNDS, tracts=None, seed=0, chunk_size=1000000):
+    """Write a synthetic UDF (written in chunks, so 10M structures fit in memory)
+
+    Args:
+        path (str): CSV path
+        size (int): Number of structures
+        bounds (tuple, optional): Extent (west, south, east, north). Defaults to BOUNDS.
+        tracts (tuple, optional): Tract grid (columns, rows, tract IDs) from make_tracts for the Tract attribute. Defaults to None.
+        seed (int, optional): Random seed. Defaults to 0.
+        chunk_size (int, optional): Structures per chunk. Defaults to 1000000.
+    """
+    rng = np.random.default_rng(seed)
+    occupancies, weights = get_occupancy_weights()
+    foundation_types = np.array(list(FOUNDATIONS))
+    foundation_weights = np.array([share for share, heights in FOUNDATIONS.values()])
+    west, south, east, north = bounds
+    for start in range(0, size, chunk_size):
+        n = min(chunk_size, size - start)
+        occ = rng.choice(occupancies, n, p=weights)
+        foundation_type = rng.choice(foundation_types, n, p=foundation_weights / foundation_weights.sum())
+        first_floor_height = np.empty(n)
+        for code, (share, heights) in FOUNDATIONS.items():
+            rows = np.flatnonzero(foundation_type == code)
+            first_floor_height[rows] = rng.choice(heights, len(rows))
+        num_stories = get_num_stories(occ, rng)
+        area = np.round(rng.lognormal(7.4, 0.5, n) * num_stories)
+        cost = np.round(area * rng.uniform(90, 180, n))
+        longitude = rng.uniform(west, east, n)
+        latitude = rng.uniform(south, north, n)
+        df = pd.DataFrame({
+            'FltyId': np.arange(start + 1, start + n + 1),
+            'Occ': occ,
+            'Cost': cost,
+            'Area': area,
+            'NumStories': num_stories,
+            'FoundationType': foundation_type,
+            'FirstFloorHt': first_floor_height,
+            'ContentCost': np.round(cost * 0.5),
+            'Latitude': latitude,
+            'Longitude': longitude,
+        })
+        if tracts is not None:
+            columns, rows, tract_ids = tracts
+            column = np.minimum(((longitude - west) / (east - west) * columns).astype(int), columns - 1)
+            row = np.minimum(((north - latitude) / (north - south) * rows).astype(int), rows - 1)
+            df['Tract'] = tract_ids[row * columns + column]
+        df.to_csv(path, index=False, mode='w' if start == 0 else 'a', header=start == 0)
+
+
+def make_depth_grid(path, size, tile_size=256, bounds=BOUNDS, scale=1.0, dry_fraction=0.4, seed=0):
+    """Write a synthetic tiled GeoTIFF depth grid (ft, float32, EPSG:4326)
+
+    Depth is a smooth floodplain surface (deepest along a meandering channel,
+    decreasing away from it) with pixel noise; pixels beyond the floodplain are
+    nodata. The grid is written block row by block row.
+
+    Args:
+        path (str): GeoTIFF path
+        size (int or tuple): Grid width & height in pixels (or (width, height))
+        tile_size (int, optional): GeoTIFF block size in pixels. Defaults to 256.
+        bounds (tuple, optional): Extent (west, south, east, north). Defaults to BOUNDS.
+        scale (float, optional): Depth multiplier (e.g. per return period). Defaults to 1.0.
+        dry_fraction (float, optional): Approximate fraction of nodata pixels. Defaults to 0.4.
+        seed (int, optional): Random seed. Defaults to 0.
+    """
+    import rasterio as rio
+    from rasterio.transform import from_bounds
+    from rasterio.windows import Window
+
+    width, height = (size, size) if np.isscalar(size) else size
+    rng = np.random.default_rng(seed)
+    transform = from_bounds(*bounds, width, height)
+    profile = {
+        'driver': 'GTiff',
+        'width': width,
+        'height': height,
+        'count': 1,
+        'dtype': 'float32',
+        'crs': 'EPSG:4326',
+        'transform': transform,
+        'nodata': -9999,
+        'tiled': True,
+        'blockxsize': tile_size,
+        'blockysize': tile_size,
+    }
+    x = np.linspace(0, 1, width)
+    # Floodplain half-width (in grid fractions) for the dry fraction
+    half_width = (1 - dry_fraction) / 2
+    with rio.open(path, 'w', **profile) as ds:
+        for top in range(0, height, tile_size):
+            rows = min(tile_size, height - top)
+            y = (top + np.arange(rows)) / max(height - 1, 1)
+            channel = 0.5 + 0.2 * np.sin(y * 3 * np.pi)
+            distance = np.abs(x[np.newaxis, :] - channel[:, np.newaxis])
+            depth = scale * (16 * (1 - distance / half_width) - 2) + rng.normal(0, 0.5, (rows, width))
+            depth = np.where(distance < half_width, depth, -9999).astype('float32')
+            ds.write(depth, 1, window=Window(0, top, width, rows))
+
+
+def make_tracts(path, columns=8, rows=8, bounds=BOUNDS, tract_ids=None):
+    """Write synthetic census tract polygons (a columns x rows grid) for PELV
+
+    Args:
+        path (str): Vector file path (GeoJSON, GeoPackage or shapefile)
+        columns (int, optional): Tract columns. Defaults to 8.
+        rows (int, optional): Tract rows. Defaults to 8.
+        bounds (tuple, optional): Extent (west, south, east, north). Defaults to BOUNDS.
+        tract_ids (list, optional): Tract IDs (e.g. tracts of the PELV curves). Defaults to None (Honolulu county style IDs).
+
+    Returns:
+        tuple: Columns, rows & tract IDs (row-major from the north west corner)
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    west, south, east, north = bounds
+    count = columns * rows
+    if tract_ids is None or len(tract_ids) == 0:
+        tract_ids = [f'15003{index + 100:06d}' for index in range(count)]
+    tract_ids = np.array([str(tract_id) for tract_id in np.resize(np.asarray(tract_ids), count)], dtype=object)
+    width = (east - west) / columns
+    height = (north - south) / rows
+    polygons = [
+        box(west + column * width, north - (row + 1) * height, west + (column + 1) * width, north - row * height)
+        for row in range(rows) for column in range(columns)
+    ]
+    gpd.GeoDataFrame({'Tract': tract_ids}, geometry=polygons, crs='EPSG:4326').to_file(path)
+    return columns, rows, tract_ids
+
+
+def main():
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'synthetic'
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    grid_size = int(sys.argv[3]) if len(sys.argv) > 3 else 2048
+    tile_size = int(sys.argv[4]) if len(sys.argv) > 4 else 256
+    os.makedirs(folder, exist_ok=True)
+    tracts = make_tracts(os.path.join(folder, 'tracts.geojson'))
+    make_udf(os.path.join(folder, f'udf-{size}.csv'), size, tracts=tracts)
+    make_depth_grid(os.path.join(folder, f'depth-{grid_size}.tif'), grid_size, tile_size)
+    print(f'Synthetic inputs written to {folder}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Launcher update check against a local stand-in for the release URLs
+
+Serves src/__init__.py variants from a local HTTP server and runs
+Manage.checkForUpdatesInBackground against it (temporary config & cache), so
+the startup path can be checked without GitHub: the launcher must return
+immediately, the background check must finish within its budget, and the
+newest version & check time must be cached so the next launch skips the check.
+
+Scenarios:
+    current   the release has the installed version
+    newer     the release has a newer version
+    slow      the server answers after the budget
+    missing   the release URL returns 404
+    offline   nothing listens on the release URL
+
+Usage:
+    python benchmarks/update_check.py [--budget 1] [--output update_check.json]
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+NEWER_VERSION = '99.0.0'
+
+
+class ReleaseHandler(BaseHTTPRequestHandler):
+    """Release URL stand-in: /<scenario>/src/__init__.py"""
+    installed_version = None
+    delay = 0
+
+    def do_GET(self):
+        scenario = self.path.strip('/').split('/')[0]
+        if scenario == 'slow':
+            time.sleep(self.delay)
+        if scenario not in ('current', 'newer', 'slow'):
+            self.send_error(404)
+            return
+        version = NEWER_VERSION if scenario == 'newer' else self.installed_version
+        body = f"__version__ = '{version}'\n".encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            # The launcher gave up (slow scenario)
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def get_free_port():
+    """Get a local port nothing listens on
+
+    Returns:
+        int: Port number
+    """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def write_config(path, url, budget):
+    """Write a copy of src/config.json with the release URLs pointing to the stand-in
+
+    Args:
+        path (str): Config JSON path
+        url (str): Release base URL
+        budget (float): Update check budget in seconds
+    """
+    with open(os.path.join(ROOT, 'src', 'config.json')) as config_file:
+        config = json.load(config_file)
+    release = config[config['release']]
+    release['toolInitUrl'] = f'{url}/src/__init__.py'
+    release['hazpyInitUrl'] = f'{url}/hazpy/__init__.py'
+    release['repoZipfileUrl'] = f'{url}/archive.zip'
+    release['updateCheckBudget'] = budget
+    with open(path, 'w') as config_file:
+        json.dump(config, config_file, indent=2)
+
+
+def run_scenario(manage_class, folder, name, url, budget, expected):
+    """Launch twice against the stand-in & check the background update check
+
+    Args:
+        manage_class (type): src.manage.Manage
+        folder (str): Temporary folder for the config & cache
+        name (str): Scenario name
+        url (str): Release base URL
+        budget (float): Update check budget in seconds
+        expected (str): Expected cached newest version (None if the check should fail)
+
+    Returns:
+        dict: Launcher & background seconds, cached version and check results
+    """
+    config_file = os.path.join(folder, f'{name}-config.json')
+    cache_file = os.path.join(folder, f'{name}-cache.json')
+    write_config(config_file, url, budget)
+    manage = manage_class(config_file, cache_file)
+    # Environment already verified: only the update check runs
+    manage.writeCache(environment=manage.virtual_environment)
+
+    start = time.perf_counter()
+    thread = manage.checkForUpdatesInBackground()
+    launch_s = time.perf_counter() - start
+    thread.join()
+    background_s = time.perf_counter() - start
+    cache = manage.readCache()
+
+    # Second launch: a successful check is not repeated within the interval
+    relaunch = manage_class(config_file, cache_file).checkForUpdatesInBackground()
+    if relaunch is not None:
+        relaunch.join()
+    problems = []
+    if launch_s > 0.1:
+        problems.append('launcher waited for the check')
+    if background_s > budget + 0.5:
+        problems.append('budget exceeded')
+    if cache.get('newestVersion') != expected:
+        problems.append(f"cached version {cache.get('newestVersion')}")
+    if (relaunch is None) != (expected is not None):
+        problems.append('relaunch checked again' if relaunch is not None else 'failed check not retried')
+    return {
+        'launch_s': round(launch_s, 4),
+        'background_s': round(background_s, 4),
+        'newest_version': cache.get('newestVersion'),
+        'problems': problems,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Launcher update check against a local release URL stand-in')
+    parser.add_argument('--budget', type=float, default=1.0, help='Update check budget in seconds')
+    parser.add_argument('--output', default=None, help='Results JSON path')
+    args = parser.parse_args()
+
+    from src.manage import Manage
+    cwd = os.getcwd()
+    with open(os.path.join(ROOT, 'src', '__init__.py')) as init:
+        installed_version = next(line.split('=')[1].strip().strip('\'"') for line in init if line.startswith('__version__'))
+    ReleaseHandler.installed_version = installed_version
+    ReleaseHandler.delay = args.budget + 1
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ReleaseHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    scenarios = {
+        'current': (f'{base_url}/current', installed_version),
+        'newer': (f'{base_url}/newer', NEWER_VERSION),
+        'slow': (f'{base_url}/slow', None),
+        'missing': (f'{base_url}/missing', None),
+        'offline': (f'http://127.0.0.1:{get_free_port()}/offline', None),
+    }
+    results = {}
+    failed = False
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            print(f"{'scenario':<10}{'launch (s)':>12}{'background (s)':>16}  cached version")
+            for name, (url, expected) in scenarios.items():
+                result = run_scenario(Manage, folder, name, url, args.budget, expected)
+                results[name] = result
+                failed = failed or bool(result['problems'])
+                problems = f"  FAILED: {', '.join(result['problems'])}" if result['problems'] else ''
+                print(f"{name:<10}{result['launch_s']:12.4f}{result['background_s']:16.4f}  {result['newest_version']}{problems}")
+    finally:
+        server.shutdown()
+        # Manage changes to the tool folder
+        os.chdir(cwd)
+    if args.output:
+        with open(args.output, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+        print(f'\nResults: {args.output}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""What-if scenario sweep benchmark
+
+Evaluates a matrix of mitigation scenarios with the WhatIf engine (one depth
+sampling & one loss pass) and with one get_flood_damage run per scenario on a
+modified copy of the UDF (the only way before the engine), then checks that
+both give the same per-structure losses.
+
+Scenarios:
+    Elevate <occ> +1..+N ft   first floor height raised for the occupancy in the first depth grid's floodplain
+    Fill basements            foundation type 4 (basement) changed to 7 (slab)
+    Flood-proof COM           dry flood-proofing to 3 ft (no re-run equivalent, not compared)
+
+Usage:
+    python benchmarks/what_if.py --udf udf.csv --depth-grids depth.tif [depth500.tif ...] [--occ RES1] [--ffh-deltas 1,2,3] [--output what_if.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+LOSS_FIELDS = ['Depth_in_Struc', 'BldgLossUSD', 'ContentLossUSD', 'InventoryLossUSD']
+
+
+def run_scenario(udf_class, structures, depth_grids, fmap, flood_type, lut_dir):
+    """Run get_flood_damage on a modified UDF
+
+    Returns:
+        Results: In-memory results (standard losses per depth grid)
+    """
+    udf = udf_class(structures, lut_dir, None, depth_grids, 'False', fmap, flood_type, output='memory')
+    return udf.get_flood_damage()
+
+
+def get_difference(losses, results, scenario):
+    """Largest per-structure difference between the engine & a re-run
+
+    UDF.get_depth_field formats depths as 15 characters of text: depths below
+    1e-4 ft are written in scientific notation & lose their exponent, so the
+    re-run has wrong depths (& losses) for them. Those rows are not compared.
+
+    Returns:
+        tuple: Maximum absolute difference of the loss fields & number of rows not compared
+    """
+    difference = 0.0
+    skipped = 0
+    for grid_name, df in results.grids.items():
+        rerun = df.set_index('FltyId')
+        engine = losses[(losses['Scenario'] == scenario) & (losses['GridName'] == grid_name)].set_index('FltyId')
+        scientific = ((engine['Depth_in_Struc'].abs() < 1e-4) & (engine['Depth_in_Struc'] != 0)) | ((engine['Depth_Grid'].abs() < 1e-4) & (engine['Depth_Grid'] != 0))
+        skipped += int(scientific.sum())
+        rerun = rerun.drop(engine.index[scientific])
+        engine = engine[~scientific]
+        for field in LOSS_FIELDS:
+            difference = max(difference, float((rerun.loc[engine.index, field].astype(float) - engine[field]).abs().max()))
+        # Structures the engine leaves out are dry in every grid
+        dry = rerun.drop(engine.index)
+        difference = max(difference, float(dry[['BldgLossUSD', 'ContentLossUSD', 'InventoryLossUSD']].abs().max().max()) if len(dry) else 0.0)
+    return difference, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='What-if scenario sweep benchmark')
+    parser.add_argument('--udf', required=True, help='UDF CSV path')
+    parser.add_argument('--depth-grids', nargs='+', required=True, help='Depth grid paths')
+    parser.add_argument('--fmap', default=None, help='UDF field map (comma separated, defaults to the UDF columns)')
+    parser.add_argument('--flood-type', default='Riverine', help='Flood type')
+    parser.add_argument('--lut-dir', default=os.path.join(ROOT, 'Lookuptables'), help='Lookup table folder')
+    parser.add_argument('--occ', default='RES1', help='Occupancy prefix of the elevation scenarios')
+    parser.add_argument('--ffh-deltas', default='1,2,3', help='First floor height increases in ft (comma separated)')
+    parser.add_argument('--output', default=None, help='Results JSON path')
+    args = parser.parse_args()
+
+    import pandas as pd
+    from hazpy.flood.modules.UDF import UDF
+    from hazpy.flood.modules.what_if import WhatIf
+    structures = pd.read_csv(args.udf)
+    fmap = args.fmap.split(',') if args.fmap else list(structures.columns)
+    depth_grids = [os.path.abspath(depth_grid) for depth_grid in args.depth_grids]
+    ffh_deltas = [float(delta) for delta in args.ffh_deltas.split(',')]
+
+    start = time.perf_counter()
+    what_if = WhatIf(UDF(args.udf, args.lut_dir, None, depth_grids, 'False', fmap, args.flood_type))
+    what_if.sample()
+    sample_s = time.perf_counter() - start
+    floodplain = what_if.grid_names[0]
+    elevations = what_if.add_scenarios(f'Elevate {args.occ}', ffh_deltas=ffh_deltas, occ=args.occ, floodplain=floodplain)
+    basements = what_if.add_scenario('Fill basements', foundation_type=7, foundation=4)
+    what_if.add_scenario('Flood-proof COM', flood_proof=3, occ='COM')
+    start = time.perf_counter()
+    results = what_if.run()
+    run_s = time.perf_counter() - start
+    losses = results['losses']
+
+    # One get_flood_damage run per scenario (the baseline included)
+    rerun_s = 0.0
+    differences = {}
+    skipped = 0
+    reruns = [('Baseline', structures)]
+    for scenario in elevations + [basements]:
+        modified = structures.copy()
+        selected = what_if.get_selection(scenario)
+        if scenario['ffh_delta'] is not None:
+            modified.loc[selected, 'FirstFloorHt'] = modified.loc[selected, 'FirstFloorHt'] + scenario['ffh_delta']
+        if scenario['foundation_type'] is not None:
+            modified.loc[selected, 'FoundationType'] = scenario['foundation_type']
+        reruns.append((scenario['name'], modified))
+    for name, modified in reruns:
+        start = time.perf_counter()
+        rerun = run_scenario(UDF, modified, depth_grids, fmap, args.flood_type, args.lut_dir)
+        rerun_s += time.perf_counter() - start
+        differences[name], scenario_skipped = get_difference(losses, rerun, name)
+        skipped += scenario_skipped
+
+    scenarios = len(what_if.scenarios)
+    summary = {
+        'structures': len(structures),
+        'depth_grids': len(depth_grids),
+        'scenarios': scenarios,
+        'engine_sample_s': round(sample_s, 4),
+        'engine_run_s': round(run_s, 4),
+        'engine_s': round(sample_s + run_s, 4),
+        'loss_rows': len(losses),
+        'reruns': len(reruns),
+        'rerun_s': round(rerun_s, 4),
+        'rerun_per_scenario_s': round(rerun_s / len(reruns), 4),
+        'max_difference': max(differences.values()),
+        'differences': differences,
+        'rows_not_compared': skipped,
+    }
+    print(f"\n{summary['structures']} structures, {summary['depth_grids']} depth grids, {scenarios} scenarios + baseline")
+    print(f"WhatIf engine:       {summary['engine_s']:.3f} s (sample {summary['engine_sample_s']:.3f} s, all scenarios {summary['engine_run_s']:.3f} s, {summary['loss_rows']} loss rows)")
+    print(f"get_flood_damage:    {summary['rerun_s']:.3f} s for {summary['reruns']} runs ({summary['rerun_per_scenario_s']:.3f} s per scenario)")
+    print(f"Largest difference:  {summary['max_difference']:g} ({skipped} rows with depths below 1e-4 ft not compared)")
+    print(results['summary'].to_string(index=False))
+    if args.output:
+        with open(args.output, 'w') as results_file:
+            json.dump(summary, results_file, indent=2)
+        print(f'\nResults: {args.output}')
+    sys.exit(0 if summary['max_difference'] <= 0.01 else 1)
+
+
+if __name__ == '__main__':
+    main()
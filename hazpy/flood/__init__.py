@@ -10,7 +10,31 @@
     :author: James Raines; james.rainesii@fema.dhs.gov
 """
 
+from importlib import import_module
+
 __version__ = '0.0.1'
 __all__ = ['classes']
 
-from .classes import *
\ No newline at end of file
+from .classes import *
+
+# Analysis modules are imported on first access (PEP 562): name: (module, attribute or None for the module)
+_lazy = {
+    'AAL': ('.modules.AAL', None),
+    'PELV': ('.modules.PELV', None),
+    'UDF': ('.modules.UDF', 'UDF'),
+}
+
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module, attribute = _lazy[name]
+    value = import_module(module, __name__)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
@@ -1,13 +1,10 @@
-from .modules.classes import Base
+from .modules.classes import Base, LazyModule
 # from .modules import Agriculture
 # from .modules import DirectSocialLosses
 # from .modules import EssentialFacilities
 # from .modules import GeneralBuildingStock
 # from .modules import IndirectEconomicLoss
 # from .modules import TransportationSystems
-from .modules import AAL
-from .modules import PELV
-from .modules import UDF
 # from .modules import UtilitySystems
 # from .modules import Vehicles
 # from .modules import WhatIf
@@ -20,27 +17,26 @@ class Flood(Base):
     Keyword arguments: \n
 
     """
+    # Modules are imported on first access (UDF, AAL & PELV take the inputs of a run: the class)
+    analysis = LazyModule('hazpy.flood.classes', 'Analysis')
+    UDF = LazyModule('hazpy.flood.modules.UDF', 'UDF', create=False)
 
     def __init__(self):
         super().__init__()
 
-        self.analysis = Analysis()
-        self.UDF = UDF.UDF()
         self.test = 'coconut'
 
 
 class Analysis():
-    def __init__(self):
-
-        # self.agriculture = Agriculture()
-        # self.directSocialLosses = DirectSocialLosses()
-        # self.essentialFacilities = EssentialFacilities()
-        # self.generalBuildingStock = GeneralBuildingStock()
-        # self.indirectEconomicLoss = IndirectEconomicLoss()
-        # self.transportationSystems = TransportationSystems()
-        self.AAL = AAL()
-        self.PELV = PELV()
-        self.UDF = UDF()
-        # self.utilitySystems = UtilitySystems()
-        # self.vehicles = Vehicles()
-        # self.whatIf = WhatIf()
+    # agriculture = LazyModule('hazpy.flood.modules.agriculture', 'Agriculture')
+    # directSocialLosses = LazyModule('hazpy.flood.modules.direct_social_losses', 'DirectSocialLosses')
+    # essentialFacilities = LazyModule('hazpy.flood.modules.essential_facilities', 'EssentialFacilities')
+    # generalBuildingStock = LazyModule('hazpy.flood.modules.general_building_stock', 'GeneralBuildingStock')
+    # indirectEconomicLoss = LazyModule('hazpy.flood.modules.indirect_economic_loss', 'IndirectEconomicLoss')
+    # transportationSystems = LazyModule('hazpy.flood.modules.transportation_systems', 'TransportationSystems')
+    AAL = LazyModule('hazpy.flood.modules.AAL', 'AAL', create=False)
+    PELV = LazyModule('hazpy.flood.modules.PELV', 'PELV', create=False)
+    UDF = LazyModule('hazpy.flood.modules.UDF', 'UDF', create=False)
+    # utilitySystems = LazyModule('hazpy.flood.modules.utility_systems', 'UtilitySystems')
+    # vehicles = LazyModule('hazpy.flood.modules.vehicles', 'Vehicles')
+    # whatIf = LazyModule('hazpy.flood.modules.what_if', 'WhatIf')
@@ -1,14 +1,4 @@
-from .modules.classes import Base
-from .agriculture import Agriculture
-from .direct_social_losses import DirectSocialLosses
-from .essential_facilities import EssentialFacilities
-from .general_building_stock import GeneralBuildingStock
-from .indirect_economic_loss import IndirectEconomicLoss
-from .transportation_systems import TransportationSystems
-from .udf import UDF
-from .utility_systems import UtilitySystems
-from .vehicles import Vehicles
-from .what_if import WhatIf
+from .modules.classes import Base, LazyModule
 
 
 class Flood(Base):
@@ -18,24 +8,22 @@ class Flood(Base):
     Keyword arguments: \n
 
     """
+    # Modules are imported & created on first access (the legacy UDF needs GDAL & utm)
+    analysis = LazyModule('hazpy.flood.flood', 'Analysis')
+    UDF = LazyModule('hazpy.flood.udf', 'UDF')
 
     def __init__(self):
         super().__init__()
 
-        self.analysis = Analysis()
-        self.UDF = UDF()
-
 
 class Analysis():
-    def __init__(self):
-
-        self.agriculture = Agriculture()
-        self.directSocialLosses = DirectSocialLosses()
-        self.essentialFacilities = EssentialFacilities()
-        self.generalBuildingStock = GeneralBuildingStock()
-        self.indirectEconomicLoss = IndirectEconomicLoss()
-        self.transportationSystems = TransportationSystems()
-        self.UDF = UDF()
-        self.utilitySystems = UtilitySystems()
-        self.vehicles = Vehicles()
-        self.whatIf = WhatIf()
+    agriculture = LazyModule('hazpy.flood.agriculture', 'Agriculture')
+    directSocialLosses = LazyModule('hazpy.flood.direct_social_losses', 'DirectSocialLosses')
+    essentialFacilities = LazyModule('hazpy.flood.essential_facilities', 'EssentialFacilities')
+    generalBuildingStock = LazyModule('hazpy.flood.general_building_stock', 'GeneralBuildingStock')
+    indirectEconomicLoss = LazyModule('hazpy.flood.indirect_economic_loss', 'IndirectEconomicLoss')
+    transportationSystems = LazyModule('hazpy.flood.transportation_systems', 'TransportationSystems')
+    UDF = LazyModule('hazpy.flood.udf', 'UDF')
+    utilitySystems = LazyModule('hazpy.flood.utility_systems', 'UtilitySystems')
+    vehicles = LazyModule('hazpy.flood.vehicles', 'Vehicles')
+    whatIf = LazyModule('hazpy.flood.what_if', 'WhatIf')
@@ -5,15 +5,20 @@ import warnings
 warnings.filterwarnings('ignore')
 
 class AAL():
-    def __init__(self, output_dir, return_periods, aal_df_list, output_path, output_file):
+    def __init__(self, output_dir, return_periods, aal_df_list, output_path, output_file, write=True):
         self.output_dir = output_dir
         self.return_periods = [int(rp) for rp in return_periods]
         self.aal_df_list = aal_df_list
         self.output_path = output_path
         self.output_file  = output_file
+        # Write the return period & sum CSVs (else the results are only kept in df_list & df_sum)
+        self.write = write
         self.df_list = []
+        self.df_sum = None
         self.set_aal_items()
-        self.export_sum()
+        self.df_sum = self.get_sum()
+        if self.write:
+            self.export_sum()
 
     def get_aal(self, item, rp, recalc_fields, previous_item=None, previous_rp=None, next_item=None, next_rp=None):
         """The AAL is calculated for each structure using the formula:
@@ -78,7 +83,8 @@ class AAL():
             item[columns_to_string_list] = item[columns_to_string_list].fillna('').astype(str)
             item.name = rp
             self.df_list.append(item)
-            self.export_df(item, rp)
+            if self.write:
+                self.export_df(item, rp)
         except Exception as e:
             print(e)
     
@@ -93,8 +99,11 @@ class AAL():
         line_terminator='\n'
         item.to_csv(path, index=False, line_terminator=line_terminator)
 
-    def export_sum(self):
-        """Export aggregated (sum) of all losses to CSV
+    def get_sum(self):
+        """Aggregate (sum) the losses of all return periods
+
+        Returns:
+            dataframe: AAL sum per structure
         """
         group_columns_list = [
             'FltyId',
@@ -111,7 +120,8 @@ class AAL():
                 'ContentLossUSD_aal'
         ]
         df_final['TotalLossUSD_aal'] = df_final[sum_columns].sum(axis=1)
-        df_final['BldgLossRatio'] = (df_final['BldgLossUSD_aal'] + df_final['ContentLossUSD_aal']) / (df_final['Cost'].astype(float) + df_final['ContentCost'].astype(float))
+        # Cost & ContentCost are text (blank if missing)
+        df_final['BldgLossRatio'] = (df_final['BldgLossUSD_aal'] + df_final['ContentLossUSD_aal']) / (pd.to_numeric(df_final['Cost'], errors='coerce') + pd.to_numeric(df_final['ContentCost'], errors='coerce'))
         df_final['BldgLossRatioPct'] = df_final['BldgLossRatio'] * 100
         df_final.fillna(0, inplace=True)
         # Sort columns
@@ -133,9 +143,14 @@ class AAL():
             'Longitude',
         ]
         df_final = df_final[column_order_list]
+        return df_final
+
+    def export_sum(self):
+        """Export aggregated (sum) of all losses to CSV
+        """
         path = f'{self.output_path}{self.output_file}-AAL-Sum.csv'
         line_terminator='\n'
-        df_final.to_csv(path, index=False, line_terminator=line_terminator)
+        self.df_sum.to_csv(path, index=False, line_terminator=line_terminator)
 
     def set_aal_items(self):
         """Set all AAL items & iterate return periods for AAL calculations
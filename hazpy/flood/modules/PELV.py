@@ -13,6 +13,31 @@ import warnings
 warnings.filterwarnings('ignore')
 
 
+def read_tracts(tracts):
+    """Read & prepare tract polygons (Tract & geometry, EPSG:4326)
+
+    Prepared tracts are returned as they are (not copied), so a warm spatial
+    index is reused (e.g. tracts kept by the analysis service).
+
+    Args:
+        tracts (str or geodataframe): Tract polygons file (shapefile, GeoPackage, GeoJSON) or geodataframe with Tract (or GEOID, or STATE, COUNTY & TRACT) attribute
+
+    Returns:
+        geodataframe: Tract polygons
+    """
+    if not isinstance(tracts, str) and list(tracts.columns) == ['Tract', 'geometry'] and tracts.crs == 'EPSG:4326' and tracts['Tract'].map(type).eq(str).all():
+        return tracts
+    tracts = gpd.read_file(tracts) if isinstance(tracts, str) else tracts.copy()
+    if 'Tract' not in tracts.columns:
+        if 'GEOID' in tracts.columns:
+            tracts['Tract'] = tracts['GEOID'].astype(str)
+        else:
+            tracts['Tract'] = tracts['STATE'].astype(str) + tracts['COUNTY'].astype(str) + tracts['TRACT'].astype(str)
+    tracts = tracts[['Tract', 'geometry']].to_crs('EPSG:4326')
+    tracts['Tract'] = tracts['Tract'].astype(str)
+    return tracts
+
+
 class PELV():
     def __init__(self, input_data, output_dir, flood_type, analysis_type):
         self.input_data = input_data
@@ -268,6 +293,19 @@ class PELV():
             print(exc_type, exc_tb.tb_lineno)
             print('\n')
 
+    def get_tracts_file(self, tracts, points):
+        """Get tracts from a local tract polygon file (no Hazus database or Census REST API)
+
+        Args:
+            tracts (str or geodataframe): Tract polygons file (shapefile, GeoPackage, GeoJSON) or geodataframe with Tract (or GEOID, or STATE, COUNTY & TRACT) attribute
+            points (dataframe): UDF point data
+
+        Returns:
+            points_in_tracts (dataframe): Tracts containing UDF point data
+        """
+        tracts = read_tracts(tracts)
+        return self.intersect_tracts(points, tracts)
+
     def intersect_tracts(self, points, tracts):
         """Spatial intersect UDF point data with tract polygons
 
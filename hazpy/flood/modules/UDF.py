@@ -1,10 +1,13 @@
 from hazpy.flood.modules import AAL
-from hazpy.flood.modules import PELV
-from rasterio.features import shapes
+from hazpy.flood.modules.depth_sampler import DepthSampler
+from hazpy.flood.modules.results import Results
+from hazpy.flood.modules.run_report import RunReport
+from hazpy.flood.modules.structure_store import StructureStore
+from hazpy.flood.modules import writer
+from hazpy.flood.modules.zonal import ZonalStatistics
 
 import geopandas as gpd
 import logging
-import math
 import numpy as np
 import os
 import pandas as pd
@@ -29,6 +32,23 @@ class UDF:
         flood_type,
         analysis_type=None,
         return_periods=None,
+        bands=None,
+        dem=None,
+        sample_method='nearest',
+        window_size=3,
+        footprints=None,
+        footprint_stat='max',
+        dedup=True,
+        sparse=True,
+        exposed_only=False,
+        ddf_resolution=None,
+        hazard_zones=None,
+        tracts=None,
+        output='csv',
+        write_queue=2,
+        write_process=False,
+        cache=None,
+        progress=None,
     ):
         self.UDFOrig = UDFOrig
         self.LUT_Dir = LUT_Dir
@@ -39,7 +59,52 @@ class UDF:
         self.flood_type = flood_type
         self.analysis_type = analysis_type
         self.return_periods = return_periods
+        # Band index or NetCDF variable for each depth grid (multi-band / NetCDF return period stacks)
+        self.bands = bands if bands else [None] * len(DepthGrids)
+        # Ground elevation raster (or mosaic folder): DepthGrids are then water surface elevation (WSE) rasters
+        self.dem = dem
+        # Depth sampling: nearest, bilinear, or max/mean over a window_size x window_size pixel window
+        self.sample_method = sample_method
+        self.window_size = window_size
+        # Building footprint polygons (file or geodataframe with FltyId): depth is the footprint max or mean
+        self.footprints = footprints
+        self.footprint_stat = footprint_stat
+        self.footprint_stats = {}
+        # Dataframe path (sparse=False): evaluate damage once per unique (depth, occupancy, DDF, first floor height, foundation) key
+        # dedup & sparse only change the run time: every path writes the same output (see get_exposed for the structures that are not exposed)
+        self.dedup = dedup
+        self.dedup_ratios = {}
+        # Evaluate losses for exposed structures only; optionally write only exposed structures (& a dry count)
+        self.sparse = sparse
+        self.exposed_only = exposed_only
+        # Optional DDF tabulation step in ft (e.g. 0.01): damage is looked up from pre-tabulated curves (see get_ddf_table)
+        self.ddf_resolution = ddf_resolution
+        # Hazard (DDF LUT) per structure: flC attribute, else zone raster (1 Riverine, 2 Coastal A, 3 Coastal V), else flood_type
+        self.hazard_zones = hazard_zones
+        self.hazards = ['Riverine', 'CoastalA', 'CoastalV']
+        # Hazard of structures without a zone (flood types other than Riverine & Coastal A use the CoastalV LUTs)
+        self.hazard = self.get_hazard(flood_type) or 'CoastalV'
+        # Census tract polygons (file or geodataframe with Tract) for PELV, instead of the Hazus database or Census REST API
+        self.tracts = tracts
+        # Results: 'csv' (CSV files in ./UDF/output), 'memory' (typed dataframes in self.results, nothing written) or 'both'
+        self.write_results = output in ('csv', 'both')
+        self.keep_results = output in ('memory', 'both')
+        self.results = Results()
+        # CSV writes queued for the background writer (a thread, or a process if write_process) while the next depth grid is calculated (0: write in the pipeline)
+        self.write_queue = write_queue
+        self.write_process = write_process
+        self.writer = None
         self.cdir = os.getcwd()
+        # Warm lookup tables, DDF arrays, depth samplers & tracts shared between runs (see service.AnalysisCache)
+        self.cache = cache
+        # Called with each finished run report stage record (e.g. progress events of the analysis service)
+        self.progress = progress
+        self.depth_samplers = {}
+        # Lookup tables reshaped into arrays indexed by integer codes (built once per run, or once per cache)
+        # Each entry is assigned once fully built, as runs of other threads may read a shared cache
+        self.lookup_arrays = cache.get_lookup_arrays(LUT_Dir, ddf_resolution, fmap) if cache is not None else {}
+        # Per-stage wall & CPU time, rows & peak RSS of the last run (see get_run_report)
+        self.run_report = RunReport(progress)
 
     def adjust_depths(self, raster, pelv_depth=None):
         """ Extract grid (raster) to points &adjust for First Floor Height.
@@ -56,7 +121,7 @@ class UDF:
             raster['Depth_Grid'] = (raster[pelv_depth] + raster['Depth']).astype(str).str.slice(0, 15).astype(float).round(6)
             raster['Depth_in_Struc'] = raster.apply(fn_depth_grid, axis=1).astype(str).str.slice(0, 15).astype(float).round(6)
             # Check if UDF in the specified floodplain (Boolean)
-            raster['flExp'] = raster.apply(lambda x: 1 if x['Depth_in_Struc'] != -3.402823 else 0, axis=1)
+            raster['flExp'] = self.get_exposed(raster['Depth_Grid'].values).astype(int)
             #raster.drop(['index_right', 'Depth', 'geometry'], axis=1, inplace=True)
             raster.drop(['Depth', 'geometry'], axis=1, inplace=True)
         else:
@@ -64,11 +129,28 @@ class UDF:
             raster['Depth_Grid'] = raster['Depth'].astype(str).str.slice(0, 15).astype(float).round(6)
             raster['Depth_in_Struc'] = raster.apply(fn_depth_grid, axis=1).astype(str).str.slice(0, 15).astype(float).round(6)
             # Check if UDF in the specified floodplain (Boolean)
-            raster['flExp'] = raster.apply(lambda x: 1 if x['Depth_in_Struc'] != -3.402823 else 0, axis=1)
+            raster['flExp'] = self.get_exposed(raster['Depth_Grid'].values).astype(int)
             #raster.drop(['index_right', 'Depth', 'geometry'], axis=1, inplace=True)
             raster.drop(['Depth', 'geometry'], axis=1, inplace=True)
         return raster
 
+    def get_exposed(self, depth_grid):
+        """Get the structures exposed to flooding
+
+        A structure is exposed if its depth grid value (Depth_Grid) is positive: dry,
+        nodata & structures outside the grid are not. Every path (dataframe, dedup,
+        sparse & PELV) applies this rule: flExp is 1 for exposed structures only, and
+        the others keep their DDF IDs but have no damage, losses, debris or
+        restoration days.
+
+        Args:
+            depth_grid (array): Depth grid values
+
+        Returns:
+            array: Boolean array (True if exposed)
+        """
+        return np.asarray(depth_grid, dtype=float) > 0
+
     def change_directory(self):
         """Change directory
         """
@@ -166,19 +248,39 @@ class UDF:
         Returns:
             df: Pandas dataframe with SOID column
         """
-        df['sopre'] = [i[:1] + i[-(len(i) - 3) :] if i != 'REL1' else 'RE1' for i in df['Occ']]
-        df['somid'] = [self.create_somid(occ, num_stories) for occ, num_stories in zip(df['Occ'], df['NumStories'])]
-        df['sosuf'] = np.where(df['FoundationType'] == 4, 'B', 'N')
-        # Apply function to data frame rows
-        fn = lambda row: row['sopre'] + row['somid']  + row['sosuf']
-        df['SOID'] = df.apply(fn, axis=1)
-        df.drop(
-           ['sopre', 'somid', 'sosuf'],
-            axis=1,
-            inplace=True,
-        )
+        occ_codes, occs = pd.factorize(df['Occ'])
+        # Prefix & story class per distinct Occ (categorical codes), gathered for all rows
+        sopre = np.array([occ[:1] + occ[-(len(occ) - 3):] if occ != 'REL1' else 'RE1' for occ in occs] + [''], dtype=object)[occ_codes]
+        occ_class = np.array([{'RES3': 1, 'RES1': 2, 'RES2': 3}.get(occ[:4], 0) for occ in occs] + [0])[occ_codes]
+        df['SOID'] = sopre + self.create_somids(occ_class, df['NumStories'].values.astype(float)) + np.where(df['FoundationType'] == 4, 'B', 'N').astype(object)
         return df
 
+    def create_somids(self, occ_class, num_stories):
+        """Create SOM IDs (vectorized create_somid)
+
+        Args:
+            occ_class (array): Occupancy class (1: RES3, 2: RES1, 3: RES2, 0: all others)
+            num_stories (array): Number of stories
+
+        Returns:
+            array: SOMIDs
+        """
+        somids = np.empty(len(num_stories), dtype=object)
+        # RES3 has three categories: 1 3 5
+        somids[:] = np.select([num_stories > 4, num_stories > 2], ['5', '3'], '1')
+        # All other cases: 1-3, 4-7, 8+
+        other = occ_class == 0
+        somids[other] = np.select([num_stories[other] > 6, num_stories[other] > 3], ['H', 'M'], 'L')
+        # RES1: if NumStories is not an integer, assume Split Level residence
+        res1 = np.flatnonzero(occ_class == 2)
+        stories = num_stories[res1]
+        whole = np.isfinite(stories) & (stories == np.round(stories))
+        somids[res1] = 'S'
+        somids[res1[whole]] = stories[whole].astype('int64').astype(str).astype(object)
+        # Manuf. Housing is by definition limited to one story
+        somids[occ_class == 3] = '1'
+        return somids
+
     def get_field_names(self, input):
         """Get and assign field names
 
@@ -193,6 +295,9 @@ class UDF:
 
     def get_flood_damage(self):
         """Calculate losses for flood damage
+
+        Returns:
+            Results: Standard losses per depth grid, AAL & PELV losses (typed dataframes, empty unless output is 'memory' or 'both')
         """
         logger = logging.getLogger('FAST')
         logger.setLevel(logging.INFO)
@@ -210,15 +315,31 @@ class UDF:
         logger.info('\n')
         logger.info('Calculation FL Building & Content Losses...')
         counter = 0
+        self.run_report = RunReport(self.progress)
+        self.results = Results()
+        self.run_report.info = {
+            'udf': self.get_udf_name(),
+            'depth_grids': [self.get_grid_name(depth_grid, band) for depth_grid, band in zip(self.DepthGrids, self.bands)],
+            'flood_type': self.flood_type,
+            'analysis_type': self.analysis_type,
+            'sparse': self.sparse,
+            'dedup': self.dedup,
+            'status': 'running',
+        }
         try:
             # Measure script performance
             start_time = time.time()
             #print(f'\nStart time: {start_time}\n')
             #QC_Warning = self.QC_Warning.lower() == 'true'
         #    self.log_messages()
-            self.create_output_folders()
+            if self.write_results:
+                self.create_output_folders()
+                if self.write_queue:
+                    self.writer = writer.AsyncWriter(self.write_queue, self.write_process)
             self.change_directory()
-            input = self.read_csv(self.UDFOrig)
+            with self.run_report.stage('read') as stage:
+                input = self.read_csv(self.UDFOrig)
+                stage['rows_out'] = len(input)
             input_fields = self.get_field_names(input)
             # TODO: Check that input columns df has the required fields --> compare list(input.columns) to required_fields
             required_fields = ['UserDefinedFltyId', 'FltyId', 'OccupancyClass', 'Occ', 'Cost', 'Area', 'NumStories', 'FoundationType', 'FirstFloorHt', 'latitude', 'longitude', 'Latitude', 'Longitude']
@@ -228,201 +349,540 @@ class UDF:
                 )
             field_check = self.check_fields(input_fields, required_fields)
             print(f'\nAre all required fields provided? {field_check}\n')
+            if 'flC' in input.columns or self.hazard_zones:
+                with self.run_report.stage('hazard_zones', len(input)):
+                    input['HazardZone'] = self.get_hazard_zones(input)
             self.set_output_fields()
             lookup_tables = ['Building_DDF_Riverine_LUT_Hazus4p0.csv', 'Building_DDF_CoastalA_LUT_Hazus4p0.csv', 'Building_DDF_CoastalV_LUT_Hazus4p0.csv', 'flBldgStructDmgFn.csv', 'Content_DDF_Riverine_LUT_Hazus4p0.csv', 'Content_DDF_CoastalA_LUT_Hazus4p0.csv', 'Content_DDF_CoastalV_LUT_Hazus4p0.csv', 'flBldgContDmgFn.csv', 'Inventory_DDF_LUT_Hazus4p0.csv', 'flBldgInvDmgFn.csv', 'flBldgEconParamSalesAndInv.csv', 'flDebris_LUT.csv', 'flRsFnGBS_LUT.csv']
             table_names = ['bddf_lut_riverine', 'bddf_lut_coastalA', 'bddf_lut_coastalV', 'bddf_lut_full', 'cddf_lut_riverine', 'cddf_lut_coastalA', 'cddf_lut_coastalV', 'cddf_lut_full', 'iddf_lut_riverine', 'iddf_lut_full', 'iecon_lut', 'debris_lut', 'rest_lut']
-            lookup_tables_df_list = self.get_lookup_table(lookup_tables, table_names)
+            with self.run_report.stage('lookup_tables'):
+                lookup_tables_df_list = self.get_lookup_table(lookup_tables, table_names)
       #      for table in lookup_tables_df_list:
                 #self.check_values(table)
                 # self.check_optional_fields()
             aal_df_list = []
-            for depth_grid in self.DepthGrids:
-                file_name = os.path.splitext(os.path.basename(depth_grid))[0]
+            depth_grids = list(zip(self.DepthGrids, self.bands))
+            with self.run_report.stage('sample', len(input), grids=len(depth_grids)):
+                depth_matrix = self.get_depth_matrix(input, depth_grids)
+            structure_store = self.create_structure_store(input) if self.sparse else None
+            for grid_index, (depth_grid, band) in enumerate(depth_grids):
+                file_name = self.get_grid_name(depth_grid, band)
                 print(f'Calculating Standard Losses for {file_name} Depth Grid...')
-                point_gdf = self.create_geo_df(input)
-                point_depths = self.get_depth_grid(depth_grid, point_gdf)
-                point_depths = self.adjust_depths(point_depths)
-                # self.check_coastal_zone()     --> "" if CoastalZoneCode is None else CoastalZoneCode
-                # self.check_basement()         --> sosuf = 'B' if foundationType == 4 else 'N'
-                # self.get_num_stories()        --> isn't this already done/provided?
-                point_depths = self.create_specific_occ_id(point_depths)
-                # TODO: Adjust all losts/costs for Coastal check
-                # TODO: Add lookup check (for losses/costs) if input id's are missing (ie: inventory)
-                point_depths = self.get_content_cost(point_depths)
-                point_depths = self.get_inventory_cost(point_depths)
-                point_depths = self.get_building_loss(point_depths)
-                point_depths = self.get_content_loss(point_depths)
-                point_depths = self.get_inventory_loss(point_depths)
-                point_depths = self.get_debris(point_depths)
-                point_depths = self.get_restore_time(point_depths)
                 # Order column names
                 column_names = ['FltyId', 'HNL_UDF_EQ', 'Occ', 'Cost', 'NumStories', 'FoundationType', 'FirstFloorHt', 'Area', 'ContentCost', 'BldgDamageFnID', 'CDDF_ID', 'YEARBUILT', 'Tract', 'Latitude', 'Longitude', 'Depth_Grid', 'Depth_in_Struc', 'flExp', 'SOID', 'ContentCostUSD', 'InventoryCostUSD', 'BldgDmgPct', 'BldgLossUSD', 'CDDF_ID', 'ContDmgPct', 'ContentLossUSD', 'IDDF_ID', 'InvDmgPct', 'InventoryLossUSD', 'DebrisID', 'Debris_Fin', 'Debris_Struc', 'Debris_Found', 'Debris_Tot', 'Restor_Days_Min', 'Restor_Days_Max', 'GridName']
-                point_depths = point_depths.reindex(columns=column_names)
-                output_file = os.path.splitext(os.path.basename(depth_grid))[0]
+                if self.footprints is not None:
+                    column_names = column_names[:-1] + ['Depth_Max', 'Depth_Mean', 'FractionWetted'] + column_names[-1:]
+                if 'HazardZone' in input.columns:
+                    column_names.insert(column_names.index('SOID'), 'HazardZone')
+                if self.sparse:
+                    store = structure_store.copy()
+                    store.set('Depth', depth_matrix[:, grid_index])
+                    store.set('GridName', np.full(len(store), file_name, dtype=object))
+                    if grid_index in self.footprint_stats:
+                        for column in self.footprint_stats[grid_index].columns:
+                            store.set(column, self.footprint_stats[grid_index][column].values)
+                    self.get_sparse_losses(store, file_name)
+                    with self.run_report.stage('output_frame', len(store), grid=file_name):
+                        point_depths = store.to_dataframe([column for column in dict.fromkeys(column_names) if column in store])
+                        # Missing input values are 0 (debris & unmatched restoration days blank)
+                        blank_columns = ['DebrisID', 'Debris_Fin', 'Debris_Struc', 'Debris_Found', 'Debris_Tot', 'Restor_Days_Min', 'Restor_Days_Max']
+                        point_depths = point_depths.fillna({column: 0 for column in point_depths.columns if column not in blank_columns})
+                        point_depths = point_depths.reindex(columns=column_names)
+                else:
+                    with self.run_report.stage('geo_df', len(input), grid=file_name):
+                        point_gdf = self.create_geo_df(input)
+                        point_depths = self.get_depth_grid(depth_grid, point_gdf, band, depth_matrix[:, grid_index])
+                        if grid_index in self.footprint_stats:
+                            for column in self.footprint_stats[grid_index].columns:
+                                point_depths[column] = self.footprint_stats[grid_index][column].values
+                    point_depths = self.get_losses(point_depths, file_name)
+                    with self.run_report.stage('debris', len(point_depths), grid=file_name):
+                        point_depths = self.get_debris(point_depths)
+                    with self.run_report.stage('restore', len(point_depths), grid=file_name):
+                        point_depths = self.get_restore_time(point_depths)
+                    with self.run_report.stage('output_frame', len(point_depths), grid=file_name):
+                        point_depths = point_depths.reindex(columns=column_names)
+                output_file = file_name
                 # Sort values by Depth in Structure (descending)
-                point_depths.sort_values(by=['Depth_in_Struc'], ascending=False, inplace=True)
+                with self.run_report.stage('sort', len(point_depths), grid=file_name):
+                    point_depths.sort_values(by=['Depth_in_Struc'], ascending=False, inplace=True)
+                if self.keep_results:
+                    self.results.add_grid(file_name, point_depths)
                 # AAL: Add dataframe to list
                 if (self.analysis_type and ('Average Annualized Loss (AAL)') in self.analysis_type and self.return_periods):
                     path = f'./UDF/output/aal/{output_file}-Standard.csv'
-                    self.write_csv(point_depths, path)
+                    if self.write_results:
+                        self.submit_write(point_depths, path, file_name, self.exposed_only)
                     point_depths.name = depth_grid
                     aal_df_list.append(point_depths)
                 elif (self.analysis_type and ('Average Annualized Loss (AAL) with PELV') in self.analysis_type):
                     path = f'./UDF/output/pelv/{output_file}-PELV-100.csv'
-                    self.write_csv(point_depths, path)
+                    if self.write_results:
+                        self.submit_write(point_depths, path, file_name, self.exposed_only)
                     point_depths.name = '100'
                     aal_df_list.append(point_depths) # for AAL calculations
                 else:
                     path = f'./UDF/output/standard/{output_file}.csv'
-                    self.write_csv(point_depths, path)
+                    if self.write_results:
+                        self.submit_write(point_depths, path, file_name, self.exposed_only)
                 # PELV Analysis
                 if (self.analysis_type and ('Average Annualized Loss (AAL) with PELV') in self.analysis_type):
-                    UDFRoot = os.path.basename(self.UDFOrig)
+                    UDFRoot = self.get_udf_name()
                     y = os.path.split(depth_grid)[1]
                     x = UDFRoot.split('.')[0] + "_" + y.split('.')[0]
                     output_dir = os.path.join(self.ResultsDir, "for-demo", x + ".csv")
+                    # PELV needs pyodbc & requests (Hazus database, Census API): only imported for PELV runs
+                    from hazpy.flood.modules import PELV
                     pelv = PELV.PELV(
                         point_depths, output_dir, self.flood_type, self.analysis_type
                     )
-                    self.run_pelv(pelv, input, point_depths, depth_grid, aal_df_list)
+                    # PELV changes the point depths dataframe
+                    self.wait_writes()
+                    with self.run_report.stage('pelv', len(point_depths), grid=file_name):
+                        self.run_pelv(pelv, input, point_depths, depth_grid, aal_df_list, band, depth_matrix[:, grid_index])
             # AAL Analysis
             if (self.analysis_type and ('Average Annualized Loss (AAL)') in self.analysis_type and self.return_periods):
-                UDFRoot = os.path.basename(self.UDFOrig)
+                UDFRoot = self.get_udf_name()
                 y = os.path.split(depth_grid)[1]
                 x = UDFRoot.split('.')[0] + "_" + y.split('.')[0]
                 output_dir = os.path.join(self.ResultsDir, "aal", x + ".csv")
                 output_path = './UDF/output/aal/'
                 output_file = os.path.splitext(os.path.basename(depth_grid))[0]
-                AAL.AAL(output_dir, self.return_periods, aal_df_list, output_path, output_file)
+                # AAL changes the dataframes of the depth grids
+                self.wait_writes()
+                with self.run_report.stage('aal', sum(len(df) for df in aal_df_list), grids=len(aal_df_list)):
+                    aal = AAL.AAL(output_dir, self.return_periods, aal_df_list, output_path, output_file, self.write_results)
+                if self.keep_results:
+                    self.results.add_aal(aal)
                 # self.log_messages()
                 # self.create_message()
                 #print(f'\nPoint Depths Final Row Count:\n {len(point_depths.index)}')
+            self.close_writer()
             print('\nProcess completed successfully.')
             self.get_run_time(start_time)
+            self.run_report.info['status'] = 'completed'
         except Exception as e:
             print(e)
+            self.close_writer(raise_error=False)
+            self.run_report.info['status'] = 'failed'
+            self.run_report.info['error'] = str(e)
+        if self.write_results:
+            self.write_run_report()
+        return self.results
 
-    def get_loss_fn(self, row):
-        """Get loss function (for lambda expressions)
+    def get_losses(self, df, grid_name):
+        """Calculate depth in structure, costs & building, content & inventory losses
 
         Args:
-            row (series): [description]
+            df (dataframe): Pandas dataframe with Depth attribute from depth grid
+            grid_name (str): Depth grid name
 
         Returns:
-            fn: Lambda function
+            dataframe: Pandas dataframe with loss fields
         """
-        try:
-            l_index_column = row['l_index']
-            u_index_column = row['u_index']
-            fn = row[l_index_column] + (row['Depth_in_Struc'] - math.floor(row['Depth_in_Struc'])) * (row[u_index_column] - row[l_index_column] if row['Depth_in_Struc'] > 0 else 0) 
-            return fn
-        except:
-            pass
+        if self.dedup:
+            return self.get_dedup_losses(df, grid_name)
+        with self.run_report.stage('adjust', len(df), grid=grid_name):
+            df = self.adjust_depths(df)
+        # self.check_coastal_zone()     --> "" if CoastalZoneCode is None else CoastalZoneCode
+        # self.check_basement()         --> sosuf = 'B' if foundationType == 4 else 'N'
+        # self.get_num_stories()        --> isn't this already done/provided?
+        with self.run_report.stage('soid', len(df), grid=grid_name):
+            df = self.create_specific_occ_id(df)
+        # TODO: Adjust all losts/costs for Coastal check
+        # TODO: Add lookup check (for losses/costs) if input id's are missing (ie: inventory)
+        with self.run_report.stage('costs', len(df), grid=grid_name):
+            df = self.get_content_cost(df)
+            df = self.get_inventory_cost(df)
+        with self.run_report.stage('losses', len(df), grid=grid_name):
+            for field, values in self.get_fused_losses(df['Depth_in_Struc'].values, df, df, self.get_exposed(df['Depth_Grid'])).items():
+                df[field] = values
+            df.fillna(0, inplace=True)
+        return df
 
-    def get_building_loss(self, df):
-        """ Populate BldgLossUSD field from lookup table
+    def create_structure_store(self, input):
+        """Create the structure store of the UDF input
+
+        SOID & content & inventory costs do not depend on depth, so they are
+        calculated once for all depth grids.
 
         Args:
-            df (dataframe): Pandas dataframe
+            input (dataframe): UDF input data
 
         Returns:
-            df: Pandas dataframe
+            StructureStore: Structure store with input fields, SOID, ContentCostUSD & InventoryCostUSD
         """
-        print('\tCalculating Building Loss...')
-        if 'BldgDamageFnID' in self.fmap:
-            lookup_table = "flBldgStructDmgFn.csv"
-        else:
-            if self.flood_type == 'Riverine':
-                lookup_table = "Building_DDF_Riverine_LUT_Hazus4p0.csv"
-            elif self.flood_type in ('CAE', 'Coastal A'):
-                lookup_table = "Building_DDF_CoastalA_LUT_Hazus4p0.csv"
-            else:
-                lookup_table = "Building_DDF_CoastalV_LUT_Hazus4p0.csv"
-        lookup_table_df = self.get_lookup_table(lookup_table)
-        if 'BldgDamageFnID' in self.fmap:
-            df = df.merge(lookup_table_df, how='left', left_on='BldgDamageFnID', right_on='BldgDmgFnID')
-        else:
-            df = df.merge(lookup_table_df, how='left', left_on='SOID', right_on='SpecificOccupId') 
-        df['l_index'] = np.where(df['Depth_in_Struc'].apply(np.floor) < 0, 'm', 'p') + np.where(df['Depth_in_Struc'] > 24, '24', df['Depth_in_Struc'].abs().apply(np.floor).astype(str).apply(lambda x: x.replace('.0','')))
-        df['u_index'] = np.where(df['Depth_in_Struc'].apply(np.ceil) < 0, 'm', 'p') + np.where(df['Depth_in_Struc'] > 24, '24', df['Depth_in_Struc'].abs().apply(np.ceil).astype(str).apply(lambda x: x.replace('.0','')))
-        try:
-            df['BldgDmgPct'] = df.apply(lambda row: self.get_loss_fn(row), axis=1)
-            df['BldgLossUSD'] =  (df['BldgDmgPct'] / 100) * df['Cost']
-            df['BldgLossUSD'] = df['BldgLossUSD'].astype(str).str.slice(0, 15).astype(float).round(2)
-            if 'BldgDamageFnID' in self.fmap:
-                remove_columns = ['BldgDmgFnID', 'Occupancy', 'Source', 'Description', 'm4', 'm3', 'm2','m1', 'p0', 'p1', 'p2', 'p3', 'p4', 'p5', 'p6', 'p7', 'p8', 'p9', 'p10','p11', 'p12', 'p13', 'p14', 'p15', 'p16', 'p17', 'p18', 'p19', 'p20','p21', 'p22', 'p23', 'p24', 'Comment', 'l_index', 'u_index']
-                df = self.remove_columns(df, remove_columns)
-            else:
-                df['BldgDamageFnID'] = df['DDF_ID']
-                df = df[df.columns.drop(list(df.filter(regex='_y')))]
-            return df
-        except Exception as e:
-            print(e)
-        return df
+        with self.run_report.stage('soid', len(input)):
+            df = self.create_specific_occ_id(input.copy())
+        with self.run_report.stage('costs', len(df)):
+            df = self.get_content_cost(df)
+            df = self.get_inventory_cost(df)
+        with self.run_report.stage('structure_store', len(df)) as stage:
+            store = StructureStore.from_dataframe(df)
+            stage['store_mb'] = round(store.nbytes() / 1e6, 3)
+        return store
+
+    def get_sparse_losses(self, store, grid_name):
+        """Calculate losses for exposed structures only
+
+        Structures that are not exposed (see get_exposed) have flExp 0, no damage,
+        losses & restoration days (0) or debris (blank), as in the dataframe path; the
+        DDF kernel (get_fused_losses) still looks up their DDF IDs. Only exposed
+        structures go through the damage interpolation, US$ losses, debris &
+        restoration lookups, and the results are set on the structure store.
 
-    def get_content_loss(self, df):
-        """ Populate ContentLossUSD field from lookup table
+        Args:
+            store (StructureStore): Structure store with Depth attribute from depth grid
+            grid_name (str): Depth grid name
+        """
+        with self.run_report.stage('adjust', len(store), grid=grid_name) as stage:
+            depth = store.get('Depth')
+            first_floor_height = store.get('FirstFloorHt').astype(float)
+            store.set('Depth_Grid', self.get_depth_field(pd.Series(depth)).values)
+            store.set('Depth_in_Struc', self.get_depth_field(pd.Series(np.where(depth < 0, depth, depth - first_floor_height))).values)
+            exposed = self.get_exposed(store.get('Depth_Grid'))
+            wet = np.flatnonzero(exposed)
+            print(f'\tExposed structures: {len(wet)} of {len(store)}')
+            store.set('flExp', exposed.astype('int32'))
+            stage['rows_out'] = len(wet)
+        with self.run_report.stage('losses', len(wet), grid=grid_name):
+            keys = {field: store.get_categorical(field) for field in ('SOID', 'Occ', 'HazardZone', 'BldgDamageFnID', 'CDDF_ID') if field in store}
+            damage = self.get_fused_losses(store.get('Depth_in_Struc'), keys, exposed=exposed)
+            costs = {field: store.get(field, wet) for field in ('Cost', 'ContentCostUSD', 'InventoryCostUSD')}
+            losses = self.get_losses_usd({field: damage[field][wet] for field in ('BldgDmgPct', 'ContDmgPct', 'InvDmgPct')}, costs)
+            for field, values in damage.items():
+                store.set(field, np.nan_to_num(values))
+            for field in ('BldgLossUSD', 'ContentLossUSD', 'InventoryLossUSD'):
+                store.set(field, np.nan_to_num(losses[field]), rows=wet, fill=0)
+        with self.run_report.stage('debris', len(wet), grid=grid_name):
+            occ = store.get('Occ', wet)
+            debris_ids, debris = self.get_debris_values(occ, store.get('FoundationType', wet), store.get('Depth_Grid', wet))
+            # Missing areas are 0 (as in the output & the dataframe path)
+            area = np.nan_to_num(store.get('Area', wet).astype(float))
+            store.set('DebrisID', debris_ids, rows=wet, fill='')
+            store.set('Debris_Fin', area * debris[:, 0] / 1000, rows=wet)
+            store.set('Debris_Found', area * debris[:, 2] / 1000, rows=wet)
+            store.set('Debris_Struc', area * debris[:, 1] / 1000, rows=wet)
+            store.set('Debris_Tot', store.get('Debris_Fin') + store.get('Debris_Found') + store.get('Debris_Struc'))
+        with self.run_report.stage('restore', len(wet), grid=grid_name):
+            days = self.get_restore_days(occ, store.get('Depth_Grid', wet))
+            if not np.isnan(days).any():
+                days = days.astype('int32')
+            store.set('Restor_Days_Min', days[:, 0], rows=wet, fill=0)
+            store.set('Restor_Days_Max', days[:, 1], rows=wet, fill=0)
+
+    def get_depth_field(self, depth):
+        """Format depth field values (15 characters, 6 decimals)
 
         Args:
-            df (dataframe): Pandas dataframe
+            depth (series): Depth values
 
         Returns:
-            df: Pandas dataframe
+            series: Formatted depth values
         """
-        print('\tCalculating Content Loss...')
-        if 'CDDF_ID' in self.fmap:
-            lookup_table = "flBldgContDmgFn.csv"
-        else:
-            if self.flood_type == 'Riverine':
-                lookup_table = "Content_DDF_Riverine_LUT_Hazus4p0.csv"
-            elif self.flood_type in ('CAE', 'Coastal A'):
-                lookup_table = "Content_DDF_CoastalA_LUT_Hazus4p0.csv"
+        return depth.astype(str).str.slice(0, 15).astype(float).round(6)
+
+    def get_loss_usd(self, damage_pct, cost):
+        """Calculate loss in US$ from damage percent
+
+        Args:
+            damage_pct (series): Damage percent
+            cost (series): Replacement cost
+
+        Returns:
+            series: Loss in US$
+        """
+        loss = (damage_pct / 100) * cost
+        return loss.astype(str).str.slice(0, 15).astype(float).round(2)
+
+    def get_ddf_table(self, family):
+        """Get the depth-damage functions of a curve family as an array
+
+        Building & content curves of the Hazus LUTs depend on the hazard: the Riverine,
+        CoastalA & CoastalV curves are stacked in one array and each hazard's curves
+        start at its offset, so structures in different hazard zones are evaluated in
+        the same pass (see get_fused_losses). User DDF libraries & inventory curves do
+        not depend on the hazard (a single table).
+
+        With a DDF resolution the curves are also tabulated from -4 to +24 ft at that
+        step (float32), so damage is a single index per structure: the nearest tabulated
+        depth, rounded to 0.01 (the precision of the curve values, see get_fused_losses).
+        The deviation from the exact interpolation is at most the steepest 1 ft step of
+        the family's curves x resolution / 2 (max_deviation, in percent damage): at
+        0.01 ft that is 0.3 / 0.375 (Hazus building / content curves, the Coastal curves
+        being the steepest) and 0.5 for the full user DDF libraries (100 % in 1 ft),
+        plus 0.005 for the rounding.
+
+        Args:
+            family (str): building, content or inventory
+
+        Returns:
+            dict: Curve keys (index per hazard), hazard offsets, key field, DDF curves (curves x m4..p24), DDF IDs (None for user DDF IDs) & tabulated curves (curves x steps) & max deviation (with a DDF resolution)
+        """
+        if family not in self.lookup_arrays:
+            hazards = [None]
+            if family == 'building' and 'BldgDamageFnID' in self.fmap:
+                lookup_table, key, field, ddf_id = 'flBldgStructDmgFn.csv', 'BldgDmgFnID', 'BldgDamageFnID', None
+            elif family == 'building':
+                lookup_table, key, field, ddf_id = 'Building_DDF_{}_LUT_Hazus4p0.csv', 'SpecificOccupId', 'SOID', 'DDF_ID'
+                hazards = self.hazards
+            elif family == 'content' and 'CDDF_ID' in self.fmap:
+                lookup_table, key, field, ddf_id = 'flBldgContDmgFn.csv', 'ContDmgFnId', 'CDDF_ID', None
+            elif family == 'content':
+                lookup_table, key, field, ddf_id = 'Content_DDF_{}_LUT_Hazus4p0.csv', 'SpecificOccupId', 'SOID', 'DDF_ID'
+                hazards = self.hazards
             else:
-                lookup_table = "Content_DDF_CoastalV_LUT_Hazus4p0.csv"
-        lookup_table_df = self.get_lookup_table(lookup_table)
-        if 'CDDF_ID' in self.fmap:
-            df = df.merge(lookup_table_df, how='left', left_on='CDDF_ID', right_on='ContDmgFnId')
+                lookup_table, key, field, ddf_id = 'Inventory_DDF_LUT.csv', 'Occupancy', 'Occ', 'DDF_ID'
+            columns = ['m4', 'm3', 'm2', 'm1'] + [f'p{depth}' for depth in range(25)]
+            tables = []
+            for hazard in hazards:
+                lookup_table_df = self.get_lookup_table(lookup_table.format(hazard))
+                if family == 'inventory':
+                    econ_lookup_df = self.get_lookup_table('flBldgEconParamSalesAndInv.csv')
+                    lookup_table_df = lookup_table_df[lookup_table_df['Occupancy'].isin(econ_lookup_df['Occupancy'])]
+                tables.append(lookup_table_df.drop_duplicates(key))
+            curves = np.concatenate([table[columns].values.astype(float) for table in tables])
+            ddf = {
+                'keys': [pd.Index(table[key]) for table in tables],
+                'offsets': np.cumsum([0] + [len(table) for table in tables[:-1]]),
+                'field': field,
+                'curves': curves,
+                'ddf_ids': np.concatenate([table[ddf_id].values.astype(float) for table in tables]) if ddf_id else None,
+            }
+            if self.ddf_resolution:
+                steps = int(round(28 / self.ddf_resolution))
+                depth = np.linspace(-4, 24, steps + 1)
+                lower = np.floor(depth)
+                fraction = depth - lower
+                lower = lower.astype(int) + 4
+                upper = np.ceil(depth).astype(int) + 4
+                ddf['tabulated'] = (curves[:, lower] + fraction * (curves[:, upper] - curves[:, lower])).astype('float32')
+                ddf['max_deviation'] = (np.abs(np.diff(curves, axis=1)).max() if curves.size > 0 else 0) * self.ddf_resolution / 2
+            self.lookup_arrays[family] = ddf
+        return self.lookup_arrays[family]
+
+    def get_fused_losses(self, depth_in_struc, keys, costs=None, exposed=None):
+        """Calculate building, content & inventory damage (& losses) in one pass
+
+        The depth in structure is clamped to the curve range (-4 to +24 ft, curves are
+        piecewise-linear on 1 ft steps) and decomposed once into floor & ceiling columns
+        & fraction, as in the Hazus lookup (m/p + floor & ceiling of the depth). The
+        three curve families are evaluated with the same column indexes by direct index
+        into the DDF arrays. Structures without a curve have no damage (NaN), structures
+        that are not exposed (see get_exposed) have 0 damage & their DDF IDs.
+
+        Building & content curves are selected per structure by HazardZone (Riverine,
+        CoastalA or CoastalV; the flood type of the run without a zone). As in udf.py,
+        structures in a coastal zone without a coastal curve (the Hazus coastal curves
+        are RES only) use the Riverine curve.
+
+        Args:
+            depth_in_struc (array): Depth in structure
+            keys (dataframe or dict): Curve key fields (SOID, Occ, optional HazardZone & user BldgDamageFnID / CDDF_ID)
+            costs (dataframe or dict, optional): Cost, ContentCostUSD & InventoryCostUSD. Defaults to None (damage only).
+            exposed (array, optional): Exposed structures (see get_exposed). Defaults to None (all).
+
+        Returns:
+            dict: Arrays for BldgDmgPct, ContDmgPct, InvDmgPct, DDF IDs (BldgDamageFnID & CDDF_ID unless user provided, IDDF_ID) & US$ losses (with costs)
+        """
+        print('\tCalculating Building, Content & Inventory Loss...')
+        depth = np.clip(np.asarray(depth_in_struc, dtype=float), -4, 24)
+        valid = np.isfinite(depth)
+        depth = np.where(valid, depth, 0)
+        if self.ddf_resolution:
+            # Nearest tabulated depth (steps of 28 ft / number of steps)
+            steps = int(round(28 / self.ddf_resolution))
+            step = np.rint((depth + 4) * steps / 28).astype(int)
         else:
-            df = df.merge(lookup_table_df, how='left', left_on='SOID', right_on='SpecificOccupId')
-        df['l_index'] = np.where(df['Depth_in_Struc'].apply(np.floor) < 0, 'm', 'p') + np.where(df['Depth_in_Struc'] > 24, '24', df['Depth_in_Struc'].abs().apply(np.floor).astype(str).apply(lambda x: x.replace('.0','')))
-        df['u_index'] = np.where(df['Depth_in_Struc'].apply(np.ceil) < 0, 'm', 'p') + np.where(df['Depth_in_Struc'] > 24, '24', df['Depth_in_Struc'].abs().apply(np.ceil).astype(str).apply(lambda x: x.replace('.0','')))
-        try:
-            df['ContDmgPct'] = df.apply(lambda row: self.get_loss_fn(row), axis=1)
-            df['ContentLossUSD'] =  ((df['ContDmgPct'] / 100) * df['Cost']) / 2
-            df['ContentLossUSD'] = df['ContentLossUSD'].astype(str).str.slice(0, 15).astype(float).round(2)
-            if 'CDDF_ID' in self.fmap:
-                remove_columns = ['Occupancy', 'Source', 'Description', 'm4', 'm3', 'm2', 'm1', 'p0', 'p1', 'p2', 'p3', 'p4', 'p5', 'p6', 'p7', 'p8', 'p9', 'p10', 'p11', 'p12', 'p13', 'p14', 'p15', 'p16', 'p17', 'p18', 'p19', 'p20', 'p21', 'p22', 'p23', 'p24', 'Comment', 'l_index', 'u_index']
-                df = self.remove_columns(df, remove_columns)
+            lower = np.floor(depth)
+            fraction = depth - lower
+            # Column indexes: m4..m1 are 0..3, p0..p24 are 4..28
+            lower = lower.astype(int) + 4
+            upper = np.ceil(depth).astype(int) + 4
+        default_zone = self.hazards.index(self.hazard)
+        if 'HazardZone' in keys:
+            codes, zone_values = pd.factorize(keys['HazardZone'])
+            zone_indexes = pd.Index(self.hazards).get_indexer(zone_values)
+            zone_indexes[zone_indexes < 0] = default_zone
+            zone = np.append(zone_indexes, default_zone)[codes]
+            zones = set(zone_indexes) if len(zone_indexes) > 0 else {default_zone}
+        else:
+            zone = None
+            zones = {default_zone}
+        damage = {}
+        key_codes = {}
+        for family, pct_field, id_field in [('building', 'BldgDmgPct', 'BldgDamageFnID'), ('content', 'ContDmgPct', 'CDDF_ID'), ('inventory', 'InvDmgPct', 'IDDF_ID')]:
+            ddf = self.get_ddf_table(family)
+            if ddf['field'] not in key_codes:
+                key_codes[ddf['field']] = pd.factorize(keys[ddf['field']])
+            codes, key_values = key_codes[ddf['field']]
+            curve = np.append(ddf['keys'][0].get_indexer(key_values), -1)[codes]
+            if len(ddf['keys']) > 1:
+                for hazard in sorted(zones - {0}):
+                    index = np.append(ddf['keys'][hazard].get_indexer(key_values), -1)[codes]
+                    in_zone = index >= 0 if zone is None else (zone == hazard) & (index >= 0)
+                    curve = np.where(in_zone, ddf['offsets'][hazard] + index, curve)
+            found = valid & (curve >= 0)
+            pct = np.full(len(depth), np.nan)
+            if exposed is not None:
+                found &= exposed
+                pct[~exposed] = 0
+            if self.ddf_resolution:
+                # Rounded once to the precision of the curve values (no float32 digits in the results)
+                pct[found] = ddf['tabulated'][curve[found], step[found]].astype(float).round(2)
             else:
-                df['CDDF_ID'] = df['DDF_ID_y']
-                df = df[df.columns.drop(list(df.filter(regex='_y')))]
-            return df
-        except Exception as e:
-            print(e)
+                curves = ddf['curves'].ravel()
+                offset = curve[found] * ddf['curves'].shape[1]
+                lower_value = curves[offset + lower[found]]
+                pct[found] = lower_value + fraction[found] * (curves[offset + upper[found]] - lower_value)
+            damage[pct_field] = pct
+            if ddf['ddf_ids'] is not None:
+                damage[id_field] = np.where(curve >= 0, ddf['ddf_ids'][curve], np.nan)
+        damage['InvDmgPct'] = damage['InvDmgPct'].round(2)
+        damage['IDDF_ID'] = np.nan_to_num(damage['IDDF_ID']).astype(int)
+        if costs is not None:
+            damage = self.get_losses_usd(damage, costs)
+        return damage
+
+    def get_hazard(self, zone):
+        """Get the hazard (DDF LUT) of a flood type or coastal zone code
+
+        Accepts the flood types of the GUI & hazard_types.json (Riverine, HazardRiverine,
+        Coastal A, CAE, Coastal V, V), FEMA zones (A, AE, V, VE) & the zone raster codes
+        (1 Riverine, 2 Coastal A, 3 Coastal V).
 
-    def create_debris_id(self, occ, foundation_type, depth):
-        """Create DebrisID field
+        Args:
+            zone (str or float): Flood type, zone code (flC) or zone raster value
+
+        Returns:
+            str: Riverine, CoastalA or CoastalV (None if blank or unknown)
+        """
+        if isinstance(zone, (int, float, np.number)):
+            if not np.isfinite(zone) or zone != int(zone):
+                return None
+            zone = str(int(zone))
+        zone = str(zone).strip().upper().replace(' ', '').replace('_', '')
+        if zone in ('RIVERINE', 'HAZARDRIVERINE', 'R', '1'):
+            return 'Riverine'
+        if zone in ('COASTALA', 'CAE', 'CA', 'A', 'AE', '2'):
+            return 'CoastalA'
+        if zone in ('COASTALV', 'CV', 'V', 'VE', '3'):
+            return 'CoastalV'
+        return None
+
+    def get_hazard_zones(self, input):
+        """Get the hazard zone of each structure
+
+        The flC attribute is used where given, then the zone raster (hazard_zones:
+        1 Riverine, 2 Coastal A, 3 Coastal V; nodata, other values & points outside
+        the raster have no zone), then the flood type of the run.
 
         Args:
-            occ (str): UDF OCC column
-            foundation_type (str): Foundation Type
-            depth (float): Raster depth grid value
+            input (dataframe): UDF input data (Latitude & Longitude, optional flC)
 
         Returns:
-            str: DebrisID or empty string (if no match)
-        """
-        if depth > 0:
-            bsm = 'NB' # no basement (default)
-            fnd = ('SG' if foundation_type in (4, 7) else 'FT')
-            if occ in ('RES1', 'COM6') and foundation_type == 4:
-                bsm = ('B' if occ == 'RES1' else 'NB')
-                dsuf = ('-8' if depth < -4 else '-4' if depth < 0 else '0' if depth < 4 else '4' if depth < 6 else '6' if depth < 8 else '8')
-            else:
-                dsuf = ('0' if depth < 1 else '1' if depth < 4 else '4' if depth < 8 else '8' if depth < 12 else '12')
-            debris_id = occ + bsm + fnd + dsuf
-            return debris_id
-        else:
-            return ''
+            array: Riverine, CoastalA or CoastalV for each structure
+        """
+        zones = np.full(len(input), None, dtype=object)
+        if 'flC' in input.columns:
+            codes, values = pd.factorize(input['flC'])
+            hazards = np.array([self.get_hazard(value) for value in values] + [None], dtype=object)
+            zones = hazards[codes]
+            unknown = [value for value, hazard in zip(values, hazards) if hazard is None and str(value).strip() != '']
+            if len(unknown) > 0:
+                print(f'\tUnknown coastal zone codes (flC) {unknown}: using the zone raster or flood type')
+        missing = np.flatnonzero(pd.isnull(zones))
+        if self.hazard_zones and len(missing) > 0:
+            sampler = self.get_depth_sampler(self.hazard_zones)
+            values = sampler.sample(input['Longitude'].astype(float).values[missing], input['Latitude'].astype(float).values[missing])
+            zones[missing] = [self.get_hazard(value) for value in values]
+        zones[pd.isnull(zones)] = self.hazard
+        for hazard in self.hazards:
+            print(f'\t{hazard} zone: {(zones == hazard).sum()} structures')
+        return zones
+
+    def get_losses_usd(self, damage, costs):
+        """Calculate building, content & inventory losses in US$ from damage percents
+
+        Args:
+            damage (dict): BldgDmgPct, ContDmgPct & InvDmgPct arrays
+            costs (dataframe or dict): Cost, ContentCostUSD & InventoryCostUSD
+
+        Returns:
+            dict: Damage with BldgLossUSD, ContentLossUSD & InventoryLossUSD arrays
+        """
+        damage['BldgLossUSD'] = self.get_loss_usd(pd.Series(damage['BldgDmgPct']), pd.Series(np.asarray(costs['Cost'], dtype=float))).values
+        damage['ContentLossUSD'] = self.get_loss_usd(pd.Series(damage['ContDmgPct']), pd.Series(np.asarray(costs['ContentCostUSD'], dtype=float))).values
+        inventory_cost = np.asarray(costs['InventoryCostUSD'], dtype=float).round(2)
+        damage['InventoryLossUSD'] = ((np.nan_to_num(damage['InvDmgPct']) / 100) * inventory_cost).round(2)
+        return damage
+
+    def get_dedup_losses(self, df, grid_name):
+        """Calculate building, content & inventory losses once per unique structure key
+
+        Structures sharing the sampled depth (e.g. condo units & RES3 records in the
+        same pixel), Occ, SOID (or user DDF IDs), FirstFloorHt, FoundationType & HazardZone have
+        the same depth in structure & damage percents. Those are evaluated for one
+        representative structure per key and scattered back; costs & losses in US$
+        are then calculated for every structure.
+
+        Args:
+            df (dataframe): Pandas dataframe with Depth attribute from depth grid
+            grid_name (str): Depth grid name
+
+        Returns:
+            dataframe: Pandas dataframe with loss fields
+        """
+        with self.run_report.stage('soid', len(df), grid=grid_name):
+            df = self.create_specific_occ_id(df)
+        with self.run_report.stage('costs', len(df), grid=grid_name):
+            df = self.get_content_cost(df)
+            df = self.get_inventory_cost(df)
+        key_fields = ['Depth', 'Occ', 'SOID', 'FirstFloorHt', 'FoundationType'] + [field for field in ('BldgDamageFnID', 'CDDF_ID') if field in self.fmap] + [field for field in ('HazardZone',) if field in df.columns]
+        with self.run_report.stage('dedup', len(df), grid=grid_name) as stage:
+            group = df.groupby(key_fields, sort=False, dropna=False).ngroup().values
+            first = np.unique(group, return_index=True)[1]
+            self.dedup_ratios[grid_name] = len(df) / max(len(first), 1)
+            print(f'\tDedup: {len(df)} structures in {len(first)} unique keys ({self.dedup_ratios[grid_name]:.2f}x compression)')
+            keys = df.iloc[first].reset_index(drop=True)
+            stage['rows_out'] = len(keys)
+        with self.run_report.stage('adjust', len(keys), grid=grid_name):
+            keys = self.adjust_depths(keys)
+            df = df.drop(['Depth', 'geometry'], axis=1).reset_index(drop=True)
+            for field in ['Depth_Grid', 'Depth_in_Struc', 'flExp']:
+                df[field] = keys[field].values[group]
+        with self.run_report.stage('losses', len(keys), grid=grid_name) as stage:
+            damage = self.get_fused_losses(keys['Depth_in_Struc'].values, keys, exposed=self.get_exposed(keys['Depth_Grid']))
+            for field, values in self.get_losses_usd({field: values[group] for field, values in damage.items()}, df).items():
+                df[field] = values
+            df.fillna(0, inplace=True)
+            stage['rows_out'] = len(df)
+        return df
+
+    def get_debris_table(self):
+        """Get flDebris_LUT as an array indexed by integer codes
+
+        DebrisIDs (occupancy + basement + foundation + depth bin) are split into their
+        codes, so a debris lookup is a direct array index instead of a string merge.
+
+        Returns:
+            dict: Occupancies (index), depth bin suffixes & debris array (occupancy x basement (NB, B) x foundation (FT, SG) x depth bin x (Finishes, Structure, Foundation))
+        """
+        if 'debris' not in self.lookup_arrays:
+            lookup_table_df = self.get_lookup_table('flDebris_LUT.csv')
+            keys = lookup_table_df['DebrisID'].str.extract(r'^(.*?)(NB|B)(FT|SG)(-?\d+)$')
+            occupancies = pd.Index(keys[0].dropna().unique())
+            suffixes = ['-8', '-4', '0', '1', '4', '6', '8', '12']
+            table = np.full((len(occupancies), 2, 2, len(suffixes), 3), np.nan)
+            valid = keys[0].notna() & keys[3].isin(suffixes)
+            table[
+                occupancies.get_indexer(keys.loc[valid, 0]),
+                (keys.loc[valid, 1] == 'B').values.astype(int),
+                (keys.loc[valid, 2] == 'SG').values.astype(int),
+                pd.Index(suffixes).get_indexer(keys.loc[valid, 3]),
+            ] = lookup_table_df.loc[valid, ['Finishes', 'Structure', 'Foundation']].values
+            self.lookup_arrays['debris'] = {'occupancies': occupancies, 'suffixes': suffixes, 'table': table}
+        return self.lookup_arrays['debris']
 
     def get_debris(self, df):
         """Calculate debris fields
@@ -433,75 +893,246 @@ class UDF:
         Returns:
             dataframe: Pandas dataframe with debris columns
         """
-        lookup_table = 'flDebris_LUT.csv'
-        lookup_table_df = self.get_lookup_table(lookup_table)
-        df['DebrisID'] = [self.create_debris_id(occ, foundation_type, depth) for occ, foundation_type, depth in zip(df['Occ'], df['FoundationType'], df['Depth_Grid'])]
-        df = df.merge(lookup_table_df, how='left', on='DebrisID')
-        df['Debris_Fin'] = (df['Area'] * df['Finishes']) / 1000
-        df['Debris_Found'] = (df['Area'] * df['Foundation']) / 1000
-        df['Debris_Struc'] = (df['Area'] * df['Structure']) / 1000
+        debris_ids, debris = self.get_debris_values(df['Occ'].values, df['FoundationType'].values, df['Depth_Grid'].values.astype(float))
+        df['DebrisID'] = debris_ids
+        df['Debris_Fin'] = (df['Area'] * debris[:, 0]) / 1000
+        df['Debris_Found'] = (df['Area'] * debris[:, 2]) / 1000
+        df['Debris_Struc'] = (df['Area'] * debris[:, 1]) / 1000
         df['Debris_Tot'] = df['Debris_Fin'] + df['Debris_Found'] + df['Debris_Struc']
         df.fillna('', inplace=True)
-        remove_columns = ['Description', 'Finishes', 'Structure','Foundation', 'Comment']
-        df = self.remove_columns(df, remove_columns)
         return df
 
-    def get_inventory_loss(self, df):
-        """Calculate inventory loss
+    def get_debris_values(self, occ, foundation_type, depth):
+        """Look up DebrisIDs & debris per sqft (Finishes, Structure, Foundation)
+
+        Depths are binned with np.digitize (basement bins for RES1 & COM6 with a basement,
+        the flDebris_LUT DebrisID suffixes) and debris is looked up by direct index into the
+        debris array. DebrisIDs are only built per distinct key.
 
         Args:
-            df (dataframe): Pandas dataframe for UDF data
+            occ (array): Occupancy
+            foundation_type (array): Foundation type
+            depth (array): Depth grid values
 
         Returns:
-            dataframe: Pandas dataframe with inventory loss columns
-        """
-        # TODO Add if/else statement if IDDF is provided
-        print('\tCalculating Inventory Loss...')
-        try: 
-            lookup_table = 'Inventory_DDF_LUT.csv'
-            lookup_table_df = self.get_lookup_table(lookup_table)
-            econ_lookup_table = 'flBldgEconParamSalesAndInv.csv'
-            econ_lookup_df = self.get_lookup_table(econ_lookup_table)
-            lookup_df = lookup_table_df.merge(econ_lookup_df, how='inner', on='Occupancy')
-            df = df.merge(lookup_df, how='left', left_on='Occ', right_on='Occupancy')
-        except Exception as e:
-            print(e)
-            print('An error occurred in the first part of Inventory Loss')
-        df.fillna(0, inplace=True)
-        df['l_index'] = np.where(df['Depth_in_Struc'].apply(np.floor) < 0, 'm', 'p') + df['Depth_in_Struc'].abs().apply(np.floor).astype(str).apply(lambda x: x.replace('.0',''))
-        df['u_index'] = np.where(df['Depth_in_Struc'].apply(np.ceil) < 0, 'm', 'p') + df['Depth_in_Struc'].abs().apply(np.ceil).astype(str).apply(lambda x: x.replace('.0',''))
-        try:
-            df['InvDmgPct'] = df.apply(lambda row: self.get_loss_fn(row), axis=1).round(2)
-            df['InvCost'] = ((df['AnnualSalesPerSqFt'] * df['BusinessInvPctofSales'] * df['Area']) / 100).round(2)
-            df['InventoryLossUSD'] =  ((df['InvDmgPct'] / 100) * df['InvCost']).round(2)
-            df['IDDF_ID'] = df['DDF_ID'].astype(int)
-            df.fillna(0, inplace=True)
-            remove_columns = ['Occupancy', 'm4', 'm3', 'm2', 'm1', 'p0', 'p1', 'p2', 'p3', 'p4', 'p5', 'p6', 'p7', 'p8', 'p9', 'p10', 'p11', 'p12', 'p13', 'p14', 'p15', 'p16', 'p17', 'p18', 'p19', 'p20', 'p21', 'p22', 'p23', 'p24', 'DDF_ID', 'HazardRiverine', 'HazardCV', 'HazardCA', 'AnnualSalesPerSqFt', 'BusinessInvPctofSales', 'OccupancyPlaceholder']
-            df = self.remove_columns(df, remove_columns)
-            return df
-        except Exception as e:
-            print(e)
-            print('An error occurred in the second part of Inventory Loss')
-
-    def get_depth_grid(self, depth_grid, point_gdf):
+            tuple: DebrisIDs (empty string if not exposed) & debris array (structures x 3, NaN if no match)
+        """
+        debris = self.get_debris_table()
+        occ_codes, occs = pd.factorize(occ)
+        occs = list(occs) + ['']
+        lut_codes = np.append(debris['occupancies'].get_indexer(occs[:-1]), -1)[occ_codes]
+        basement_bins = np.isin(occ, ['RES1', 'COM6']) & (foundation_type == 4)
+        basement = basement_bins & (occ == 'RES1')
+        slab = np.isin(foundation_type, [4, 7])
+        # Depth bin: index into the suffixes (-8, -4, 0, 1, 4, 6, 8, 12)
+        depth_bin = np.where(
+            basement_bins,
+            np.array([0, 1, 2, 4, 5, 6])[np.digitize(depth, [-4, 0, 4, 6, 8])],
+            np.array([2, 3, 4, 6, 7])[np.digitize(depth, [1, 4, 8, 12])],
+        )
+        exposed = self.get_exposed(depth)
+        found = exposed & (lut_codes >= 0)
+        values = np.full((len(depth), 3), np.nan)
+        values[found] = debris['table'][lut_codes[found], basement[found].astype(int), slab[found].astype(int), depth_bin[found]]
+        # DebrisID per distinct (occupancy, basement, foundation, depth bin) key
+        keys = ((occ_codes * 2 + basement) * 2 + slab) * len(debris['suffixes']) + depth_bin
+        unique_keys, inverse = np.unique(np.where(exposed, keys, -1), return_inverse=True)
+        debris_ids = np.array([
+            '' if key < 0 else occs[key // (4 * len(debris['suffixes']))] + ('B' if key // (2 * len(debris['suffixes'])) % 2 else 'NB') + ('SG' if key // len(debris['suffixes']) % 2 else 'FT') + debris['suffixes'][key % len(debris['suffixes'])]
+            for key in unique_keys
+        ], dtype=object)
+        return debris_ids[inverse.ravel()], values
+
+    def get_depth_grid(self, depth_grid, point_gdf, band=None, depths=None):
         """Get raster depths
 
         Args:
-            depth_grid (raster): User-provided depth-grid raster
+            depth_grid (raster): User-provided depth-grid raster, or folder of raster tiles (mosaic)
             point_gdf (dataframe): Pandas dataframe for user-provided UDF data
+            band (int or str, optional): Band index or NetCDF variable ('variable' or 'variable:band'). Defaults to None (band 1).
+            depths (array, optional): Depths already sampled for the points (see get_depth_matrix). Defaults to None.
 
         Returns:
             geodataframe: Geopandas dataframe with GridName & Depth attributes from depth grid
         """
-        point_gdf['GridName'] = os.path.splitext(os.path.basename(depth_grid))[0]
-        depth_grid = rio.open(depth_grid)
-        depth_grid.read(1)
-        point_data = point_gdf.to_crs(depth_grid.crs.to_dict())
-        coord_list = [(x,y) for x,y in zip(point_data['geometry'].x , point_data['geometry'].y)]
-        point_data['Depth'] = [x for x in depth_grid.sample(coord_list, masked=True)]
-        point_data['Depth'] = point_data.Depth.astype(str).str.replace('\[|\]|\'', '').str.replace('--', '0').astype(float)
+        point_data = point_gdf.copy()
+        point_data['GridName'] = self.get_grid_name(depth_grid, band)
+        if depths is None:
+            depths = self.get_depth_matrix(point_data, [(depth_grid, band)])[:, 0]
+        point_data['Depth'] = depths
         return point_data
 
+    def get_depth_matrix(self, input, depth_grids):
+        """Sample depth grids at the UDF points as a structures x grids depth matrix
+
+        Grids that are bands (or NetCDF time slices) of the same dataset are sampled
+        together in a single windowed read of the dataset. With a DEM the grids are
+        water surface elevations and depth is computed at the points only.
+
+        Args:
+            input (dataframe): UDF input data (Latitude & Longitude)
+            depth_grids (list): List of (depth grid, band) tuples
+
+        Returns:
+            array: Depth matrix (nodata & points outside the grid are zero depth)
+        """
+        longitude = input['Longitude'].astype(float).values
+        latitude = input['Latitude'].astype(float).values
+        matrix = np.zeros((len(input), len(depth_grids)))
+        datasets = {}
+        for index, (depth_grid, band) in enumerate(depth_grids):
+            dataset, band_index = self.get_depth_source(depth_grid, band)
+            datasets.setdefault(dataset, []).append((index, band_index))
+        ground = self.get_ground_elevation(longitude, latitude) if self.dem else None
+        footprints = self.get_footprints(input) if self.footprints is not None else None
+        for dataset, items in datasets.items():
+            sampler = self.get_depth_sampler(dataset)
+            bands = [band_index for index, band_index in items]
+            if self.dedup:
+                # Sample structures sharing a location once
+                locations, location_index = np.unique(np.column_stack([longitude, latitude]), axis=0, return_inverse=True)
+                depths = sampler.sample(locations[:, 0], locations[:, 1], bands, self.sample_method, self.window_size)[location_index.ravel()]
+            else:
+                depths = sampler.sample(longitude, latitude, bands, self.sample_method, self.window_size)
+            if footprints is not None:
+                depths = self.get_footprint_depths(sampler, footprints, bands, depths, ground, [index for index, band_index in items])
+            if ground is not None:
+                depths = self.get_depth_from_wse(depths, ground)
+            elif sampler.nodata is None and self.sample_method == 'nearest' and footprints is None:
+                # Without a nodata value depths keep the raster precision (e.g. the float32 -3.4028235e+38 fill)
+                depths = depths.astype(sampler.dtype).astype(str).astype(float)
+            # Nodata & points outside the grid are treated as zero depth
+            depths = np.nan_to_num(depths, nan=0.0)
+            for column, (index, band_index) in enumerate(items):
+                matrix[:, index] = depths[:, column]
+        return matrix
+
+    def get_footprints(self, input):
+        """Get building footprint polygons in UDF row order (joined on FltyId)
+
+        Args:
+            input (dataframe): UDF input data
+
+        Returns:
+            GeoSeries: Footprint polygon for each UDF row (None if the structure has no footprint)
+        """
+        footprints = gpd.read_file(self.footprints) if isinstance(self.footprints, str) else self.footprints
+        if 'UserDefinedFltyId' in footprints.columns:
+            footprints = footprints.rename(columns={'UserDefinedFltyId': 'FltyId'})
+        footprints = footprints[['FltyId', 'geometry']].drop_duplicates('FltyId')
+        footprints['FltyId'] = footprints['FltyId'].astype(str)
+        geometry = input[['FltyId']].astype(str).merge(footprints, on='FltyId', how='left')['geometry']
+        return gpd.GeoSeries(geometry.values, crs=footprints.crs)
+
+    def get_footprint_depths(self, sampler, footprints, bands, depths, ground, grid_indexes):
+        """Get footprint zonal depth statistics & the representative depth for loss
+
+        Max, mean & fraction wetted are kept per depth grid (Depth_Max, Depth_Mean &
+        FractionWetted output fields). Structures without a footprint, or with a
+        footprint smaller than a pixel, keep the point depth.
+
+        Args:
+            sampler (DepthSampler): Depth sampler of the depth grid
+            footprints (GeoSeries): Footprint polygon for each UDF row
+            bands (list): Band indexes
+            depths (array): Point depths (points x bands)
+            ground (array): Ground elevation at the points (WSE & DEM mode), else None
+            grid_indexes (list): Depth grid index of each band
+
+        Returns:
+            array: Representative depths (points x bands)
+        """
+        stats = ZonalStatistics(sampler).calculate(footprints, bands, ground)
+        offset = ground[:, np.newaxis] if ground is not None else 0
+        for column, index in enumerate(grid_indexes):
+            self.footprint_stats[index] = pd.DataFrame({
+                'Depth_Max': (stats['max'] - offset)[:, column],
+                'Depth_Mean': (stats['mean'] - offset)[:, column],
+                'FractionWetted': stats['fraction_wetted'][:, column],
+            })
+        return np.where(stats['pixels'][:, np.newaxis] > 0, stats[self.footprint_stat], depths)
+
+    def get_ground_elevation(self, longitude, latitude):
+        """Sample the ground elevation (DEM) at the UDF points
+
+        Args:
+            longitude (array): Point longitudes
+            latitude (array): Point latitudes
+
+        Returns:
+            array: Ground elevation (NaN where nodata or outside the DEM)
+        """
+        # Footprint max/mean apply to the water surface; the ground is taken under the point
+        method = 'bilinear' if self.sample_method == 'bilinear' else 'nearest'
+        ground = self.get_depth_sampler(self.dem).sample(longitude, latitude, method=method)
+        # Rasters without a nodata value use the float32 minimum as fill
+        return np.where(ground > -1e38, ground, np.nan)
+
+    def get_depth_from_wse(self, wse, ground):
+        """Calculate depth from water surface elevation: depth = WSE - ground
+
+        WSE & DEM must share the same vertical datum & units (feet). Points where
+        either raster has no data, or the water surface is at or below the ground, are dry.
+
+        Args:
+            wse (array): Water surface elevation (points x bands)
+            ground (array): Ground elevation (points)
+
+        Returns:
+            array: Depth (NaN where dry)
+        """
+        wse = np.where(wse > -1e38, wse, np.nan)
+        depths = wse - ground[:, np.newaxis]
+        depths[~(depths > 0)] = np.nan
+        return depths
+
+    def get_depth_source(self, depth_grid, band=None):
+        """Get dataset & band index for a depth grid band
+
+        Args:
+            depth_grid (raster): User-provided depth-grid raster, or folder of raster tiles (mosaic)
+            band (int or str, optional): Band index or NetCDF variable ('variable' or 'variable:band'). Defaults to None (band 1).
+
+        Returns:
+            tuple: Dataset (path or NetCDF subdataset) & band index
+        """
+        if band is None:
+            return depth_grid, 1
+        if isinstance(band, str) and not band.isdigit():
+            variable, _, band_index = band.partition(':')
+            return f'NETCDF:"{depth_grid}":{variable}', int(band_index or 1)
+        return depth_grid, int(band)
+
+    def get_grid_name(self, depth_grid, band=None):
+        """Get depth grid name (file or mosaic folder name, with band suffix)
+
+        Args:
+            depth_grid (raster): User-provided depth-grid raster, or folder of raster tiles (mosaic)
+            band (int or str, optional): Band index or NetCDF variable. Defaults to None (band 1).
+
+        Returns:
+            str: Depth grid name
+        """
+        grid_name = os.path.splitext(os.path.basename(os.path.normpath(depth_grid)))[0]
+        if band is None:
+            return grid_name
+        return f'{grid_name}-{str(band).replace(":", "-")}'
+
+    def get_depth_sampler(self, depth_grid):
+        """Get (cached) depth sampler for a depth grid
+
+        Args:
+            depth_grid (raster): User-provided depth-grid raster, or folder of raster tiles (mosaic)
+
+        Returns:
+            DepthSampler: Depth sampler with the footprint index of the depth grid tiles
+        """
+        if self.cache is not None:
+            return self.cache.get_depth_sampler(depth_grid)
+        if depth_grid not in self.depth_samplers:
+            self.depth_samplers[depth_grid] = DepthSampler(depth_grid)
+        return self.depth_samplers[depth_grid]
+
     def get_content_multiplier(self, occ):
         """Get content multiplier for ContentCostUSD
 
@@ -560,6 +1191,57 @@ class UDF:
             cmult = 0
         return cmult
 
+    def get_occupancy_table(self):
+        """Get per-occupancy cost parameters as arrays indexed by occupancy code
+
+        Content multipliers (get_content_multiplier), annual sales per sqft & business
+        inventory percent of sales (flBldgEconParamSalesAndInv.csv) and inventory
+        eligibility are built once for every occupancy, so costs are gathered with take
+        instead of per-structure list scans & a merge. The last entry (code -1) is for
+        occupancies not in the tables.
+
+        Returns:
+            dict: Occupancies (index), content multiplier, sales, inventory percent & inventory eligibility arrays
+        """
+        if 'occupancy' not in self.lookup_arrays:
+            # Default inventory DDF only defined for a subset
+            Inventory_List = [
+                'COM1',
+                'COM2',
+                'IND1',
+                'IND2',
+                'IND3',
+                'IND4',
+                'IND5',
+                'IND6',
+                'AGR1',
+            ]
+            lookup_table_df = self.get_lookup_table('flBldgEconParamSalesAndInv.csv').drop_duplicates('Occupancy')
+            occupancy_types = self.get_lookup_table('OccupancyTypes.csv')['Occupancy'].str.strip()
+            occupancies = pd.Index(occupancy_types).union(pd.Index(lookup_table_df['Occupancy'])).union(pd.Index(Inventory_List))
+            sales = lookup_table_df.set_index('Occupancy').reindex(occupancies)
+            self.lookup_arrays['occupancy'] = {
+                'occupancies': occupancies,
+                'content_multiplier': np.append([self.get_content_multiplier(occ) for occ in occupancies], 0),
+                'sales': np.append(sales['AnnualSalesPerSqFt'].values.astype(float), np.nan),
+                'inventory_pct': np.append(sales['BusinessInvPctofSales'].values.astype(float), np.nan),
+                'inventory_eligible': np.append(occupancies.isin(Inventory_List), False),
+            }
+        return self.lookup_arrays['occupancy']
+
+    def get_occupancy_codes(self, df):
+        """Get occupancy codes of the structures for the occupancy table arrays
+
+        Args:
+            df (dataframe): Pandas dataframe with Occ field
+
+        Returns:
+            array: Occupancy code of each structure (-1 if not in the tables)
+        """
+        occupancy_table = self.get_occupancy_table()
+        occ_codes, occs = pd.factorize(df['Occ'])
+        return np.append(occupancy_table['occupancies'].get_indexer(occs), -1)[occ_codes]
+
     def get_content_cost(self, df):
         """
         Content and Inventory Cost. Determine each, even if structure not exposed to flooding
@@ -572,13 +1254,8 @@ class UDF:
         Returns:
             dataframe: Pandas dataframe with ContentCostUSD field
         """
-        df['Mult'] = [self.get_content_multiplier(occ) for occ in df['Occ']]
-        df['ContentCostUSD'] = df['Cost'] * df['Mult']
-        df.drop(
-            ['Mult'],
-            axis=1,
-            inplace=True,
-        )
+        occupancy_table = self.get_occupancy_table()
+        df['ContentCostUSD'] = df['Cost'] * occupancy_table['content_multiplier'].take(self.get_occupancy_codes(df))
         return df
 
     def get_inventory_cost(self, df):
@@ -593,26 +1270,12 @@ class UDF:
         Returns:
             dataframe: Pandas dataframe with inventory costs
         """
-        Inventory_List = [
-            'COM1',
-            'COM2',
-            'IND1',
-            'IND2',
-            'IND3',
-            'IND4',
-            'IND5',
-            'IND6',
-            'AGR1',
-        ]
-        lookup_table = "flBldgEconParamSalesAndInv.csv"
-        lookup_table_df = self.get_lookup_table(lookup_table)
-        df = df.merge(lookup_table_df, how='left', left_on='Occ', right_on='Occupancy')
-        df['InventoryCostUSD'] = [sales * pct_sales * area / 100 if occ in Inventory_List else 0 for sales, pct_sales, area, occ in zip(df['AnnualSalesPerSqFt'],  df['BusinessInvPctofSales'], df['Area'], df['Occ'])]
-        df.drop(
-            ['OccupancyPlaceholder', 'AnnualSalesPerSqFt', 'BusinessInvPctofSales', 'Occupancy'],
-            axis=1,
-            inplace=True,
-        )
+        occupancy_table = self.get_occupancy_table()
+        occ_codes = self.get_occupancy_codes(df)
+        sales = occupancy_table['sales'].take(occ_codes)
+        inventory_pct = occupancy_table['inventory_pct'].take(occ_codes)
+        inventory_cost = sales * inventory_pct * df['Area'].values.astype(float) / 100
+        df['InventoryCostUSD'] = np.where(occupancy_table['inventory_eligible'].take(occ_codes), inventory_cost, 0)
         # OWDI = OC in Inventory_List
         # xt = getValue(InvCost) if uicost else -1
         # # Clean up case where InvCost is supplied but is null
@@ -693,16 +1356,28 @@ class UDF:
             lookup_tables = zip(tables, table_names)
             lookup_df_list = []
             for table in lookup_tables:
-                table_location = os.path.join(self.LUT_Dir, table[0])
-                data = pd.read_csv(table_location, engine='c')
+                data = self.read_lookup_table(table[0])
                 data.name = table[1]
                 lookup_df_list.append(data)
             return lookup_df_list
         else:
-            table_location = os.path.join(self.LUT_Dir, tables)
-            lookup_df = self.read_csv(table_location)
+            lookup_df = self.read_lookup_table(tables)
             return lookup_df
 
+    def read_lookup_table(self, table):
+        """Read a lookup table (a copy of the parsed table if a cache is set)
+
+        Args:
+            table (str): Lookup table file name
+
+        Returns:
+            dataframe: Pandas dataframe for the lookup table
+        """
+        table_location = os.path.join(self.LUT_Dir, table)
+        if self.cache is not None:
+            return self.cache.get_lookup_table(table_location)
+        return self.read_csv(table_location)
+
     def remove_columns(self, df, columns):
         """Remove columns from dataframe
 
@@ -720,22 +1395,26 @@ class UDF:
         )
         return df
 
-    def create_restore_id(self, occ, depth):
-        """Create restore id for lookup
-
-        Args:
-            occ (str): OCC id
-            depth (float): Raster depth grid value
+    def get_restore_table(self):
+        """Get flRsFnGBS_LUT as an array indexed by integer codes
 
         Returns:
-            str: RestoreID
+            dict: Occupancies (index), depth bin suffixes & restoration days array (occupancy x depth bin x (Min, Max))
         """
-        if depth > 0:
-            dsuf = ('0' if depth < 0 else '1' if depth < 1 else '4' if depth < 4 else '8' if depth < 8 else '12' if depth < 12 else '24')
-            restore_id = occ + dsuf
-            return restore_id
-        else:
-            return ''
+        if 'restore' not in self.lookup_arrays:
+            lookup_table_df = self.get_lookup_table('flRsFnGBS_LUT.csv')
+            occupancies = pd.Index(lookup_table_df['Occupancy'].unique())
+            suffixes = ['0', '1', '4', '8', '12', '24']
+            table = np.full((len(occupancies), len(suffixes), 2), np.nan)
+            # RestFnID: occupancy + depth bin suffix
+            suffix = pd.Series([restore_id[len(occ):] if restore_id.startswith(occ) else None for occ, restore_id in zip(lookup_table_df['Occupancy'], lookup_table_df['RestFnID'])])
+            valid = suffix.isin(suffixes).values
+            table[
+                occupancies.get_indexer(lookup_table_df.loc[valid, 'Occupancy']),
+                pd.Index(suffixes).get_indexer(suffix[valid]),
+            ] = lookup_table_df.loc[valid, ['Min_Restor_Days', 'Max_Restor_Days']].values
+            self.lookup_arrays['restore'] = {'occupancies': occupancies, 'suffixes': suffixes, 'table': table}
+        return self.lookup_arrays['restore']
 
     def get_restore_time(self, df):
         """ 
@@ -753,31 +1432,66 @@ class UDF:
             dataframe: Pandas dataframe with restore fields
         """
         try:
-            lookup_table = 'flRsFnGBS_LUT.csv'
-            lookup_table_df = self.get_lookup_table(lookup_table)
-            df['RestFnID'] = [self.create_restore_id(occ, depth) for occ, depth in zip(df['Occ'], df['Depth_Grid'])]
-            df = df.merge(lookup_table_df, how='left', on='RestFnID')
-            df['Restor_Days_Min'] = np.where(df['Depth_Grid'] > 0, df['Min_Restor_Days'].astype(str).apply(lambda x: x.replace('.0','')), 0)
-            df['Restor_Days_Max'] = np.where(df['Depth_Grid'] > 0, df['Max_Restor_Days'].astype(str).apply(lambda x: x.replace('.0','')), 0)
+            depth = df['Depth_Grid'].values.astype(float)
+            days = self.get_restore_days(df['Occ'].values, depth)
+            days = np.where(np.isnan(days), 'nan', np.nan_to_num(days).astype(int).astype(str)).astype(object)
+            exposed = self.get_exposed(depth)
+            df['Restor_Days_Min'] = np.where(exposed, days[:, 0], 0)
+            df['Restor_Days_Max'] = np.where(exposed, days[:, 1], 0)
             df.fillna('', inplace=True)
-            remove_columns = ['l_index', 'u_index','RestFnID', 'Occupancy', 'Min_Depth', 'Max_Depth','Min_Restor_Days', 'Max_Restor_Days']
+            remove_columns = [column for column in ['l_index', 'u_index'] if column in df.columns]
             df = self.remove_columns(df, remove_columns)
             return df
         except:
             pass
 
+    def get_restore_days(self, occ, depth):
+        """Look up restoration days (Min, Max)
+
+        Depths are binned with np.digitize (the flRsFnGBS_LUT depth suffixes) and the
+        days are looked up by direct index into the restoration days array.
+
+        Args:
+            occ (array): Occupancy
+            depth (array): Depth grid values
+
+        Returns:
+            array: Restoration days (structures x (Min, Max), NaN if no match)
+        """
+        restore = self.get_restore_table()
+        occ_codes, occs = pd.factorize(occ)
+        lut_codes = np.append(restore['occupancies'].get_indexer(occs), -1)[occ_codes]
+        # Depth bin: index into the suffixes (0, 1, 4, 8, 12, 24)
+        depth_bin = np.digitize(depth, [1, 4, 8, 12]) + 1
+        days = np.full((len(depth), 2), np.nan)
+        found = lut_codes >= 0
+        days[found] = restore['table'][lut_codes[found], depth_bin[found]]
+        return days
+
     def read_csv(self, file):
         """Read CSV file into Pandas dataframe
 
         Args:
-            file (str): CSV file to read
+            file (str or dataframe): CSV file to read (a dataframe is copied, e.g. structures submitted to the analysis service)
 
         Returns:
             dataframe: Pandas dataframe for UDF data
         """
+        if isinstance(file, pd.DataFrame):
+            return file.copy()
         input = pd.read_csv(file, engine='c')
         return input
 
+    def get_udf_name(self):
+        """Get the UDF file name (output & report names)
+
+        Returns:
+            str: UDF file name ('UDF' for a dataframe)
+        """
+        if isinstance(self.UDFOrig, pd.DataFrame):
+            return getattr(self.UDFOrig, 'name', 'UDF')
+        return os.path.basename(str(self.UDFOrig))
+
     def set_new_fields(self, input, new_fields):
         """Set/map fields
 
@@ -822,6 +1536,61 @@ class UDF:
         """
         fields = ['BldgDmgPct', 'BldgLossUSD', 'ContentCostUSD', 'ContDmgPct', 'ContentLossUSD', 'InventoryCostUSD', 'InvDmgPct', 'InventoryLossUSD', 'flExp', 'SOID' , 'BDDF_ID', 'CDDF_ID', 'IDDF_ID' , 'DebrisID', 'Debris_Fin' , 'Debris_Struc' , 'Debris_Found' , 'Debris_Tot' , 'GridName', 'Restor_Days_Min', 'Restor_Days_Max']
 
+    def submit_write(self, df, path, grid_name, exposed_only=False):
+        """Write results in the background writer (in the pipeline without a writer)
+
+        The pipeline records the time it waits for the writer (write_wait
+        stage); the writer returns the write stage records (see wait_writes).
+        The dataframe must not be changed until the write is done.
+
+        Args:
+            df (dataframe): Pandas dataframe with final results
+            path (str): Path of the CSV file
+            grid_name (str): Depth grid name
+            exposed_only (bool, optional): Write exposed structures only (see write_output). Defaults to False.
+        """
+        if self.writer is None:
+            with self.run_report.stage('write', len(df), grid=grid_name, path=path):
+                writer.write_output(df, path, exposed_only)
+            return
+        with self.run_report.stage('write_wait', len(df), grid=grid_name):
+            # The writer process may not share the working directory
+            self.writer.submit(writer.write_stage, df, os.path.abspath(path), grid_name, exposed_only)
+
+    def wait_writes(self):
+        """Wait for the queued background writes & add their stages to the run report
+        """
+        if self.writer is not None:
+            with self.run_report.stage('write_wait'):
+                for record in self.writer.wait():
+                    self.run_report.add(record)
+
+    def close_writer(self, raise_error=True):
+        """Wait for the queued background writes & stop the writer
+
+        Args:
+            raise_error (bool, optional): Raise the error of a failed write. Defaults to True.
+        """
+        if self.writer is None:
+            return
+        background_writer, self.writer = self.writer, None
+        try:
+            with self.run_report.stage('write_wait'):
+                for record in background_writer.close():
+                    self.run_report.add(record)
+        except Exception:
+            if raise_error:
+                raise
+
+    def write_output(self, df, path):
+        """Write results to CSV file, optionally only exposed structures (& an exposure summary)
+
+        Args:
+            df (dataframe): Pandas dataframe with final results
+            path (str): Path of the CSV file
+        """
+        writer.write_output(df, path, self.exposed_only)
+
     def write_csv(self, df, path):
         """Write results to CSV file
 
@@ -829,9 +1598,32 @@ class UDF:
             df (dataframe): Pandas dataframe with final results
             path (str): Directory to store CSV file
         """
-        path = path
-        line_terminator='\n'
-        df.to_csv(path, index=False, line_terminator=line_terminator)
+        writer.write_csv(df, path)
+
+    def get_run_report(self):
+        """Get the run report of the last run
+
+        Returns:
+            dict: Run attributes, total wall & CPU time, peak RSS, per-stage totals & stage records (see RunReport)
+        """
+        return self.run_report.to_dict()
+
+    def write_run_report(self):
+        """Write the run report (JSON) next to the outputs of the analysis
+        """
+        if self.analysis_type and 'Average Annualized Loss (AAL) with PELV' in self.analysis_type:
+            output_path = './UDF/output/pelv/'
+        elif self.analysis_type and 'Average Annualized Loss (AAL)' in self.analysis_type and self.return_periods:
+            output_path = './UDF/output/aal/'
+        else:
+            output_path = './UDF/output/standard/'
+        udf_name = os.path.splitext(self.get_udf_name())[0]
+        path = f'{output_path}{udf_name}-RunReport.json'
+        try:
+            self.run_report.write(path)
+            print(f'Run report: {path}')
+        except Exception as e:
+            print(f'Unable to write run report: {e}')
 
     def get_run_time(self, start_time):
         """Calculate app run time
@@ -848,7 +1640,7 @@ class UDF:
         else:
             print(f'Total processing time: {int(round(run_time, 0))} minute.\n')
 
-    def run_pelv(self, pelv, input, point_depths, depth_grid, aal_df_list):
+    def run_pelv(self, pelv, input, point_depths, depth_grid, aal_df_list, band=None, depths=None):
         """Run PELV analysis
 
         Args:
@@ -857,9 +1649,15 @@ class UDF:
             point_depths (dataframe): Geopandas dataframe for UDF data intersecting raster
             depth_grid (geodataframe): Geodataframe for user-provided raster
             aal_df_list (list): List of AAL dataframes
+            band (int or str, optional): Band index or NetCDF variable of the depth grid. Defaults to None (band 1).
+            depths (array, optional): Depths already sampled for the UDF points (see get_depth_matrix). Defaults to None.
         """
         # Get Tracts
-        if ('Tract' in point_depths.columns) and pelv.check_for_hazus():
+        if self.tracts is not None and self.cache is not None:
+            tracts = pelv.get_tracts_file(self.cache.get_tracts(self.tracts), point_depths)
+        elif self.tracts is not None:
+            tracts = pelv.get_tracts_file(self.tracts, point_depths)
+        elif ('Tract' in point_depths.columns) and pelv.check_for_hazus():
             # Remove duplicate tract numbers (speeds up SQL query)
             input_data_no_dupes = point_depths.drop_duplicates(
                 subset='Tract'
@@ -979,11 +1777,13 @@ class UDF:
         pelv_data_merged = pelv.get_pelv_depths(pelv_value_merge)
         pelv_depths_id_list = ['10', '25', '50', '75', '200', '250', '500', '1000']
         print('\nStarting PELV Curve analysis...\n')
-        self.calculate_pelv(pelv_depths_id_list, input, depth_grid, pelv_data_merged, point_depths, aal_df_list)
+        self.calculate_pelv(pelv_depths_id_list, input, depth_grid, pelv_data_merged, point_depths, aal_df_list, band, depths)
 
-    def calculate_pelv(self, pelv_depths_id_list, input, depth_grid, pelv_data_merged, point_depths, aal_df_list):
+    def calculate_pelv(self, pelv_depths_id_list, input, depth_grid, pelv_data_merged, point_depths, aal_df_list, band=None, depths=None):
         """Calculate PELV & AAL losses
 
+        Every return period scales the depths of the selected band, sampled once.
+
         Args:
             pelv_depths_id_list (list): List of PELV ids from lookup table
             input (dataframe): User-provided UDF data
@@ -991,11 +1791,15 @@ class UDF:
             pelv_data_merged (dataframe): Pandas dataframe for merged PELV data
             point_depths (dataframe): Geopandas dataframe for UDF data intersecting raster
             aal_df_list (list): List of AAL dataframes
+            band (int or str, optional): Band index or NetCDF variable of the depth grid. Defaults to None (band 1).
+            depths (array, optional): Depths already sampled for the UDF points (see get_depth_matrix). Defaults to None (sampled here).
         """
+        point_gdf = self.create_geo_df(input)
+        if depths is None:
+            depths = self.get_depth_matrix(input, [(depth_grid, band)])[:, 0]
         for pelv_number in pelv_depths_id_list:
             print(f'Calculating PELV for return period {pelv_number}...')
-            point_gdf = self.create_geo_df(input)
-            point_depths = self.get_depth_grid(depth_grid, point_gdf)
+            point_depths = self.get_depth_grid(depth_grid, point_gdf, band, depths)
             pelv_col = pelv_data_merged[pelv_number]
             pelv_median_col = pelv_data_merged['PELV_Median']
             pelv_median_label_col = pelv_data_merged['PELV_Median_Label']
@@ -1009,32 +1813,40 @@ class UDF:
             # TODO: Add lookup check (for losses/costs) if input id's are missing (ie: inventory)
             pelv_depths = self.get_content_cost(pelv_depths)
             pelv_depths = self.get_inventory_cost(pelv_depths)
-            pelv_depths = self.get_building_loss(pelv_depths)
-            pelv_depths = self.get_content_loss(pelv_depths)
-            pelv_depths = self.get_inventory_loss(pelv_depths)
+            for field, values in self.get_fused_losses(pelv_depths['Depth_in_Struc'].values, pelv_depths, pelv_depths, self.get_exposed(pelv_depths['Depth_Grid'])).items():
+                pelv_depths[field] = values
+            pelv_depths.fillna(0, inplace=True)
             pelv_depths = self.get_debris(pelv_depths)
             pelv_depths = self.get_restore_time(pelv_depths)
             # Order column names
             column_names = ['FltyId', 'HNL_UDF_EQ', 'Occ', 'Cost', 'NumStories', 'FoundationType', 'FirstFloorHt', 'Area', 'ContentCost', 'BldgDamageFnID', 'CDDF_ID', 'YEARBUILT', 'Tract', 'Latitude', 'Longitude', 'Depth_Grid', 'Depth_in_Struc', 'flExp', 'SOID', 'ContentCostUSD', 'InventoryCostUSD', 'BldgDmgPct', 'BldgLossUSD', 'CDDF_ID', 'ContDmgPct', 'ContentLossUSD', 'IDDF_ID', 'InvDmgPct', 'InventoryLossUSD', 'DebrisID', 'Debris_Fin', 'Debris_Struc', 'Debris_Found', 'Debris_Tot', 'Restor_Days_Min', 'Restor_Days_Max', 'GridName', 'PELV_Median_Label', 'PELV_Median']
             pelv_depths = pelv_depths.reindex(columns=column_names)
-            output_file = os.path.splitext(os.path.basename(depth_grid))[0]
+            output_file = self.get_grid_name(depth_grid, band)
             path = f'./UDF/output/pelv/{output_file}-PELV-{pelv_number}.csv'
             # Sort values by Depth in Structure (descending)
             pelv_depths.sort_values(by=['Depth_in_Struc'], ascending=False, inplace=True)
-            self.write_csv(pelv_depths, path)
+            if self.write_results:
+                self.submit_write(pelv_depths, path, f'{output_file}-PELV-{pelv_number}')
+            if self.keep_results:
+                self.results.add_pelv(pelv_number, pelv_depths)
             pelv_depths.name = pelv_number
             # Catch & store pelv dataframe for AAL calculations
             aal_df_list.append(pelv_depths)
             if pelv_number == '75':
                 # Move (pop) 100 year return period to the back of the list
                 aal_df_list += [aal_df_list.pop(0)]
-        UDFRoot = os.path.basename(self.UDFOrig)
+        UDFRoot = self.get_udf_name()
         y = os.path.split(depth_grid)[1]
         x = UDFRoot.split('.')[0] + "_" + y.split('.')[0]
         output_dir = os.path.join(self.ResultsDir, "pelv", x + ".csv")
         return_periods_pelv_aal = ['10', '25', '50', '75', '100', '200', '250', '500', '1000']
         output_path = './UDF/output/pelv/'
-        AAL.AAL(output_dir, return_periods_pelv_aal, aal_df_list, output_path, output_file)
+        # AAL changes the PELV dataframes
+        self.wait_writes()
+        with self.run_report.stage('aal', sum(len(df) for df in aal_df_list), grids=len(aal_df_list)):
+            aal = AAL.AAL(output_dir, return_periods_pelv_aal, aal_df_list, output_path, output_file, self.write_results)
+        if self.keep_results:
+            self.results.add_aal(aal)
 
 """
 # TODO: Create list of tracts that do not intersect a tract
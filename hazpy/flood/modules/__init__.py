@@ -10,6 +10,8 @@
     :author: James Raines; james.rainesii@fema.dhs.gov
 """
 
+from importlib import import_module
+
 __version__ = '0.0.1'
 __all__ = [
     'Agriculture',
@@ -24,13 +26,34 @@ __all__ = [
     'WhatIf'
 ]
 
-from .agriculture import Agriculture
-from .direct_social_losses import DirectSocialLosses
-from .essential_facilities import EssentialFacilities
-from .general_building_stock import GeneralBuildingStock
-from .indirect_economic_loss import IndirectEconomicLoss
-from .transportation_systems import TransportationSystems
-from .UDF import UDF
-from .utility_systems import UtilitySystems
-from .vehicles import Vehicles
-from .what_if import WhatIf
\ No newline at end of file
+# Exported classes are imported from their module on first access (PEP 562),
+# so importing the package does not load pandas, geopandas, rasterio...
+# The UDF class shares its module's name: if the UDF module is imported before
+# the package attribute is accessed, the attribute is that module (as for any
+# submodule). Use hazpy.flood.UDF or from hazpy.flood.modules.UDF import UDF
+# for the class.
+_modules = {
+    'Agriculture': 'agriculture',
+    'DirectSocialLosses': 'direct_social_losses',
+    'EssentialFacilities': 'essential_facilities',
+    'GeneralBuildingStock': 'general_building_stock',
+    'IndirectEconomicLoss': 'indirect_economic_loss',
+    'TransportationSystems': 'transportation_systems',
+    'UDF': 'UDF',
+    'UtilitySystems': 'utility_systems',
+    'Vehicles': 'vehicles',
+    'WhatIf': 'what_if',
+}
+
+
+def __getattr__(name):
+    if name not in _modules:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(import_module(f'.{_modules[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
@@ -1,4 +1,5 @@
 from datetime import datetime
+from importlib import import_module
 import time
 import json
 import os
@@ -6,7 +7,7 @@ import copy
 
 
 # from multiprocessing import Process
-from threading import Thread
+from threading import Event, Lock, Thread, current_thread
 
 class Base:
     """
@@ -25,68 +26,168 @@ class Base:
     def info(self):
         print(self.meta)
 
+class LazyModule():
+    """
+    Module attribute of a class, imported (and created) on first access
+
+    Keyword arguments: \n
+    module: str = module path, e.g. 'hazpy.flood.modules.UDF'
+    name: str = class name in the module
+    create: bool = create an instance (modules without arguments), else the class itself
+    """
+    def __init__(self, module, name, create=True):
+        self.module = module
+        self.name = name
+        self.create = create
+        self.attribute = name
+
+    def __set_name__(self, owner, attribute):
+        self.attribute = attribute
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = getattr(import_module(self.module), self.name)
+        if self.create:
+            value = value()
+        # Cache on the instance, the next accesses do not go through the descriptor
+        instance.__dict__[self.attribute] = value
+        return value
+
 class Logger():
-    """Initalizes a Json logger class
+    """Initalizes a JSON lines logger class
 
+    Each message is appended to log.jsonl as one JSON record ({"id", "message",
+    "datetime"}); writes are buffered & flushed every flushSeconds or
+    bufferSize records. The monitor follows the file offset and passes the new
+    records to the callback.
     """
+    fileName = 'log.jsonl'
+
     def __init__(self):
         self.callbackArg = ''
         self.monitorSeconds = 1
         self.monitorActive = False
         self.logFile = ''
-    
+        # buffered writes
+        self.flushSeconds = 1
+        self.bufferSize = 100
+        self.file = None
+        self.count = 0
+        self.pending = 0
+        self.lastFlush = 0
+        self.lock = Lock()
+        self.process = None
+        self.monitorEvent = Event()
+
     def create(self, logDirectory):
         """create log file"""
-        if not logDirectory.endswith('/'):
-            self.logFile = logDirectory + '/' + 'log.json'
-        else:
-            self.logFile = logDirectory + 'log.json'
-        with open(self.logFile, "w+") as l:
-            json.dump({"log": []}, l)
+        self.close()
+        self.logFile = os.path.join(logDirectory, self.fileName)
+        self.file = open(self.logFile, 'w', encoding='utf-8')
+        self.count = 0
+        self.lastFlush = time.monotonic()
 
     def destroy(self):
-        """delete log file"""   
+        """delete log file"""
+        self.close()
         os.remove(self.logFile)
-    
+
+    def open(self):
+        """open an existing log file for appending"""
+        count = 0
+        if os.path.exists(self.logFile):
+            with open(self.logFile, 'rb') as l:
+                count = sum(1 for line in l)
+        self.file = open(self.logFile, 'a', encoding='utf-8')
+        self.count = count
+        self.lastFlush = time.monotonic()
+
     def log(self, msg):
-        """add message to log"""   
-        with open(self.logFile, 'r') as l:
-            info = json.loads(l.read())
-            info['log'].append({'id': str(len(info['log'])), 'message': msg, 'datetime': str(datetime.now())})
-        with open(self.logFile, 'w') as l:
-            json.dump(info, l)
-
-    def callback(self):
-        """callback function when changes occur"""
+        """add message to log"""
+        with self.lock:
+            if self.file is None:
+                self.open()
+            record = {'id': str(self.count), 'message': msg, 'datetime': str(datetime.now())}
+            self.file.write(json.dumps(record) + '\n')
+            self.count += 1
+            self.pending += 1
+            if self.pending >= self.bufferSize or time.monotonic() - self.lastFlush >= self.flushSeconds:
+                self._flush()
+
+    def flush(self):
+        """write the buffered messages to the log file"""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.file is not None and self.pending:
+            self.file.flush()
+        self.pending = 0
+        self.lastFlush = time.monotonic()
+
+    def close(self):
+        """flush & close the log file"""
+        with self.lock:
+            if self.file is not None:
+                self._flush()
+                self.file.close()
+                self.file = None
+
+    def read(self, offset=0):
+        """read the complete records after a file offset
+
+        Keyword arguments: \n
+        offset: int = byte offset in the log file
+
+        Returns: \n
+        records: list = log records
+        offset: int = byte offset after the last complete record
+        """
+        with open(self.logFile, 'rb') as l:
+            l.seek(offset)
+            data = l.read()
+        # a record being written is read at the next call
+        end = data.rfind(b'\n') + 1
+        records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        return records, offset + end
+
+    def callback(self, records):
+        """callback function receiving the new log records"""
         print('assign callback function')
         print('logger.callback = yourFunction')
 
     def monitor(self):
-        """monitors changes"""
-        try:
-            lastmtime = os.path.getmtime(self.logFile)
-        except:
-            logDirectory = self.logFile.replace('log.json', '')
-            self.create(logDirectory)
-            lastmtime = os.path.getmtime(self.logFile)
-        while self.monitorActive:
-            time.sleep(self.monitorSeconds)
-            mtime = os.path.getmtime(self.logFile)
-            if mtime != lastmtime:
-                self.callback()
-                lastmtime = mtime
-        self.process.stop()
-        # self.process.terminate()
+        """monitors the log file & passes the records not delivered yet to the callback"""
+        if not os.path.exists(self.logFile):
+            self.create(os.path.dirname(self.logFile))
+        offset = 0
+        while True:
+            active = self.monitorActive
+            if self.file is not None:
+                self.flush()
+            # the log file was created again
+            if os.path.getsize(self.logFile) < offset:
+                offset = 0
+            records, offset = self.read(offset)
+            if len(records) > 0:
+                self.callback(records)
+            # the last read after monitorStop delivers the remaining records
+            if not active:
+                break
+            self.monitorEvent.wait(self.monitorSeconds)
 
     def monitorStart(self, logFile):
         """starts thread for monitoring changes in the background"""
         self.logFile = logFile
         self.monitorActive = True
-        # self.process = Process(target=self.monitor)
-        self.process = Thread(target=self.monitor)
+        self.monitorEvent.clear()
+        self.process = Thread(target=self.monitor, daemon=True)
         self.process.start()
-        # self.process.join()
-    
+
     def monitorStop(self):
         """stops the loop in the thread"""
         self.monitorActive = False
+        self.monitorEvent.set()
+        if self.process is not None and self.process is not current_thread():
+            self.process.join()
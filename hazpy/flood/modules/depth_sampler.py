@@ -0,0 +1,366 @@
+from affine import Affine
+from contextlib import nullcontext
+from rasterio.warp import transform as warp_transform
+from rasterio.windows import Window
+
+import math
+import numpy as np
+import os
+import rasterio as rio
+import threading
+
+
+class DepthSampler():
+    def __init__(self, depth_grid, keep_open=False):
+        """Sample a depth grid at structure locations
+
+        A depth grid is either a single raster or a mosaic: a folder (or list) of
+        adjacent raster tiles treated as one logical grid. Every point is routed to
+        its covering tile through a footprint index, and each tile is opened once
+        with all of its points sampled in one batch.
+
+        Args:
+            depth_grid (str or list): Raster path, folder of raster tiles or list of raster tiles
+            keep_open (bool, optional): Keep the tiles open between samples (one handle per tile & thread, see close). Defaults to False.
+        """
+        self.depth_grid = depth_grid
+        self.tiles = self.get_tiles(depth_grid)
+        self.chunk_size = 512
+        self.keep_open = keep_open
+        # Open tiles of each thread (rasterio datasets are not shared between threads)
+        self.local = threading.local()
+        self.handles = []
+        self.handles_lock = threading.Lock()
+        self.build_footprint_index()
+
+    def get_tiles(self, depth_grid):
+        """Get raster tiles for a depth grid
+
+        Args:
+            depth_grid (str or list): Raster path, folder of raster tiles or list of raster tiles
+
+        Returns:
+            list: List of raster paths
+        """
+        if isinstance(depth_grid, (list, tuple)):
+            tiles = list(depth_grid)
+        elif os.path.isdir(depth_grid):
+            tiles = sorted([os.path.join(depth_grid, f) for f in os.listdir(depth_grid) if f.lower().endswith(('.tif', '.tiff'))])
+        else:
+            tiles = [depth_grid]
+        if len(tiles) == 0:
+            raise ValueError(f'No raster tiles found for depth grid {depth_grid}')
+        return tiles
+
+    def build_footprint_index(self):
+        """Build a footprint index of the tile extents
+
+        Tiles are registered in a uniform bucket grid (one bucket per median tile size)
+        so each point only has to be tested against the few tiles overlapping its bucket.
+        """
+        bounds = []
+        transforms = []
+        shapes = []
+        self.crs = None
+        for tile in self.tiles:
+            with rio.open(tile) as ds:
+                if self.crs is None:
+                    self.crs = ds.crs
+                    self.dtype = ds.dtypes[0]
+                    self.nodata = ds.nodata
+                elif ds.crs != self.crs:
+                    raise ValueError(f'Mosaic tile {tile} does not share the mosaic coordinate reference system')
+                bounds.append(tuple(ds.bounds))
+                transforms.append(tuple(ds.transform)[:6])
+                shapes.append(ds.shape)
+        self.bounds = np.array(bounds, dtype='float64')
+        self.shapes = np.array(shapes, dtype='int64')
+        # Affine coefficients (pixel -> world) & inverse (world -> pixel) for each tile
+        self.transforms = np.array(transforms, dtype='float64')
+        self.inverse_transforms = np.array([tuple(~Affine(*t))[:6] for t in transforms], dtype='float64')
+        left, bottom, right, top = self.bounds.T
+        self.extent = (left.min(), bottom.min(), right.max(), top.max())
+        self.bucket_width = np.median(right - left)
+        self.bucket_height = np.median(top - bottom)
+        self.bucket_cols = max(1, int(math.ceil((self.extent[2] - self.extent[0]) / self.bucket_width)))
+        self.bucket_rows = max(1, int(math.ceil((self.extent[3] - self.extent[1]) / self.bucket_height)))
+        col_min = np.floor((left - self.extent[0]) / self.bucket_width).astype('int64')
+        col_max = np.minimum(np.ceil((right - self.extent[0]) / self.bucket_width).astype('int64'), self.bucket_cols) - 1
+        row_min = np.floor((self.extent[3] - top) / self.bucket_height).astype('int64')
+        row_max = np.minimum(np.ceil((self.extent[3] - bottom) / self.bucket_height).astype('int64'), self.bucket_rows) - 1
+        buckets = []
+        tile_ids = []
+        for tile_id in range(len(self.tiles)):
+            rows, cols = np.meshgrid(np.arange(row_min[tile_id], row_max[tile_id] + 1), np.arange(col_min[tile_id], col_max[tile_id] + 1), indexing='ij')
+            buckets.append((rows * self.bucket_cols + cols).ravel())
+            tile_ids.append(np.full(rows.size, tile_id, dtype='int64'))
+        buckets = np.concatenate(buckets)
+        tile_ids = np.concatenate(tile_ids)
+        order = np.argsort(buckets, kind='stable')
+        self.bucket_tiles = tile_ids[order]
+        counts = np.bincount(buckets, minlength=self.bucket_rows * self.bucket_cols)
+        self.bucket_start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        self.bucket_count = counts
+
+    def route_points(self, x, y):
+        """Route points to their covering tile
+
+        Args:
+            x (array): X coordinates in the mosaic coordinate reference system
+            y (array): Y coordinates in the mosaic coordinate reference system
+
+        Returns:
+            array: Tile index for each point (-1 if no tile covers the point)
+        """
+        tile = np.full(len(x), -1, dtype='int64')
+        col = np.floor((x - self.extent[0]) / self.bucket_width)
+        row = np.floor((self.extent[3] - y) / self.bucket_height)
+        inside = (col >= 0) & (col < self.bucket_cols) & (row >= 0) & (row < self.bucket_rows)
+        bucket = np.where(inside, row * self.bucket_cols + col, 0).astype('int64')
+        count = np.where(inside, self.bucket_count[bucket], 0)
+        # Test each point against the k-th candidate tile of its bucket
+        for k in range(count.max() if len(count) else 0):
+            pending = np.flatnonzero((tile == -1) & (count > k))
+            if len(pending) == 0:
+                break
+            candidate = self.bucket_tiles[self.bucket_start[bucket[pending]] + k]
+            left, bottom, right, top = self.bounds[candidate].T
+            px, py = x[pending], y[pending]
+            covered = (px >= left) & (px < right) & (py > bottom) & (py <= top)
+            tile[pending[covered]] = candidate[covered]
+        return tile
+
+    def locate(self, longitude, latitude):
+        """Locate points (WGS84) in the depth grid
+
+        Args:
+            longitude (array): Point longitudes
+            latitude (array): Point latitudes
+
+        Returns:
+            tuple: Tile index, fractional row and fractional column for each point
+        """
+        longitude = np.asarray(longitude, dtype='float64')
+        latitude = np.asarray(latitude, dtype='float64')
+        if len(longitude) == 0:
+            return np.empty(0, dtype='int64'), np.empty(0), np.empty(0)
+        x, y = warp_transform('EPSG:4326', self.crs, longitude, latitude)
+        x = np.asarray(x, dtype='float64')
+        y = np.asarray(y, dtype='float64')
+        # Points that cannot be projected are outside the grid
+        projected = np.isfinite(x) & np.isfinite(y)
+        x, y = np.where(projected, x, 0), np.where(projected, y, 0)
+        tile = self.route_points(x, y)
+        tile[~projected] = -1
+        a, b, c, d, e, f = self.inverse_transforms[np.maximum(tile, 0)].T
+        col = a * x + b * y + c
+        row = d * x + e * y + f
+        return tile, row, col
+
+    def read_points(self, dataset, rows, cols, size=1, indexes=1):
+        """Read size x size pixel neighbourhoods for a batch of points from one dataset
+
+        Points are grouped into chunks aligned to the dataset block layout and every
+        chunk is served by a single windowed read. Pixels that are masked (nodata) or
+        fall outside the raster are returned as NaN.
+
+        Args:
+            dataset (DatasetReader): Open rasterio dataset
+            rows (array): Top row of each neighbourhood
+            cols (array): Left column of each neighbourhood
+            size (int, optional): Neighbourhood size in pixels. Defaults to 1.
+            indexes (int or list, optional): Band index(es) to read. Defaults to 1.
+
+        Returns:
+            array: Values with shape (points, bands, size, size)
+        """
+        indexes = [indexes] if isinstance(indexes, int) else list(indexes)
+        values = np.full((len(rows), len(indexes), size, size), np.nan)
+        block_height, block_width = dataset.block_shapes[0]
+        chunk_height = block_height * max(1, self.chunk_size // block_height)
+        chunk_width = block_width * max(1, self.chunk_size // block_width)
+        # Skip neighbourhoods that do not touch the raster
+        touches = (rows + size > 0) & (rows < dataset.height) & (cols + size > 0) & (cols < dataset.width)
+        points = np.flatnonzero(touches)
+        if len(points) == 0:
+            return values
+        chunk_cols = dataset.width // chunk_width + 1
+        chunk = (np.maximum(rows[points], 0) // chunk_height) * chunk_cols + np.maximum(cols[points], 0) // chunk_width
+        order = np.argsort(chunk, kind='stable')
+        points = points[order]
+        chunk = chunk[order]
+        splits = np.flatnonzero(np.diff(chunk)) + 1
+        offsets = np.arange(size)
+        for group in np.split(points, splits):
+            row_start, col_start = rows[group].min(), cols[group].min()
+            row_stop, col_stop = rows[group].max() + size, cols[group].max() + size
+            block = np.full((len(indexes), row_stop - row_start, col_stop - col_start), np.nan)
+            read_row_start, read_col_start = max(row_start, 0), max(col_start, 0)
+            read_row_stop, read_col_stop = min(row_stop, dataset.height), min(col_stop, dataset.width)
+            window = Window(read_col_start, read_row_start, read_col_stop - read_col_start, read_row_stop - read_row_start)
+            data = dataset.read(indexes, window=window, masked=True)
+            block[
+                :,
+                read_row_start - row_start:read_row_stop - row_start,
+                read_col_start - col_start:read_col_stop - col_start,
+            ] = data.astype('float64').filled(np.nan)
+            r = (rows[group] - row_start)[:, None, None] + offsets[None, :, None]
+            c = (cols[group] - col_start)[:, None, None] + offsets[None, None, :]
+            values[group] = np.moveaxis(block[:, r, c], 0, 1)
+        return values
+
+    def sample(self, longitude, latitude, bands=None, method='nearest', window_size=3):
+        """Sample the depth grid at points
+
+        All requested bands (e.g. one band or NetCDF time slice per return period) are
+        read together, so each tile is opened and windowed once for every band.
+
+        Sampling methods:
+            nearest: Value of the pixel containing the point
+            bilinear: Bilinear interpolation of the 2x2 pixel centres around the point
+            max: Maximum over the window_size x window_size pixels centred on the point
+            mean: Mean over the window_size x window_size pixels centred on the point
+
+        Args:
+            longitude (array): Point longitudes
+            latitude (array): Point latitudes
+            bands (list, optional): Band indexes to sample. Defaults to None (band 1).
+            method (str, optional): Sampling method (nearest, bilinear, max, mean). Defaults to 'nearest'.
+            window_size (int, optional): Window size in pixels for max & mean. Defaults to 3.
+
+        Returns:
+            array: Depth for each point, or points x bands depth matrix if bands are given (NaN where nodata or outside the grid)
+        """
+        if method not in ('nearest', 'bilinear', 'max', 'mean'):
+            raise ValueError(f'Unknown sampling method {method}')
+        indexes = [1] if bands is None else [int(band) for band in bands]
+        tile, row, col = self.locate(longitude, latitude)
+        if method == 'bilinear':
+            # Neighbourhood of the 2x2 pixel centres surrounding the point
+            size = 2
+            top, left = np.floor(row - 0.5), np.floor(col - 0.5)
+        elif method == 'nearest':
+            size = 1
+            top, left = np.floor(row), np.floor(col)
+        else:
+            size = int(window_size)
+            top, left = np.floor(row) - (size - 1) // 2, np.floor(col) - (size - 1) // 2
+        values = self.gather(tile, top.astype('int64'), left.astype('int64'), size, indexes)
+        if size > 1 and len(self.tiles) > 1:
+            self.fill_seams(values, tile, top.astype('int64'), left.astype('int64'), size, indexes)
+        depth = self.apply_kernel(values, row - 0.5 - top, col - 0.5 - left, method)
+        return depth[:, 0] if bands is None else depth
+
+    def gather(self, tile, top, left, size, indexes):
+        """Gather pixel neighbourhoods for all points, one batch per tile
+
+        Args:
+            tile (array): Tile index of each point (-1 if outside the grid)
+            top (array): Top row of each neighbourhood in its tile
+            left (array): Left column of each neighbourhood in its tile
+            size (int): Neighbourhood size in pixels
+            indexes (list): Band indexes to read
+
+        Returns:
+            array: Values with shape (points, bands, size, size)
+        """
+        values = np.full((len(tile), len(indexes), size, size), np.nan)
+        for tile_id in np.unique(tile[tile >= 0]):
+            points = np.flatnonzero(tile == tile_id)
+            with self.open_tile(tile_id) as ds:
+                values[points] = self.read_points(ds, top[points], left[points], size=size, indexes=indexes)
+        return values
+
+    def open_tile(self, tile_id):
+        """Open a tile (a kept open tile is not closed at the end of the with block)
+
+        Args:
+            tile_id (int): Tile index
+
+        Returns:
+            context manager: Rasterio dataset
+        """
+        if not self.keep_open:
+            return rio.open(self.tiles[tile_id])
+        if not hasattr(self.local, 'datasets'):
+            self.local.datasets = {}
+        if tile_id not in self.local.datasets:
+            ds = rio.open(self.tiles[tile_id])
+            self.local.datasets[tile_id] = ds
+            with self.handles_lock:
+                self.handles.append(ds)
+        return nullcontext(self.local.datasets[tile_id])
+
+    def close(self):
+        """Close the tiles kept open (all threads)"""
+        with self.handles_lock:
+            for ds in self.handles:
+                ds.close()
+            self.handles = []
+        self.local = threading.local()
+
+    def fill_seams(self, values, tile, top, left, size, indexes):
+        """Complete neighbourhoods that extend past the edge of their tile from the adjacent tiles
+
+        The pixel centres of those neighbourhoods are routed through the footprint
+        index like any other point, so mosaic seams behave as one continuous grid.
+
+        Args:
+            values (array): Values with shape (points, bands, size, size), updated in place
+            tile (array): Tile index of each point (-1 if outside the grid)
+            top (array): Top row of each neighbourhood in its tile
+            left (array): Left column of each neighbourhood in its tile
+            size (int): Neighbourhood size in pixels
+            indexes (list): Band indexes to read
+        """
+        height, width = self.shapes[np.maximum(tile, 0)].T
+        points = np.flatnonzero((tile >= 0) & ((top < 0) | (left < 0) | (top + size > height) | (left + size > width)))
+        if len(points) == 0:
+            return
+        offsets = np.arange(size) + 0.5
+        rows = (top[points][:, np.newaxis, np.newaxis] + offsets[np.newaxis, :, np.newaxis]).repeat(size, axis=2).ravel()
+        cols = (left[points][:, np.newaxis, np.newaxis] + offsets[np.newaxis, np.newaxis, :]).repeat(size, axis=1).ravel()
+        a, b, c, d, e, f = self.transforms[tile[points]].repeat(size * size, axis=0).T
+        x = a * cols + b * rows + c
+        y = d * cols + e * rows + f
+        pixel_tile = self.route_points(x, y)
+        a, b, c, d, e, f = self.inverse_transforms[np.maximum(pixel_tile, 0)].T
+        pixel_values = self.gather(pixel_tile, np.floor(d * x + e * y + f).astype('int64'), np.floor(a * x + b * y + c).astype('int64'), 1, indexes)
+        values[points] = np.moveaxis(pixel_values.reshape(len(points), size, size, len(indexes)), 3, 1)
+
+    def apply_kernel(self, values, row_offset, col_offset, method):
+        """Reduce pixel neighbourhoods to one depth per point & band
+
+        Pixels without data (NaN, or the float32 minimum used as fill by rasters
+        without a nodata value) are ignored by max & mean. Bilinear interpolation
+        falls back to the nearest pixel when any of the 4 pixels has no data.
+
+        Args:
+            values (array): Neighbourhoods with shape (points, bands, size, size)
+            row_offset (array): Point row offset from the first pixel centre of the neighbourhood
+            col_offset (array): Point column offset from the first pixel centre of the neighbourhood
+            method (str): Sampling method (nearest, bilinear, max, mean)
+
+        Returns:
+            array: Depth with shape (points, bands)
+        """
+        if method == 'nearest':
+            return values[:, :, 0, 0]
+        valid = np.isfinite(values) & (values > -1e38)
+        if method == 'max':
+            depth = np.where(valid, values, -np.inf).max(axis=(2, 3))
+            return np.where(np.isfinite(depth), depth, np.nan)
+        if method == 'mean':
+            count = valid.sum(axis=(2, 3))
+            total = np.where(valid, values, 0).sum(axis=(2, 3))
+            return np.divide(total, count, out=np.full(total.shape, np.nan), where=count > 0)
+        fy = row_offset[:, np.newaxis]
+        fx = col_offset[:, np.newaxis]
+        depth = (
+            values[:, :, 0, 0] * (1 - fy) * (1 - fx)
+            + values[:, :, 0, 1] * (1 - fy) * fx
+            + values[:, :, 1, 0] * fy * (1 - fx)
+            + values[:, :, 1, 1] * fy * fx
+        )
+        nearest = values[np.arange(len(values)), :, (row_offset >= 0.5).astype('int64'), (col_offset >= 0.5).astype('int64')]
+        return np.where(valid.all(axis=(2, 3)), depth, nearest)
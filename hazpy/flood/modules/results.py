@@ -0,0 +1,109 @@
+import pandas as pd
+
+# Text codes with few distinct values are categorical
+CATEGORIES = ['Occ', 'SOID', 'HazardZone', 'DebrisID', 'GridName', 'PELV_Median_Label']
+# Flags & counts that are never missing
+INTEGERS = {'flExp': 'int8', 'FoundationType': 'int16'}
+
+
+class Results():
+    def __init__(self):
+        """In-memory results of a UDF run (see UDF output)
+
+        grids: standard losses per depth grid (grid name: dataframe), in grid order
+        aal: AAL losses per return period (return period: dataframe)
+        aal_sum: AAL sum per structure (dataframe, None without AAL)
+        pelv: PELV losses per PELV return period (return period: dataframe)
+
+        The dataframes are typed (see get_typed): numeric columns are numbers
+        (also the columns the CSV & AAL steps format as text), text codes are
+        categorical and the duplicate CDDF_ID column of the CSV layout is dropped.
+        """
+        self.grids = {}
+        self.aal = {}
+        self.aal_sum = None
+        self.pelv = {}
+
+    def add_grid(self, name, df):
+        """Add the standard losses of a depth grid
+
+        Args:
+            name (str): Depth grid name
+            df (dataframe): Losses of the depth grid
+        """
+        self.grids[name] = self.get_typed(df)
+
+    def add_aal(self, aal):
+        """Add the per return period AAL losses & AAL sum
+
+        Args:
+            aal (AAL): AAL calculation
+        """
+        for df in aal.df_list:
+            self.aal[str(df.name)] = self.get_typed(df)
+        if aal.df_sum is not None:
+            self.aal_sum = self.get_typed(aal.df_sum)
+
+    def add_pelv(self, pelv_number, df):
+        """Add the losses of a PELV return period
+
+        Args:
+            pelv_number (str): PELV return period
+            df (dataframe): PELV losses
+        """
+        self.pelv[str(pelv_number)] = self.get_typed(df)
+
+    def get_typed(self, df):
+        """Get a typed copy of a results dataframe
+
+        Args:
+            df (dataframe): Results dataframe
+
+        Returns:
+            dataframe: Dataframe with numeric, integer & categorical columns
+        """
+        df = df.loc[:, ~df.columns.duplicated()]
+        columns = {}
+        for column in df.columns:
+            values = df[column]
+            if column in CATEGORIES:
+                values = values.astype('category')
+            elif column in INTEGERS and values.notna().all() and pd.api.types.is_numeric_dtype(values):
+                values = values.astype(INTEGERS[column])
+            elif values.dtype == object:
+                # Numbers formatted as text (blank for missing values)
+                numbers = pd.to_numeric(values.where(values != ''), errors='coerce')
+                if numbers.notna().sum() == (values.notna() & (values != '')).sum():
+                    values = numbers
+            columns[column] = values
+        typed = pd.DataFrame(columns, index=df.index)
+        typed.reset_index(drop=True, inplace=True)
+        return typed
+
+    def to_arrow(self, df):
+        """Convert a results dataframe to an Arrow table (needs pyarrow)
+
+        Args:
+            df (dataframe): Results dataframe (e.g. results.grids['depth'])
+
+        Returns:
+            Table: pyarrow table
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError('Arrow tables need pyarrow (conda install pyarrow)')
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def to_dict(self):
+        """Get the results as a dictionary of dataframes
+
+        Returns:
+            dict: grids, aal, aal_sum & pelv
+        """
+        return {
+            'grids': self.grids,
+            'aal': self.aal,
+            'aal_sum': self.aal_sum,
+            'pelv': self.pelv,
+        }
@@ -0,0 +1,149 @@
+from contextlib import contextmanager
+
+import ctypes
+import json
+import os
+import sys
+import time
+
+
+class RunReport():
+    def __init__(self, callback=None):
+        """Per-stage timing & memory report of a run
+
+        Each stage records wall time, CPU time (process, all threads), rows in & out
+        and the growth of the process peak RSS (peak_rss_delta_mb: how much the
+        stage raised the high-water mark, 0 if it stayed below an earlier peak).
+        Stages can be nested (e.g. the loss stages of a PELV run); nested stages
+        record their parent stage & are not counted again in the totals.
+
+        Args:
+            callback (function, optional): Called with each finished stage record (progress). Defaults to None.
+        """
+        self.callback = callback
+        self.stages = []
+        self.active = []
+        self.info = {}
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    @contextmanager
+    def stage(self, name, rows_in=None, **info):
+        """Record a stage
+
+        Args:
+            name (str): Stage name (read, sample, adjust, soid, losses, debris, restore, sort, write, aal, pelv...)
+            rows_in (int, optional): Number of input rows. Defaults to None.
+            info (optional): Stage attributes (e.g. grid name)
+
+        Yields:
+            dict: Stage record (set rows_out if the stage changes the number of rows)
+        """
+        record = {
+            'stage': name,
+            'parent': self.active[-1]['stage'] if self.active else None,
+            'rows_in': rows_in,
+            'rows_out': rows_in,
+        }
+        record.update(info)
+        self.active.append(record)
+        peak_rss = self.get_peak_rss()
+        start_cpu = time.process_time()
+        start_wall = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = round(time.perf_counter() - start_wall, 6)
+            record['cpu_s'] = round(time.process_time() - start_cpu, 6)
+            end_peak_rss = self.get_peak_rss()
+            record['peak_rss_delta_mb'] = round((end_peak_rss - peak_rss) / 1e6, 3) if peak_rss is not None else None
+            record['peak_rss_mb'] = round(end_peak_rss / 1e6, 3) if end_peak_rss is not None else None
+            self.active.pop()
+            self.add(record)
+
+    def add(self, record):
+        """Add a finished stage record (e.g. timed by a writer process)
+
+        Args:
+            record (dict): Stage record
+        """
+        self.stages.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def get_peak_rss(self):
+        """Get the peak resident set size of the process
+
+        Returns:
+            int: Peak RSS in bytes (None if not available)
+        """
+        try:
+            if sys.platform == 'win32':
+                class ProcessMemoryCounters(ctypes.Structure):
+                    _fields_ = [
+                        ('cb', ctypes.c_ulong),
+                        ('PageFaultCount', ctypes.c_ulong),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t),
+                    ]
+                counters = ProcessMemoryCounters()
+                counters.cb = ctypes.sizeof(counters)
+                process = ctypes.windll.kernel32.GetCurrentProcess()
+                ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb)
+                return int(counters.PeakWorkingSetSize)
+            import resource
+            peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+            return int(peak_rss if sys.platform == 'darwin' else peak_rss * 1024)
+        except Exception:
+            return None
+
+    def get_totals(self):
+        """Sum wall & CPU time of the top-level stages by stage name
+
+        Returns:
+            dict: Stage name: wall_s, cpu_s & count
+        """
+        totals = {}
+        for record in self.stages:
+            if record['parent'] is not None:
+                continue
+            total = totals.setdefault(record['stage'], {'wall_s': 0.0, 'cpu_s': 0.0, 'count': 0})
+            total['wall_s'] = round(total['wall_s'] + record['wall_s'], 6)
+            total['cpu_s'] = round(total['cpu_s'] + record['cpu_s'], 6)
+            total['count'] += 1
+        return totals
+
+    def to_dict(self):
+        """Get the run report
+
+        Returns:
+            dict: Run attributes (info), total wall & CPU time, peak RSS, per-stage totals & stage records (in completion order)
+        """
+        peak_rss = self.get_peak_rss()
+        return {
+            'info': self.info,
+            'wall_s': round(time.perf_counter() - self.start_wall, 6),
+            'cpu_s': round(time.process_time() - self.start_cpu, 6),
+            'peak_rss_mb': round(peak_rss / 1e6, 3) if peak_rss is not None else None,
+            'totals': self.get_totals(),
+            'stages': list(self.stages),
+        }
+
+    def write(self, path):
+        """Write the run report to a JSON file
+
+        Args:
+            path (str): Path of the JSON file
+        """
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        with open(path, 'w') as report_file:
+            json.dump(self.to_dict(), report_file, indent=2, default=str)
@@ -0,0 +1,946 @@
+"""Local analysis service
+
+Long-running process that keeps the parsed lookup tables, DDF arrays, open
+depth grid rasters (footprint index & handles) and tract polygons (spatial
+index) warm between analyses, so small what-if UDF runs return in well under
+a second instead of paying the imports, LUT parsing & raster opening again.
+
+The service is a plain HTTP/JSON server on localhost (asyncio, no extra
+dependencies). Jobs run on a worker thread pool & stream their run report
+stages as progress events:
+
+    GET    /status                          service & cache state
+    GET    /jobs                            jobs
+    POST   /jobs                            submit a job (JSON, see Job)
+    GET    /jobs/{id}                       job state
+    GET    /jobs/{id}/events?since=0        progress events (JSON lines, streamed until the job is done)
+    GET    /jobs/{id}/results               result names & run report
+    GET    /jobs/{id}/results/{kind}[/{name}]  result dataframe (JSON, split orientation)
+    DELETE /jobs/{id}                       cancel a queued job or remove a done job
+    POST   /shutdown                        stop the service
+
+Requests must come to a localhost Host (no DNS rebinding), from no Origin or a
+localhost Origin (no cross-site browser requests) and send the token of the
+service start in the X-FAST-Token header; POST bodies must be
+application/json. The token is written to a file only the user can read (see
+get_token_path), where ServiceClient reads it.
+
+Usage:
+    python -m hazpy.flood.modules.service [--port 8765] [--workers 2] [--lut-dir ./Lookuptables]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import secrets
+import tempfile
+import time
+
+# UDF keyword arguments a job can set (options)
+JOB_OPTIONS = [
+    'bands',
+    'dem',
+    'sample_method',
+    'window_size',
+    'footprints',
+    'footprint_stat',
+    'dedup',
+    'sparse',
+    'exposed_only',
+    'ddf_resolution',
+    'hazard_zones',
+    'tracts',
+    'write_queue',
+    'write_process',
+]
+# Lookup tables read by every run (see UDF.get_flood_damage)
+LOOKUP_TABLES = [
+    'Building_DDF_Riverine_LUT_Hazus4p0.csv',
+    'Building_DDF_CoastalA_LUT_Hazus4p0.csv',
+    'Building_DDF_CoastalV_LUT_Hazus4p0.csv',
+    'flBldgStructDmgFn.csv',
+    'Content_DDF_Riverine_LUT_Hazus4p0.csv',
+    'Content_DDF_CoastalA_LUT_Hazus4p0.csv',
+    'Content_DDF_CoastalV_LUT_Hazus4p0.csv',
+    'flBldgContDmgFn.csv',
+    'Inventory_DDF_LUT_Hazus4p0.csv',
+    'Inventory_DDF_LUT.csv',
+    'flBldgInvDmgFn.csv',
+    'flBldgEconParamSalesAndInv.csv',
+    'flDebris_LUT.csv',
+    'flRsFnGBS_LUT.csv',
+    'OccupancyTypes.csv',
+]
+STATUS_MESSAGES = {
+    200: 'OK',
+    202: 'Accepted',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    403: 'Forbidden',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    409: 'Conflict',
+    415: 'Unsupported Media Type',
+    500: 'Internal Server Error',
+}
+# Host & Origin names accepted by the service
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+TOKEN_HEADER = 'X-FAST-Token'
+
+
+def get_token_path(port):
+    """Get the token file of the service listening on a port
+
+    Args:
+        port (int): Service port
+
+    Returns:
+        str: Token file path (temporary folder)
+    """
+    return os.path.join(tempfile.gettempdir(), f'fast-service-{port}.token')
+
+
+def get_hostname(value):
+    """Get the host name of a Host header or an Origin
+
+    Args:
+        value (str): host[:port] or scheme://host[:port]
+
+    Returns:
+        str: Lowercase host name (None if missing or invalid)
+    """
+    try:
+        return urlsplit(value if '://' in value else f'//{value}').hostname
+    except ValueError:
+        return None
+
+
+def get_version(paths):
+    """Get the modification times of files (a folder: the folder & its files)
+
+    Args:
+        paths (list): File or folder paths (paths that do not exist, e.g. NetCDF subdatasets, are skipped)
+
+    Returns:
+        tuple: Modification times
+    """
+    version = []
+    for path in paths:
+        if not isinstance(path, str) or not os.path.exists(path):
+            continue
+        version.append(os.path.getmtime(path))
+        if os.path.isdir(path):
+            version += sorted(entry.stat().st_mtime for entry in os.scandir(path) if entry.is_file())
+    return tuple(version)
+
+
+class AnalysisCache():
+    def __init__(self):
+        """Warm state shared by the runs of the analysis service (see UDF cache)
+
+        lookup_tables: parsed lookup tables (path: version & dataframe), runs get a copy
+        lookup_arrays: DDF, debris, restoration & occupancy arrays (LUT folder, DDF resolution & user DDF fields: arrays)
+        depth_samplers: depth grid samplers keeping their tiles open (depth grid: version & sampler)
+        tracts: prepared tract polygons with a spatial index (path: version & geodataframe)
+
+        Entries are rebuilt when their files change (modification times). Runs
+        of different threads share the entries: they are only read once built,
+        and the runs add each lookup array to their shared dict in one assignment
+        of the complete array (two runs may build the same array, one is kept).
+        """
+        self.lock = Lock()
+        self.lookup_tables = {}
+        self.lookup_arrays = {}
+        self.depth_samplers = {}
+        self.tracts = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_entry(self, entries, key, version, build):
+        """Get a cache entry, built if missing or changed
+
+        A replaced value (changed files, or the value of a run that built the
+        same entry at the same time) is closed if it has a close method, so
+        depth samplers do not keep the handles (on Windows, locks) of replaced
+        rasters. A sampler closed during a run reopens its tiles on the next sample.
+
+        Args:
+            entries (dict): Cache entries (key: version & value)
+            key (hashable): Entry key
+            version (tuple): File modification times of the entry
+            build (function): Builds the value
+
+        Returns:
+            object: Entry value
+        """
+        with self.lock:
+            entry = entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # Built outside the lock (two runs may build the same entry once)
+        value = build()
+        with self.lock:
+            entry = entries.get(key)
+            if entry is not None and entry[0] == version:
+                # Another run built it first: keep that value
+                value, replaced = entry[1], value
+            else:
+                replaced = entry[1] if entry is not None else None
+                entries[key] = (version, value)
+        if replaced is not None and replaced is not value and hasattr(replaced, 'close'):
+            replaced.close()
+        return value
+
+    def get_lookup_table(self, path):
+        """Get a copy of a parsed lookup table
+
+        Args:
+            path (str): Lookup table path
+
+        Returns:
+            dataframe: Pandas dataframe for the lookup table
+        """
+        import pandas as pd
+        path = os.path.abspath(path)
+        lookup_df = self.get_entry(self.lookup_tables, path, get_version([path]), lambda: pd.read_csv(path, engine='c'))
+        return lookup_df.copy()
+
+    def get_lookup_arrays(self, lut_dir, ddf_resolution, fmap):
+        """Get the lookup arrays of a lookup table folder (see UDF.lookup_arrays)
+
+        Args:
+            lut_dir (str): Lookup table folder
+            ddf_resolution (float): DDF tabulation step in ft (None: not tabulated)
+            fmap (list): UDF field map (user DDF fields)
+
+        Returns:
+            dict: Lookup arrays (filled by the runs)
+        """
+        fmap = fmap or []
+        lut_dir = os.path.abspath(lut_dir)
+        key = (lut_dir, ddf_resolution, 'BldgDamageFnID' in fmap, 'CDDF_ID' in fmap)
+        return self.get_entry(self.lookup_arrays, key, get_version([lut_dir]), dict)
+
+    def get_depth_sampler(self, depth_grid):
+        """Get a depth sampler keeping its tiles open
+
+        Args:
+            depth_grid (str or list): Raster path, folder of raster tiles or list of raster tiles
+
+        Returns:
+            DepthSampler: Depth sampler with the footprint index of the depth grid tiles
+        """
+        from hazpy.flood.modules.depth_sampler import DepthSampler
+        key = tuple(depth_grid) if isinstance(depth_grid, list) else depth_grid
+        paths = list(depth_grid) if isinstance(depth_grid, (list, tuple)) else [depth_grid]
+        return self.get_entry(self.depth_samplers, key, get_version(paths), lambda: DepthSampler(depth_grid, keep_open=True))
+
+    def get_tracts(self, tracts):
+        """Get prepared tract polygons with a spatial index
+
+        Args:
+            tracts (str or geodataframe): Tract polygons file or geodataframe (see PELV.read_tracts)
+
+        Returns:
+            geodataframe: Tract polygons (Tract & geometry, EPSG:4326)
+        """
+        # PELV needs pyodbc & requests: only imported for tract polygons
+        from hazpy.flood.modules import PELV
+
+        def build():
+            prepared = PELV.read_tracts(tracts)
+            prepared.sindex
+            return prepared
+        if not isinstance(tracts, str):
+            return build()
+        path = os.path.abspath(tracts)
+        return self.get_entry(self.tracts, path, get_version([path]), build)
+
+    def warm(self, lut_dir, ddf_resolution=None, fmap=None, depth_grids=None, tracts=None):
+        """Parse the lookup tables & build the lookup arrays (optionally open depth grids & index tracts)
+
+        Args:
+            lut_dir (str): Lookup table folder
+            ddf_resolution (float, optional): DDF tabulation step in ft. Defaults to None.
+            fmap (list, optional): UDF field map (user DDF fields). Defaults to None.
+            depth_grids (list, optional): Depth grids to open. Defaults to None.
+            tracts (str, optional): Tract polygons file. Defaults to None.
+        """
+        from hazpy.flood.modules.UDF import UDF
+        udf = UDF(None, lut_dir, None, [], 'False', fmap or [], 'Riverine', ddf_resolution=ddf_resolution, cache=self)
+        for table in LOOKUP_TABLES:
+            if os.path.exists(os.path.join(lut_dir, table)):
+                udf.read_lookup_table(table)
+        for family in ('building', 'content', 'inventory'):
+            udf.get_ddf_table(family)
+        udf.get_debris_table()
+        udf.get_restore_table()
+        udf.get_occupancy_table()
+        for depth_grid in depth_grids or []:
+            self.get_depth_sampler(depth_grid)
+        if tracts is not None:
+            self.get_tracts(tracts)
+
+    def close(self):
+        """Close the open depth grids & clear the cache
+        """
+        with self.lock:
+            samplers = [sampler for version, sampler in self.depth_samplers.values()]
+            self.lookup_tables = {}
+            self.lookup_arrays = {}
+            self.depth_samplers = {}
+            self.tracts = {}
+        for sampler in samplers:
+            sampler.close()
+
+    def info(self):
+        """Get the cache state
+
+        Returns:
+            dict: Number of entries, hits & misses
+        """
+        with self.lock:
+            return {
+                'lookup_tables': len(self.lookup_tables),
+                'lookup_arrays': len(self.lookup_arrays),
+                'depth_grids': len(self.depth_samplers),
+                'tracts': len(self.tracts),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class Job():
+    def __init__(self, id, request):
+        """Analysis job of the service
+
+        A job request is a JSON object:
+            udf (str) or structures (dict or list): UDF CSV path, or structures as a
+                split-oriented dataframe ({"columns": [...], "data": [[...], ...]}) or records
+            depth_grids (list): Depth grid paths (rasters, folders of tiles)
+            flood_type (str): Riverine, CoastalA, CoastalV...
+            fmap (list, optional): UDF field map. Defaults to the structure columns.
+            analysis_type (str, optional): Analysis type (see UDF). Defaults to None (standard).
+            return_periods (list, optional): AAL return periods. Defaults to None.
+            lut_dir (str, optional): Lookup table folder. Defaults to the service folder.
+            results_dir (str, optional): Results folder. Defaults to None.
+            output (str, optional): memory, csv or both (see UDF output). Defaults to memory.
+            options (dict, optional): Other UDF keyword arguments (see JOB_OPTIONS). Defaults to {}.
+
+        Events are published on the service loop: each waiting event stream is
+        woken up by the changed event (replaced after each publish).
+
+        Args:
+            id (str): Job ID
+            request (dict): Job request
+        """
+        self.id = id
+        self.request = request
+        self.status = 'queued'
+        self.events = []
+        self.changed = asyncio.Event()
+        self.future = None
+        self.results = None
+        self.report = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.publish({'event': 'queued'})
+
+    @property
+    def done(self):
+        return self.status in ('completed', 'failed', 'cancelled')
+
+    def publish(self, event):
+        """Add an event & wake up the event streams (service loop only)
+
+        Args:
+            event (dict): Event (event name & attributes)
+        """
+        event.setdefault('time', round(time.time(), 6))
+        self.events.append(event)
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def to_dict(self):
+        """Get the job state
+
+        Returns:
+            dict: ID, status, error, number of events & times
+        """
+        return {
+            'id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'events': len(self.events),
+            'submitted': self.submitted,
+            'started': self.started,
+            'finished': self.finished,
+            'wall_s': round(self.finished - self.started, 6) if self.finished and self.started else None,
+        }
+
+
+class AnalysisService():
+    def __init__(self, host='127.0.0.1', port=8765, workers=2, lut_dir='./Lookuptables', keep_jobs=50, warm=True, token=None):
+        """Local analysis service (see module docstring)
+
+        Args:
+            host (str, optional): Host to listen on (localhost only by default). Defaults to '127.0.0.1'.
+            port (int, optional): Port (0: any free port, see port after start). Defaults to 8765.
+            workers (int, optional): Number of jobs run at the same time. Defaults to 2.
+            lut_dir (str, optional): Default lookup table folder. Defaults to './Lookuptables'.
+            keep_jobs (int, optional): Number of done jobs (and their results) kept. Defaults to 50.
+            warm (bool, optional): Parse the lookup tables at start. Defaults to True.
+            token (str, optional): Token the requests must send. Defaults to None (new random token at each start).
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.lut_dir = os.path.abspath(lut_dir)
+        self.keep_jobs = keep_jobs
+        self.warm = warm
+        self.token = token
+        self.new_token = token is None
+        self.token_path = None
+        self.cache = AnalysisCache()
+        self.jobs = {}
+        self.job_ids = itertools.count(1)
+        self.executor = None
+        self.server = None
+        self.loop = None
+        self.stopped = None
+        self.started = None
+
+    async def start(self):
+        """Warm the cache & start listening
+        """
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        self.executor = ThreadPoolExecutor(max_workers=max(int(self.workers), 1))
+        if self.warm:
+            await self.loop.run_in_executor(self.executor, self.cache.warm, self.lut_dir)
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.write_token()
+        self.started = time.time()
+        print(f'Analysis service listening on http://{self.host}:{self.port} (token: {self.token_path})')
+
+    def write_token(self):
+        """Create the token of this start (unless given) & write the token file (owner only)
+        """
+        if self.new_token:
+            self.token = secrets.token_urlsafe(32)
+        self.token_path = get_token_path(self.port)
+        if os.path.exists(self.token_path):
+            os.remove(self.token_path)
+        file = os.open(self.token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(file, 'w') as token_file:
+            token_file.write(self.token)
+
+    async def serve(self):
+        """Run the service until shutdown
+        """
+        await self.start()
+        try:
+            await self.stopped.wait()
+        finally:
+            await self.stop()
+
+    async def stop(self):
+        """Stop listening, wait for the running jobs & close the cache
+        """
+        self.server.close()
+        await self.server.wait_closed()
+        await self.loop.run_in_executor(None, self.executor.shutdown, True)
+        self.cache.close()
+        if self.token_path is not None and os.path.exists(self.token_path):
+            os.remove(self.token_path)
+
+    async def handle(self, reader, writer):
+        """Handle an HTTP request (one request per connection)
+
+        Args:
+            reader (StreamReader): Request stream
+            writer (StreamWriter): Response stream
+        """
+        try:
+            request_line = (await reader.readline()).decode('latin-1').strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(' ', 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1')
+                if line in ('\r\n', '\n', ''):
+                    break
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            # Checked before the body is read
+            error = self.check_request(method, headers)
+            if error is not None:
+                return await self.respond(writer, error[0], {'error': error[1]})
+            length = int(headers.get('content-length', 0))
+            body = await reader.readexactly(length) if length else b''
+            url = urlsplit(target)
+            path = [unquote(part) for part in url.path.strip('/').split('/') if part]
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            await self.route(method, path, query, body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            try:
+                await self.respond(writer, 500, {'error': f'{type(e).__name__}: {e}'})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    def check_request(self, method, headers):
+        """Check the Host, Origin, token & content type of a request
+
+        Args:
+            method (str): HTTP method
+            headers (dict): Request headers (lowercase names)
+
+        Returns:
+            tuple: HTTP status & error message (None if the request is accepted)
+        """
+        hosts = LOCAL_HOSTS + (self.host.lower(),)
+        if get_hostname(headers.get('host', '')) not in hosts:
+            return 403, 'Host not allowed'
+        if 'origin' in headers and get_hostname(headers['origin']) not in hosts:
+            return 403, 'Origin not allowed'
+        if not secrets.compare_digest(headers.get(TOKEN_HEADER.lower(), '').encode(), self.token.encode()):
+            return 401, f'Missing or wrong {TOKEN_HEADER}'
+        if method == 'POST' and headers.get('content-type', '').split(';')[0].strip().lower() != 'application/json':
+            return 415, 'Content-Type must be application/json'
+        return None
+
+    async def route(self, method, path, query, body, writer):
+        """Route a request
+
+        Args:
+            method (str): HTTP method
+            path (list): URL path parts
+            query (dict): Query parameters
+            body (bytes): Request body
+            writer (StreamWriter): Response stream
+        """
+        if path == ['status'] and method == 'GET':
+            return await self.respond(writer, 200, self.get_status())
+        if path == ['shutdown'] and method == 'POST':
+            await self.respond(writer, 200, {'status': 'stopping'})
+            self.stopped.set()
+            return
+        if path == ['jobs'] and method == 'GET':
+            return await self.respond(writer, 200, [job.to_dict() for job in self.jobs.values()])
+        if path == ['jobs'] and method == 'POST':
+            try:
+                job = self.submit(json.loads(body or b'{}'))
+            except (ValueError, TypeError) as e:
+                return await self.respond(writer, 400, {'error': str(e)})
+            return await self.respond(writer, 202, job.to_dict())
+        if len(path) < 2 or path[0] != 'jobs' or path[1] not in self.jobs:
+            return await self.respond(writer, 404, {'error': 'Not found'})
+        job = self.jobs[path[1]]
+        if len(path) == 2 and method == 'GET':
+            return await self.respond(writer, 200, job.to_dict())
+        if len(path) == 2 and method == 'DELETE':
+            if job.status == 'queued' and job.future.cancel():
+                self.finish(job, 'cancelled')
+            elif job.done:
+                del self.jobs[job.id]
+            else:
+                return await self.respond(writer, 409, {'error': 'The job is running'})
+            return await self.respond(writer, 200, job.to_dict())
+        if len(path) == 3 and path[2] == 'events' and method == 'GET':
+            return await self.stream_events(job, int(query.get('since', 0)), writer)
+        if len(path) >= 3 and path[2] == 'results' and method == 'GET':
+            if not job.done:
+                return await self.respond(writer, 409, {'error': f'The job is {job.status}'})
+            if len(path) == 3:
+                return await self.respond(writer, 200, self.get_result_names(job))
+            df = self.get_result(job, path[3:])
+            if df is None:
+                return await self.respond(writer, 404, {'error': 'Not found'})
+            # Serialized on a worker (large results would hold the loop)
+            content = await self.loop.run_in_executor(None, lambda: df.to_json(orient='split', index=False).encode())
+            return await self.respond(writer, 200, content)
+        await self.respond(writer, 405, {'error': 'Method not allowed'})
+
+    async def respond(self, writer, status, content):
+        """Send a JSON response
+
+        Args:
+            writer (StreamWriter): Response stream
+            status (int): HTTP status
+            content (object or bytes): JSON content (bytes: already serialized)
+        """
+        body = content if isinstance(content, bytes) else json.dumps(content, default=str).encode()
+        writer.write(
+            f'HTTP/1.1 {status} {STATUS_MESSAGES[status]}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            'Connection: close\r\n\r\n'.encode('latin-1') + body
+        )
+        await writer.drain()
+
+    async def stream_events(self, job, since, writer):
+        """Stream the events of a job (JSON lines, chunked) until the job is done
+
+        Args:
+            job (Job): Job
+            since (int): Index of the first event
+            writer (StreamWriter): Response stream
+        """
+        writer.write(
+            'HTTP/1.1 200 OK\r\n'
+            'Content-Type: application/x-ndjson\r\n'
+            'Transfer-Encoding: chunked\r\n'
+            'Connection: close\r\n\r\n'.encode('latin-1')
+        )
+        index = max(since, 0)
+        while True:
+            changed = job.changed
+            events, index = job.events[index:], len(job.events)
+            if events:
+                chunk = ''.join(json.dumps(event, default=str) + '\n' for event in events).encode()
+                writer.write(f'{len(chunk):X}\r\n'.encode('latin-1') + chunk + b'\r\n')
+                await writer.drain()
+            if job.done and index == len(job.events):
+                break
+            if index == len(job.events):
+                await changed.wait()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    def get_status(self):
+        """Get the service state
+
+        Returns:
+            dict: Address, uptime, workers, lookup table folder, jobs per status & cache state
+        """
+        statuses = {}
+        for job in self.jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            'url': f'http://{self.host}:{self.port}',
+            'uptime_s': round(time.time() - self.started, 3),
+            'workers': self.workers,
+            'lut_dir': self.lut_dir,
+            'jobs': statuses,
+            'cache': self.cache.info(),
+        }
+
+    def submit(self, request):
+        """Check a job request & queue the job
+
+        Args:
+            request (dict): Job request (see Job)
+
+        Returns:
+            Job: Queued job
+        """
+        if not isinstance(request, dict):
+            raise ValueError('The job must be a JSON object')
+        if ('udf' in request) == ('structures' in request):
+            raise ValueError('The job needs either udf (CSV path) or structures')
+        if not request.get('depth_grids'):
+            raise ValueError('The job needs depth_grids')
+        if not request.get('flood_type'):
+            raise ValueError('The job needs flood_type')
+        if request.get('output', 'memory') not in ('memory', 'csv', 'both'):
+            raise ValueError('output must be memory, csv or both')
+        unknown = set(request.get('options', {})) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown options: {', '.join(sorted(unknown))}")
+        job = Job(str(next(self.job_ids)), request)
+        self.jobs[job.id] = job
+        self.remove_old_jobs()
+        job.future = self.executor.submit(self.run, job)
+        return job
+
+    def remove_old_jobs(self):
+        """Remove the oldest done jobs beyond keep_jobs
+        """
+        done = [job.id for job in self.jobs.values() if job.done]
+        for id in done[:max(len(done) - self.keep_jobs, 0)]:
+            del self.jobs[id]
+
+    def run(self, job):
+        """Run a job (worker thread)
+
+        Args:
+            job (Job): Job
+        """
+        from hazpy.flood.modules.UDF import UDF
+        import pandas as pd
+        self.loop.call_soon_threadsafe(self.start_job, job)
+        request = job.request
+        try:
+            if 'structures' in request:
+                structures = request['structures']
+                udf = pd.DataFrame(**structures) if isinstance(structures, dict) and 'columns' in structures else pd.DataFrame(structures)
+                udf.name = request.get('name', 'UDF')
+                fmap = request.get('fmap', list(udf.columns))
+            else:
+                udf = request['udf']
+                fmap = request.get('fmap') or list(pd.read_csv(udf, nrows=0).columns)
+            progress = lambda record: self.loop.call_soon_threadsafe(job.publish, dict(record, event='stage'))
+            analysis = UDF(
+                udf,
+                request.get('lut_dir', self.lut_dir),
+                request.get('results_dir'),
+                list(request['depth_grids']),
+                request.get('qc_warning', 'False'),
+                fmap,
+                request['flood_type'],
+                request.get('analysis_type'),
+                request.get('return_periods'),
+                output=request.get('output', 'memory'),
+                cache=self.cache,
+                progress=progress,
+                **request.get('options', {}),
+            )
+            results = analysis.get_flood_damage()
+            report = analysis.get_run_report()
+            error = report['info'].get('error')
+        except Exception as e:
+            results, report, error = None, None, f'{type(e).__name__}: {e}'
+        self.loop.call_soon_threadsafe(self.finish, job, 'failed' if error else 'completed', results, report, error)
+
+    def start_job(self, job):
+        """Mark a job as running (service loop)
+
+        Args:
+            job (Job): Job
+        """
+        job.status = 'running'
+        job.started = time.time()
+        job.publish({'event': 'started'})
+
+    def finish(self, job, status, results=None, report=None, error=None):
+        """Mark a job as done (service loop)
+
+        Args:
+            job (Job): Job
+            status (str): completed, failed or cancelled
+            results (Results, optional): Run results. Defaults to None.
+            report (dict, optional): Run report. Defaults to None.
+            error (str, optional): Error message. Defaults to None.
+        """
+        job.status = status
+        job.results = results
+        job.report = report
+        job.error = error
+        job.finished = time.time()
+        job.publish({'event': status, 'error': error, 'wall_s': job.to_dict()['wall_s']})
+
+    def get_result_names(self, job):
+        """Get the result names & run report of a job
+
+        Args:
+            job (Job): Done job
+
+        Returns:
+            dict: Job state, result names (grids, aal, aal_sum, pelv) & run report
+        """
+        results = job.results
+        return {
+            'job': job.to_dict(),
+            'grids': list(results.grids) if results else [],
+            'aal': list(results.aal) if results else [],
+            'aal_sum': results is not None and results.aal_sum is not None,
+            'pelv': list(results.pelv) if results else [],
+            'report': job.report,
+        }
+
+    def get_result(self, job, path):
+        """Get a result dataframe of a job
+
+        Args:
+            job (Job): Done job
+            path (list): Kind (grids, aal, aal_sum or pelv) & name (grid name or return period)
+
+        Returns:
+            dataframe: Result dataframe (None if not found)
+        """
+        if job.results is None:
+            return None
+        kind = path[0]
+        if kind == 'aal_sum' and len(path) == 1:
+            return job.results.aal_sum
+        if kind in ('grids', 'aal', 'pelv') and len(path) == 2:
+            return getattr(job.results, kind).get(path[1])
+        return None
+
+
+class ServiceClient():
+    def __init__(self, url='http://127.0.0.1:8765', timeout=30, token=None):
+        """Client of the local analysis service (GUI, scripts)
+
+        Args:
+            url (str, optional): Service URL. Defaults to 'http://127.0.0.1:8765'.
+            timeout (float, optional): Request timeout in seconds. Defaults to 30.
+            token (str, optional): Service token. Defaults to None (read from the token file of the service port).
+        """
+        import urllib.request
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.token = token
+        # The launcher may set a proxy (HTTP_PROXY): never for the local service
+        self.opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def request(self, method, path, content=None):
+        """Send a request to the service
+
+        Args:
+            method (str): HTTP method
+            path (str): URL path
+            content (object, optional): JSON content. Defaults to None.
+
+        Returns:
+            HTTPResponse: Response (raises HTTPError for error statuses)
+        """
+        import urllib.request
+        data = json.dumps(content, default=str).encode() if content is not None else None
+        request = urllib.request.Request(f'{self.url}{path}', data=data, method=method, headers={'Content-Type': 'application/json', TOKEN_HEADER: self.get_token()})
+        return self.opener.open(request, timeout=self.timeout)
+
+    def get_token(self):
+        """Get the service token (else read from the token file, rewritten at each service start)
+
+        Returns:
+            str: Token ('' if the service has not written its token file)
+        """
+        if self.token is not None:
+            return self.token
+        try:
+            with open(get_token_path(urlsplit(self.url).port or 80)) as token_file:
+                return token_file.read().strip()
+        except OSError:
+            return ''
+
+    def get(self, path):
+        with self.request('GET', path) as response:
+            return json.load(response)
+
+    def is_running(self):
+        """Check if the service is running
+
+        Returns:
+            bool: True/False
+        """
+        try:
+            self.get('/status')
+            return True
+        except OSError:
+            return False
+
+    def status(self):
+        return self.get('/status')
+
+    def submit(self, job=None, structures=None, **request):
+        """Submit a job
+
+        Args:
+            job (dict, optional): Job request (see Job). Defaults to None.
+            structures (dataframe, optional): Structures (sent as a split-oriented dataframe). Defaults to None.
+            request (optional): Job request attributes
+
+        Returns:
+            str: Job ID
+        """
+        job = dict(job or {}, **request)
+        if structures is not None:
+            job['structures'] = json.loads(structures.to_json(orient='split', index=False))
+        with self.request('POST', '/jobs', job) as response:
+            return json.load(response)['id']
+
+    def job(self, job_id):
+        return self.get(f'/jobs/{job_id}')
+
+    def events(self, job_id, since=0):
+        """Stream the progress events of a job until it is done
+
+        Args:
+            job_id (str): Job ID
+            since (int, optional): Index of the first event. Defaults to 0.
+
+        Yields:
+            dict: Event
+        """
+        with self.request('GET', f'/jobs/{job_id}/events?since={since}') as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+    def wait(self, job_id, callback=None):
+        """Wait for a job
+
+        Args:
+            job_id (str): Job ID
+            callback (function, optional): Called with each event. Defaults to None.
+
+        Returns:
+            dict: Job state
+        """
+        for event in self.events(job_id):
+            if callback is not None:
+                callback(event)
+        return self.job(job_id)
+
+    def results(self, job_id, kind=None, name=None):
+        """Get the result names or a result dataframe of a done job
+
+        Args:
+            job_id (str): Job ID
+            kind (str, optional): grids, aal, aal_sum or pelv. Defaults to None (result names & run report).
+            name (str, optional): Grid name or return period. Defaults to None.
+
+        Returns:
+            dict or dataframe: Result names & run report, or result dataframe
+        """
+        from urllib.parse import quote
+        if kind is None:
+            return self.get(f'/jobs/{job_id}/results')
+        import pandas as pd
+        path = f'/jobs/{job_id}/results/{kind}' + (f'/{quote(str(name), safe="")}' if name is not None else '')
+        content = self.get(path)
+        return pd.DataFrame(content['data'], columns=content['columns'])
+
+    def remove(self, job_id):
+        with self.request('DELETE', f'/jobs/{job_id}') as response:
+            return json.load(response)
+
+    def shutdown(self):
+        with self.request('POST', '/shutdown', {}) as response:
+            return json.load(response)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FAST local analysis service')
+    parser.add_argument('--host', default='127.0.0.1', help='Host to listen on')
+    parser.add_argument('--port', type=int, default=8765, help='Port')
+    parser.add_argument('--workers', type=int, default=2, help='Number of jobs run at the same time')
+    parser.add_argument('--lut-dir', default='./Lookuptables', help='Default lookup table folder')
+    parser.add_argument('--keep-jobs', type=int, default=50, help='Number of done jobs (and results) kept')
+    parser.add_argument('--no-warm', action='store_true', help='Do not parse the lookup tables at start')
+    args = parser.parse_args()
+    service = AnalysisService(args.host, args.port, args.workers, args.lut_dir, args.keep_jobs, not args.no_warm)
+    try:
+        asyncio.run(service.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
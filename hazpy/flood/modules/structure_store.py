@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+
+class StructureStore():
+    __slots__ = ('size', 'columns', 'categories')
+
+    def __init__(self, size):
+        """Compact columnar store of structure attributes & results
+
+        Each column is a contiguous NumPy array: text columns (Occ, SOID, IDs) are
+        categorical codes (int32, -1 missing) into a categories array, integers are
+        int32 where they fit and floats are float32 where that is lossless (depths &
+        heights sampled from float32 rasters), otherwise float64 (costs & losses).
+        Stages set whole columns, so copies share the arrays they do not change.
+        A dataframe is only built for output.
+
+        Args:
+            size (int): Number of structures
+        """
+        self.size = size
+        self.columns = {}
+        self.categories = {}
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Create a structure store from a dataframe
+
+        Args:
+            df (dataframe): Pandas dataframe (geometry columns are skipped)
+
+        Returns:
+            StructureStore: Structure store with a column for each dataframe column
+        """
+        store = cls(len(df))
+        for column in df.columns:
+            if column == 'geometry':
+                continue
+            store.set(column, df[column].values)
+        return store
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def copy(self):
+        """Shallow copy (arrays are shared until a column is set)
+
+        Returns:
+            StructureStore: Structure store copy
+        """
+        store = StructureStore(self.size)
+        store.columns = dict(self.columns)
+        store.categories = dict(self.categories)
+        return store
+
+    def set(self, name, values, rows=None, fill=np.nan):
+        """Set a column
+
+        Args:
+            name (str): Column name
+            values (array): Column values (for all structures, or the rows)
+            rows (array, optional): Structure indexes of the values. Defaults to None (all structures).
+            fill (optional): Value of the structures not in rows. Defaults to NaN.
+        """
+        values = np.asarray(values)
+        if rows is not None:
+            full = np.empty(self.size, dtype=np.result_type(values, np.asarray(fill)) if values.dtype.kind != 'O' else object)
+            full[:] = fill
+            full[rows] = values
+            values = full
+        if values.dtype.kind in ('O', 'U', 'S'):
+            codes, categories = pd.factorize(values)
+            self.columns[name] = codes.astype('int32')
+            self.categories[name] = np.asarray(categories, dtype=object)
+            return
+        self.categories.pop(name, None)
+        if values.dtype.kind in ('i', 'u') and len(values) > 0 and np.iinfo('int32').min <= values.min() and values.max() <= np.iinfo('int32').max:
+            values = values.astype('int32')
+        elif values.dtype.kind == 'f':
+            compact = values.astype('float32')
+            values = compact if np.array_equal(compact, values, equal_nan=True) else values.astype('float64')
+        self.columns[name] = np.ascontiguousarray(values)
+
+    def get(self, name, rows=None):
+        """Get column values (categorical columns decoded, floats as float64)
+
+        Args:
+            name (str): Column name
+            rows (array, optional): Structure indexes. Defaults to None (all structures).
+
+        Returns:
+            array: Column values
+        """
+        values = self.columns[name] if rows is None else self.columns[name][rows]
+        if name in self.categories:
+            return np.append(self.categories[name], np.nan)[values]
+        if values.dtype.kind == 'f':
+            return values.astype('float64')
+        return values
+
+    def get_categorical(self, name, rows=None):
+        """Get column values as a pandas Categorical (without decoding categorical columns)
+
+        Args:
+            name (str): Column name
+            rows (array, optional): Structure indexes. Defaults to None (all structures).
+
+        Returns:
+            Categorical or array: Categorical for categorical columns, otherwise the column values
+        """
+        if name not in self.categories:
+            return self.get(name, rows)
+        codes = self.columns[name] if rows is None else self.columns[name][rows]
+        return pd.Categorical.from_codes(codes, self.categories[name])
+
+    def codes(self, name):
+        """Get the codes & categories of a categorical column
+
+        Args:
+            name (str): Column name
+
+        Returns:
+            tuple: Codes (-1 missing) & categories arrays
+        """
+        return self.columns[name], self.categories[name]
+
+    def drop(self, names):
+        """Drop columns
+
+        Args:
+            names (list): Column names
+        """
+        for name in names:
+            self.columns.pop(name, None)
+            self.categories.pop(name, None)
+
+    def nbytes(self):
+        """Memory used by the column arrays
+
+        Returns:
+            int: Bytes
+        """
+        return sum(values.nbytes for values in self.columns.values()) + sum(categories.nbytes for categories in self.categories.values())
+
+    def to_dataframe(self, columns=None, rows=None):
+        """Convert to a dataframe
+
+        Args:
+            columns (list, optional): Output columns (missing columns are NaN, duplicates allowed). Defaults to None (all columns).
+            rows (array, optional): Structure indexes. Defaults to None (all structures).
+
+        Returns:
+            dataframe: Pandas dataframe
+        """
+        names = list(self.columns) if columns is None else list(dict.fromkeys(column for column in columns if column in self.columns))
+        df = pd.DataFrame({name: self.get(name, rows) for name in names})
+        if len(names) == 0:
+            df = pd.DataFrame(index=range(self.size if rows is None else len(rows)))
+        if columns is not None:
+            df = df.reindex(columns=columns)
+        return df
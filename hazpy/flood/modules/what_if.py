@@ -1,6 +1,429 @@
+from hazpy.flood.modules.run_report import RunReport
+from hazpy.flood.modules import writer
+
+import numpy as np
+import os
+import pandas as pd
+import warnings
+
+# Disable pandas warnings
+warnings.filterwarnings('ignore')
+
+# Per-structure loss fields of a scenario (long losses table)
+LOSS_FIELDS = ['BldgDmgPct', 'ContDmgPct', 'InvDmgPct', 'BldgLossUSD', 'ContentLossUSD', 'InventoryLossUSD']
+# Scenario changes & structure selection (see add_scenario)
+CHANGES = ['ffh_delta', 'ffh_min', 'foundation_type', 'flood_proof']
+SELECTION = ['occ', 'foundation', 'floodplain', 'structures', 'mask']
+
+
 class WhatIf():
-    def __init__(self):
-        pass
+    def __init__(self, udf=None):
+        """Mitigation scenario sweep (what-if) engine
+
+        Evaluates many mitigation scenarios of a UDF run without re-running
+        get_flood_damage for each one: the depth grids are sampled once, SOID &
+        costs are calculated once, and the losses of every scenario & depth grid
+        are evaluated in one pass of the fused DDF kernel (UDF.get_fused_losses).
+        Only the exposed structures a scenario changes are evaluated for it; the
+        other structures keep their baseline losses.
+
+        A scenario changes the first floor height (ffh_delta, ffh_min), the
+        foundation type (foundation_type, e.g. a basement (4) filled to a slab (7):
+        the SOID & DDF follow) or dry flood-proofs the structure (flood_proof: no
+        damage while the depth in structure is at most that height) for the
+        structures it selects (occ, foundation, floodplain, structures, mask).
+
+        Results (see run):
+            losses: losses per scenario, depth grid & exposed structure, with avoided losses vs the baseline
+            benefits: avoided losses per structure (a column per scenario & depth grid, AAL with return periods)
+            summary: structures changed, exposed structures, total & avoided losses per scenario & depth grid
+
+        Debris & restoration days are not part of the sweep (see UDF).
+
+        Args:
+            udf (UDF, optional): UDF analysis (structures, depth grids, lookup tables, flood type, return periods...). Defaults to None.
+        """
+        self.udf = udf
+        self.scenarios = []
+        self.input = None
+        self.depth_matrix = None
+        self.grid_names = []
+        self.losses = None
+        self.benefits = None
+        self.summary = None
+        self.run_report = RunReport()
+
+    def add_scenario(self, name, ffh_delta=None, ffh_min=None, foundation_type=None, flood_proof=None, occ=None, foundation=None, floodplain=None, structures=None, mask=None):
+        """Add a mitigation scenario
+
+        Args:
+            name (str): Scenario name (unique, not 'Baseline')
+            ffh_delta (float, optional): First floor height increase in ft (elevation). Defaults to None.
+            ffh_min (float, optional): Minimum first floor height in ft (elevate to). Defaults to None.
+            foundation_type (int, optional): New foundation type (e.g. 7 to fill a basement). Defaults to None.
+            flood_proof (float, optional): Dry flood-proofing height in ft above the first floor. Defaults to None.
+            occ (str or list, optional): Occupancies selected (prefixes, e.g. 'RES1' or ['COM', 'IND']). Defaults to None (all).
+            foundation (int or list, optional): Current foundation types selected. Defaults to None (all).
+            floodplain (str or int, optional): Depth grid name (or index): structures exposed in that grid (e.g. the 100-year grid). Defaults to None (all).
+            structures (list, optional): FltyIds selected. Defaults to None (all).
+            mask (array, optional): Structures selected (boolean, in UDF order). Defaults to None (all).
+
+        Returns:
+            dict: Scenario
+        """
+        scenario = {
+            'name': str(name),
+            'ffh_delta': ffh_delta,
+            'ffh_min': ffh_min,
+            'foundation_type': foundation_type,
+            'flood_proof': flood_proof,
+            'occ': occ,
+            'foundation': foundation,
+            'floodplain': floodplain,
+            'structures': structures,
+            'mask': mask,
+        }
+        if scenario['name'] == 'Baseline' or scenario['name'] in [existing['name'] for existing in self.scenarios]:
+            raise ValueError(f"Scenario name {scenario['name']} is already used")
+        if all(scenario[change] is None for change in CHANGES):
+            raise ValueError(f"Scenario {scenario['name']} changes nothing ({', '.join(CHANGES)})")
+        self.scenarios.append(scenario)
+        return scenario
+
+    def add_scenarios(self, name, ffh_deltas=None, foundation_types=None, flood_proofs=None, **selection):
+        """Add a matrix of scenarios for the same structures (every combination of the changes)
+
+        E.g. add_scenarios('Elevate RES1', ffh_deltas=[1, 2, 3], occ='RES1', floodplain='100')
+        adds 'Elevate RES1 +1ft', 'Elevate RES1 +2ft' & 'Elevate RES1 +3ft'.
+
+        Args:
+            name (str): Scenario name prefix
+            ffh_deltas (list, optional): First floor height increases in ft. Defaults to None.
+            foundation_types (list, optional): New foundation types. Defaults to None.
+            flood_proofs (list, optional): Dry flood-proofing heights in ft. Defaults to None.
+            selection (optional): Structure selection (occ, foundation, floodplain, structures, mask, see add_scenario)
+
+        Returns:
+            list: Scenarios
+        """
+        unknown = set(selection) - set(SELECTION)
+        if unknown:
+            raise ValueError(f"Unknown selection: {', '.join(sorted(unknown))}")
+        scenarios = []
+        for ffh_delta in ffh_deltas or [None]:
+            for foundation_type in foundation_types or [None]:
+                for flood_proof in flood_proofs or [None]:
+                    label = ''.join([
+                        f' +{ffh_delta:g}ft' if ffh_delta is not None else '',
+                        f' foundation {foundation_type}' if foundation_type is not None else '',
+                        f' flood-proof {flood_proof:g}ft' if flood_proof is not None else '',
+                    ])
+                    scenarios.append(self.add_scenario(f'{name}{label}', ffh_delta, None, foundation_type, flood_proof, **selection))
+        return scenarios
+
+    def sample(self):
+        """Read the UDF, sample all depth grids once & calculate SOID & costs
+
+        Returns:
+            array: Depth matrix (structures x depth grids)
+        """
+        udf = self.udf
+        udf.run_report = self.run_report
+        udf.change_directory()
+        with self.run_report.stage('read') as stage:
+            input = udf.read_csv(udf.UDFOrig)
+            stage['rows_out'] = len(input)
+        if 'UserDefinedFltyId' in input.columns:
+            input = input.rename(columns={'UserDefinedFltyId': 'FltyId'})
+        if 'flC' in input.columns or udf.hazard_zones:
+            with self.run_report.stage('hazard_zones', len(input)):
+                input['HazardZone'] = udf.get_hazard_zones(input)
+        depth_grids = list(zip(udf.DepthGrids, udf.bands))
+        self.grid_names = [udf.get_grid_name(depth_grid, band) for depth_grid, band in depth_grids]
+        with self.run_report.stage('sample', len(input), grids=len(depth_grids)):
+            self.depth_matrix = udf.get_depth_matrix(input, depth_grids)
+        with self.run_report.stage('soid', len(input)):
+            input = udf.create_specific_occ_id(input.reset_index(drop=True))
+        with self.run_report.stage('costs', len(input)):
+            input = udf.get_content_cost(input)
+            input = udf.get_inventory_cost(input)
+        self.input = input
+        # Occupancy & SOID stem (without the foundation suffix) codes: selections & SOIDs are built per distinct value
+        self.occ_codes, self.occs = pd.factorize(input['Occ'].astype(str).str.strip())
+        soid_codes, soids = pd.factorize(input['SOID'])
+        self.stem_codes, self.stems = pd.factorize(np.append(np.array([soid[:-1] for soid in soids], dtype=object), '')[soid_codes])
+        # Curve key fields as categoricals (factorized once for all rows of the pass)
+        self.keys = {field: pd.Categorical(input[field]) for field in ('Occ', 'HazardZone', 'BldgDamageFnID', 'CDDF_ID') if field in input.columns}
+        return self.depth_matrix
+
+    def get_selection(self, scenario):
+        """Get the structures a scenario changes
+
+        Args:
+            scenario (dict): Scenario (see add_scenario)
+
+        Returns:
+            array: Structures selected (boolean, in UDF order)
+        """
+        input = self.input
+        selected = np.ones(len(input), dtype=bool)
+        if scenario['occ'] is not None:
+            prefixes = (scenario['occ'],) if isinstance(scenario['occ'], str) else tuple(scenario['occ'])
+            matches = np.flatnonzero([occ.startswith(prefixes) for occ in self.occs])
+            selected &= np.isin(self.occ_codes, matches)
+        if scenario['foundation'] is not None:
+            foundations = [scenario['foundation']] if np.isscalar(scenario['foundation']) else list(scenario['foundation'])
+            selected &= input['FoundationType'].isin(foundations).values
+        if scenario['floodplain'] is not None:
+            floodplain = scenario['floodplain']
+            if not isinstance(floodplain, (int, np.integer)):
+                if str(floodplain) not in self.grid_names:
+                    raise ValueError(f"Scenario {scenario['name']}: unknown floodplain depth grid {floodplain} ({', '.join(self.grid_names)})")
+                floodplain = self.grid_names.index(str(floodplain))
+            selected &= self.depth_matrix[:, floodplain] > 0
+        if scenario['structures'] is not None:
+            selected &= input['FltyId'].isin(list(scenario['structures'])).values
+        if scenario['mask'] is not None:
+            selected &= np.asarray(scenario['mask'], dtype=bool)
+        return selected
+
+    def get_scenario_values(self, scenario, rows):
+        """Get the first floor heights, foundation types & flood-proofing heights of a scenario
+
+        Args:
+            scenario (dict): Scenario (see add_scenario), None for the baseline
+            rows (array): Structure indexes
+
+        Returns:
+            tuple: First floor height, foundation type & flood-proofing height arrays (NaN: not flood-proofed)
+        """
+        first_floor_height = self.input['FirstFloorHt'].values[rows].astype(float)
+        foundation_type = self.input['FoundationType'].values[rows]
+        flood_proof = np.full(len(rows), np.nan)
+        if scenario is None:
+            return first_floor_height, foundation_type, flood_proof
+        if scenario['ffh_delta'] is not None:
+            first_floor_height = first_floor_height + float(scenario['ffh_delta'])
+        if scenario['ffh_min'] is not None:
+            first_floor_height = np.maximum(first_floor_height, float(scenario['ffh_min']))
+        if scenario['foundation_type'] is not None:
+            foundation_type = np.full(len(rows), scenario['foundation_type'])
+        if scenario['flood_proof'] is not None:
+            flood_proof[:] = float(scenario['flood_proof'])
+        return first_floor_height, foundation_type, flood_proof
+
+    def run(self, scenarios=None):
+        """Evaluate the baseline & all scenarios
+
+        The rows of the pass are the exposed (structure, depth grid) pairs of the
+        baseline and, for each scenario, of the structures it selects. Depth in
+        structure, SOID (foundation type: B with a basement, else N) & DDF keys
+        are built for all rows, damage is evaluated in one get_fused_losses call
+        and losses in US$ are rounded as in the UDF run (2 decimals).
+
+        Args:
+            scenarios (list, optional): Scenarios (see add_scenario). Defaults to None (the added scenarios).
+
+        Returns:
+            dict: losses, benefits & summary dataframes
+        """
+        udf = self.udf
+        scenarios = self.scenarios if scenarios is None else scenarios
+        if self.depth_matrix is None:
+            self.sample()
+        udf.run_report = self.run_report
+        input = self.input
+        depth_matrix = self.depth_matrix
+        grids = len(self.grid_names)
+        # Structures exposed in at least one depth grid (the others have no losses in any scenario)
+        exposed = np.flatnonzero((depth_matrix > 0).any(axis=1))
+        position = np.full(len(input), -1)
+        position[exposed] = np.arange(len(exposed))
+        names = ['Baseline'] + [scenario['name'] for scenario in scenarios]
+        with self.run_report.stage('scenarios', len(exposed), scenarios=len(scenarios)) as stage:
+            selections = [np.ones(len(input), dtype=bool)] + [self.get_selection(scenario) for scenario in scenarios]
+            # Rows of the pass: exposed (structure, grid) pairs of the structures of each scenario
+            rows = {'scenario': [], 'structure': [], 'grid': [], 'first_floor_height': [], 'foundation_type': [], 'flood_proof': []}
+            for index, (scenario, selected) in enumerate(zip([None] + list(scenarios), selections)):
+                structures = exposed[selected[exposed]]
+                first_floor_height, foundation_type, flood_proof = self.get_scenario_values(scenario, structures)
+                grid, structure = np.nonzero(depth_matrix[structures].T > 0)
+                rows['scenario'].append(np.full(len(structure), index))
+                rows['structure'].append(structures[structure])
+                rows['grid'].append(grid)
+                rows['first_floor_height'].append(first_floor_height[structure])
+                rows['foundation_type'].append(foundation_type[structure])
+                rows['flood_proof'].append(flood_proof[structure])
+            rows = {name: np.concatenate(values) for name, values in rows.items()}
+            row_scenario, row_structure, row_grid = rows['scenario'], rows['structure'], rows['grid']
+            stage['rows_out'] = len(row_scenario)
+        with self.run_report.stage('adjust', len(row_scenario)):
+            depth = np.round(depth_matrix[row_structure, row_grid], 6)
+            depth_in_struc = np.round(depth - rows['first_floor_height'], 6)
+            # SOID foundation suffix: B with a basement, else N
+            soids = pd.Index([stem + suffix for stem in self.stems for suffix in ('N', 'B')])
+            keys = {'SOID': pd.Categorical.from_codes(self.stem_codes[row_structure] * 2 + (rows['foundation_type'] == 4), soids)}
+            for field, values in self.keys.items():
+                keys[field] = values[row_structure]
+        with self.run_report.stage('losses', len(row_scenario)):
+            damage = udf.get_fused_losses(depth_in_struc, keys)
+            # Dry flood-proofing: no damage below the flood-proofing height
+            protected = depth_in_struc <= np.nan_to_num(rows['flood_proof'], nan=-np.inf)
+            for field in ('BldgDmgPct', 'ContDmgPct', 'InvDmgPct'):
+                damage[field] = np.where(protected, 0, np.nan_to_num(damage[field]))
+            costs = {field: input[field].values[row_structure].astype(float) for field in ('Cost', 'ContentCostUSD', 'InventoryCostUSD')}
+            damage['BldgLossUSD'] = np.nan_to_num(damage['BldgDmgPct'] / 100 * costs['Cost']).round(2)
+            damage['ContentLossUSD'] = np.nan_to_num(damage['ContDmgPct'] / 100 * costs['ContentCostUSD']).round(2)
+            damage['InventoryLossUSD'] = (damage['InvDmgPct'] / 100 * np.nan_to_num(costs['InventoryCostUSD']).round(2)).round(2)
+        with self.run_report.stage('benefits', len(row_scenario)):
+            # Scenarios x grids x exposed structures: baseline values, then the changed structures
+            shape = (len(names), grids, len(exposed))
+            fields = {}
+            for field in LOSS_FIELDS:
+                baseline = np.zeros(shape[1:])
+                in_baseline = row_scenario == 0
+                baseline[row_grid[in_baseline], position[row_structure[in_baseline]]] = damage[field][in_baseline]
+                fields[field] = np.broadcast_to(baseline, shape).copy()
+            depth_grid = np.round(depth_matrix[exposed].T, 6)
+            first_floor = np.broadcast_to(input['FirstFloorHt'].values[exposed].astype(float), shape).copy()
+            foundation = np.broadcast_to(input['FoundationType'].values[exposed], shape).copy()
+            changed = np.zeros((len(names), len(exposed)), dtype=bool)
+            for index, selected in enumerate(selections[1:], start=1):
+                changed[index] = selected[exposed]
+                first_floor_height_s, foundation_type_s, _ = self.get_scenario_values(scenarios[index - 1], exposed[changed[index]])
+                first_floor[index][:, changed[index]] = first_floor_height_s
+                foundation[index][:, changed[index]] = foundation_type_s
+            scenario_rows = row_scenario > 0
+            for field in LOSS_FIELDS:
+                fields[field][row_scenario[scenario_rows], row_grid[scenario_rows], position[row_structure[scenario_rows]]] = damage[field][scenario_rows]
+            depth_in_struc_all = np.where(depth_grid < 0, depth_grid, np.round(depth_grid - first_floor, 6))
+            total = fields['BldgLossUSD'] + fields['ContentLossUSD'] + fields['InventoryLossUSD']
+            avoided = (total[0] - total).round(2)
+            self.losses = self.get_losses(names, exposed, changed, depth_grid, depth_in_struc_all, first_floor, foundation, fields, total, avoided)
+            self.benefits = self.get_benefits(names, exposed, changed, total, avoided)
+            self.summary = self.get_summary(names, changed, depth_grid, total, avoided)
+        return {'losses': self.losses, 'benefits': self.benefits, 'summary': self.summary}
+
+    def get_losses(self, names, exposed, changed, depth_grid, depth_in_struc, first_floor, foundation, fields, total, avoided):
+        """Get the long losses table (scenario, depth grid & exposed structure rows)
+
+        Returns:
+            dataframe: Losses & avoided losses per scenario, depth grid & structure
+        """
+        scenarios, grids, structures = total.shape
+        input = self.input
+        df = pd.DataFrame({
+            'Scenario': pd.Categorical.from_codes(np.repeat(np.arange(scenarios), grids * structures), names),
+            'GridName': pd.Categorical.from_codes(np.tile(np.repeat(np.arange(grids), structures), scenarios), self.grid_names),
+            'FltyId': np.tile(input['FltyId'].values[exposed], scenarios * grids),
+            'Occ': np.tile(input['Occ'].values[exposed], scenarios * grids),
+            'Changed': np.repeat(changed, grids, axis=0).ravel().astype('int8'),
+            'FirstFloorHt': first_floor.ravel(),
+            'FoundationType': foundation.ravel(),
+            'Depth_Grid': np.tile(depth_grid.ravel(), scenarios),
+            'Depth_in_Struc': depth_in_struc.ravel(),
+            'flExp': np.tile((depth_grid > 0).ravel(), scenarios).astype('int8'),
+        })
+        for field in LOSS_FIELDS:
+            df[field] = fields[field].ravel()
+        df['TotalLossUSD'] = total.ravel().round(2)
+        df['AvoidedLossUSD'] = avoided.ravel()
+        return df
+
+    def get_benefits(self, names, exposed, changed, total, avoided):
+        """Get the per-structure avoided losses (benefit-cost analysis input)
+
+        With a return period per depth grid (UDF return_periods), the avoided
+        average annualized loss is also given (same weights as the AAL module).
+
+        Returns:
+            dataframe: FltyId, Occ, Cost & per scenario: Changed, AvoidedLossUSD per depth grid (& AAL, AvoidedAAL)
+        """
+        input = self.input
+        columns = {
+            'FltyId': input['FltyId'].values[exposed],
+            'Occ': input['Occ'].values[exposed],
+            'Cost': input['Cost'].values[exposed],
+        }
+        weights = self.get_aal_weights()
+        if weights is not None:
+            aal = np.tensordot(weights, total, axes=(0, 1))
+            columns['Baseline_AAL'] = aal[0].round(2)
+        for index, name in enumerate(names[1:], start=1):
+            columns[f'{name}_Changed'] = changed[index].astype('int8')
+            for grid, grid_name in enumerate(self.grid_names):
+                columns[f'{name}_AvoidedLossUSD_{grid_name}'] = avoided[index, grid]
+            if weights is not None:
+                columns[f'{name}_AAL'] = aal[index].round(2)
+                columns[f'{name}_AvoidedAAL'] = (aal[0] - aal[index]).round(2)
+        return pd.DataFrame(columns)
+
+    def get_summary(self, names, changed, depth_grid, total, avoided):
+        """Get the totals per scenario & depth grid (& AAL with return periods)
+
+        Returns:
+            dataframe: Scenario, GridName, structures changed & exposed, total & avoided losses
+        """
+        rows = []
+        weights = self.get_aal_weights()
+        for index, name in enumerate(names):
+            for grid, grid_name in enumerate(self.grid_names):
+                baseline = total[0, grid].sum()
+                rows.append({
+                    'Scenario': name,
+                    'GridName': grid_name,
+                    'Changed': int(changed[index].sum()),
+                    'Exposed': int((depth_grid[grid] > 0).sum()),
+                    'TotalLossUSD': round(float(total[index, grid].sum()), 2),
+                    'AvoidedLossUSD': round(float(avoided[index, grid].sum()), 2),
+                    'AvoidedLossPct': round(float(avoided[index, grid].sum() / baseline * 100), 2) if baseline > 0 else 0.0,
+                })
+            if weights is not None:
+                aal = float(weights @ total[index].sum(axis=1))
+                baseline = float(weights @ total[0].sum(axis=1))
+                rows.append({
+                    'Scenario': name,
+                    'GridName': 'AAL',
+                    'Changed': int(changed[index].sum()),
+                    'Exposed': int((depth_grid > 0).any(axis=0).sum()),
+                    'TotalLossUSD': round(aal, 2),
+                    'AvoidedLossUSD': round(baseline - aal, 2),
+                    'AvoidedLossPct': round((baseline - aal) / baseline * 100, 2) if baseline > 0 else 0.0,
+                })
+        return pd.DataFrame(rows)
+
+    def get_aal_weights(self):
+        """Get the AAL weight of each depth grid (return period frequency band, see AAL.get_aal)
+
+        Returns:
+            array: Weight per depth grid (None without a return period per depth grid)
+        """
+        return_periods = self.udf.return_periods
+        if not return_periods or len(return_periods) != len(self.grid_names) or len(return_periods) < 2:
+            return None
+        frequency = 1 / np.array([float(rp) for rp in return_periods])
+        previous = np.append(frequency[0], frequency[:-1])
+        following = np.append(frequency[1:], frequency[-1])
+        return (previous - following) / 2
+
+    def write(self, output_path='./UDF/output/whatif/'):
+        """Write the losses, benefits & summary to CSV files
+
+        Args:
+            output_path (str, optional): Output folder. Defaults to './UDF/output/whatif/'.
+
+        Returns:
+            list: CSV paths
+        """
+        if not os.path.exists(output_path):
+            os.makedirs(output_path)
+        udf_name = os.path.splitext(self.udf.get_udf_name())[0]
+        paths = []
+        for name, df in [('Losses', self.losses), ('Benefits', self.benefits), ('Summary', self.summary)]:
+            path = os.path.join(output_path, f'{udf_name}-WhatIf-{name}.csv')
+            writer.write_csv(df, path)
+            paths.append(path)
+        return paths
 
     def includeFloodWarningParameters(self):
         pass
@@ -18,4 +441,4 @@ class WhatIf():
         pass
 
     def coastalShoreProtectionAssessment(self):
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,133 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import os
+import pandas as pd
+import time
+import warnings
+
+# Disable pandas warnings (also in the writer process)
+warnings.filterwarnings('ignore')
+
+class AsyncWriter():
+    def __init__(self, max_pending=2, processes=False):
+        """Background writer for result files
+
+        Write calls run in order in one writer thread (or process), so the
+        pipeline computes the next depth grid while the previous results are
+        serialized. pandas holds the GIL while it formats a CSV, so a writer
+        thread competes with the pipeline; a writer process (opt-in) only costs
+        the pipeline the time to pickle the dataframe, but starts an interpreter
+        and needs an importable __main__ (spawn on Windows). submit blocks while
+        max_pending writes are not done (backpressure: at most max_pending
+        finished dataframes wait for the writer). The error of a failed write
+        is raised by the next submit, wait or close.
+
+        Args:
+            max_pending (int, optional): Maximum number of writes in progress or queued. Defaults to 2.
+            processes (bool, optional): Write in a process (else a thread). Defaults to False.
+        """
+        self.max_pending = max(int(max_pending), 1)
+        # The process is started by the first write
+        self.executor = ProcessPoolExecutor(max_workers=1) if processes else ThreadPoolExecutor(max_workers=1)
+        self.pending = deque()
+        # Return values of the done writes (e.g. stage records of write_stage)
+        self.results = []
+
+    def submit(self, function, *args, **kwargs):
+        """Queue a write call (blocks while max_pending writes are not done)
+
+        With a writer thread, the arguments must not be changed until the write
+        is done (see wait).
+
+        Args:
+            function (function): Module-level write function (a writer process imports it), e.g. write_stage
+            args & kwargs: Write function arguments
+        """
+        while len(self.pending) >= self.max_pending:
+            self.results.append(self.pending.popleft().result())
+        self.pending.append(self.executor.submit(function, *args, **kwargs))
+
+    def wait(self):
+        """Wait for the queued writes
+
+        Returns:
+            list: Return values of the writes done since the last wait
+        """
+        while self.pending:
+            self.results.append(self.pending.popleft().result())
+        results, self.results = self.results, []
+        return results
+
+    def close(self):
+        """Wait for the queued writes & stop the writer
+
+        Returns:
+            list: Return values of the writes done since the last wait
+        """
+        try:
+            return self.wait()
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def write_csv(df, path):
+    """Write results to CSV file
+
+    Args:
+        df (dataframe): Pandas dataframe with final results
+        path (str): Path of the CSV file
+    """
+    line_terminator='\n'
+    df.to_csv(path, index=False, line_terminator=line_terminator)
+
+
+def write_output(df, path, exposed_only=False):
+    """Write results to CSV file, optionally only exposed structures (& an exposure summary)
+
+    Args:
+        df (dataframe): Pandas dataframe with final results
+        path (str): Path of the CSV file
+        exposed_only (bool, optional): Write exposed structures only. Defaults to False.
+    """
+    if exposed_only:
+        exposed = df[df['flExp'] == 1]
+        summary = pd.DataFrame({
+            'GridName': df['GridName'].iloc[:1].values,
+            'Structures': [len(df)],
+            'Exposed': [len(exposed)],
+            'Dry': [len(df) - len(exposed)],
+        })
+        write_csv(summary, f'{os.path.splitext(path)[0]}-Exposure.csv')
+        df = exposed
+    write_csv(df, path)
+
+
+def write_stage(df, path, grid_name, exposed_only=False):
+    """Write results & time the write (run report stage record)
+
+    Args:
+        df (dataframe): Pandas dataframe with final results
+        path (str): Path of the CSV file
+        grid_name (str): Depth grid name
+        exposed_only (bool, optional): Write exposed structures only (see write_output). Defaults to False.
+
+    Returns:
+        dict: Write stage record
+    """
+    start_cpu = time.process_time()
+    start_wall = time.perf_counter()
+    write_output(df, path, exposed_only)
+    return {
+        'stage': 'write',
+        'parent': None,
+        'rows_in': len(df),
+        'rows_out': len(df),
+        'grid': grid_name,
+        'path': path,
+        'writer': True,
+        'wall_s': round(time.perf_counter() - start_wall, 6),
+        'cpu_s': round(time.process_time() - start_cpu, 6),
+        'peak_rss_delta_mb': None,
+        'peak_rss_mb': None,
+    }
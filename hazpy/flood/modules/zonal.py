@@ -0,0 +1,210 @@
+from rasterio.features import rasterize
+from rasterio.windows import Window
+
+import itertools
+import numpy as np
+import shapely
+
+
+class ZonalStatistics():
+    def __init__(self, sampler, chunk_size=2048):
+        """Zonal depth statistics over building footprint polygons
+
+        Footprints are burned into a label raster window by window (rasterize) and
+        the statistics of all footprints in the window are accumulated at once with
+        bincount, so there is no per-polygon masking. Windows are processed tile by
+        tile across the depth grid (mosaic) of the sampler.
+
+        Args:
+            sampler (DepthSampler): Depth sampler of the depth grid (single raster or mosaic)
+            chunk_size (int, optional): Window size in pixels. Defaults to 2048.
+        """
+        self.sampler = sampler
+        self.chunk_size = chunk_size
+
+    def calculate(self, geometries, bands=None, wet_threshold=None):
+        """Calculate depth max, mean & fraction wetted for each footprint
+
+        Pixels are assigned to a footprint when their centre is inside the polygon.
+        Pixels without data are excluded from max & mean and count as dry.
+
+        Args:
+            geometries (GeoSeries): Footprint polygons (None for structures without a footprint)
+            bands (list, optional): Band indexes. Defaults to None (band 1).
+            wet_threshold (array, optional): Value above which a pixel is wet, per footprint. Defaults to None (0).
+
+        Returns:
+            dict: max, mean, fraction_wetted & pixels arrays (footprints x bands; pixels is per footprint)
+        """
+        indexes = [1] if bands is None else [int(band) for band in bands]
+        n = len(geometries)
+        threshold = np.zeros(n + 1)
+        if wet_threshold is not None:
+            threshold[1:] = wet_threshold
+        pixels = np.zeros(n + 1)
+        valid_pixels = np.zeros((len(indexes), n + 1))
+        wet_pixels = np.zeros((len(indexes), n + 1))
+        total = np.zeros((len(indexes), n + 1))
+        maximum = np.full((len(indexes), n + 1), -np.inf)
+        geometries = geometries.to_crs(self.sampler.crs)
+        has_geometry = (geometries.notna() & ~geometries.is_empty).values
+        bounds = geometries.bounds.values
+        shapes = self.get_shapes(geometries.values, has_geometry)
+        layers = self.get_layers(geometries, has_geometry)
+        for tile_id, layer in itertools.product(range(len(self.sampler.tiles)), np.unique(layers[has_geometry])):
+            left, bottom, right, top = self.sampler.bounds[tile_id]
+            in_tile = np.flatnonzero(has_geometry & (layers == layer) & (bounds[:, 0] < right) & (bounds[:, 2] > left) & (bounds[:, 1] < top) & (bounds[:, 3] > bottom))
+            if len(in_tile) == 0:
+                continue
+            with self.sampler.open_tile(tile_id) as ds:
+                for window, footprints in self.get_windows(ds, in_tile, bounds):
+                    labels = rasterize(
+                        ((shapes[footprint], footprint + 1) for footprint in footprints),
+                        out_shape=(window.height, window.width),
+                        transform=ds.window_transform(window),
+                        fill=0,
+                        dtype='int32',
+                    ).ravel()
+                    burned = labels > 0
+                    if not burned.any():
+                        continue
+                    labels = labels[burned]
+                    pixels += np.bincount(labels, minlength=n + 1)
+                    data = ds.read(indexes, window=window, masked=True).astype('float64').filled(np.nan)
+                    data = data.reshape(len(indexes), -1)[:, burned]
+                    valid = np.isfinite(data) & (data > -1e38)
+                    values = np.where(valid, data, 0)
+                    order = np.argsort(labels, kind='stable')
+                    starts = np.flatnonzero(np.r_[True, np.diff(labels[order]) > 0])
+                    label_ids = labels[order][starts]
+                    for band in range(len(indexes)):
+                        valid_pixels[band] += np.bincount(labels, weights=valid[band], minlength=n + 1)
+                        wet_pixels[band] += np.bincount(labels, weights=valid[band] & (values[band] > threshold[labels]), minlength=n + 1)
+                        total[band] += np.bincount(labels, weights=values[band], minlength=n + 1)
+                        window_max = np.maximum.reduceat(np.where(valid[band], data[band], -np.inf)[order], starts)
+                        maximum[band, label_ids] = np.maximum(maximum[band, label_ids], window_max)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(valid_pixels > 0, total / valid_pixels, np.nan)
+            fraction_wetted = np.where(pixels > 0, wet_pixels / pixels, np.nan)
+        maximum[~np.isfinite(maximum)] = np.nan
+        return {
+            'max': maximum[:, 1:].T,
+            'mean': mean[:, 1:].T,
+            'fraction_wetted': fraction_wetted[:, 1:].T,
+            'pixels': pixels[1:],
+        }
+
+    def get_shapes(self, geometries, has_geometry):
+        """Get footprints as GeoJSON-like shapes for rasterize
+
+        Coordinates of all polygons are extracted in bulk, which is several times
+        faster than converting every shapely geometry for rasterize one by one.
+
+        Args:
+            geometries (array): Footprint polygons
+            has_geometry (array): Footprints with a (non empty) polygon
+
+        Returns:
+            list: Shape for each footprint (None without polygon)
+        """
+        shapes = [None] * len(geometries)
+        valid = np.flatnonzero(has_geometry)
+        if len(valid) == 0:
+            return shapes
+        try:
+            geometry_type, coords, offsets = shapely.to_ragged_array(geometries[valid])
+        except ValueError:
+            # Other geometry types: let rasterize convert them
+            for index in valid:
+                shapes[index] = geometries[index]
+            return shapes
+        if geometry_type == shapely.GeometryType.POLYGON:
+            ring_offsets, polygon_offsets = offsets
+            rings = np.split(coords, ring_offsets[1:-1])
+            for index, start, stop in zip(valid, polygon_offsets[:-1], polygon_offsets[1:]):
+                shapes[index] = {'type': 'Polygon', 'coordinates': rings[start:stop]}
+        elif geometry_type == shapely.GeometryType.MULTIPOLYGON:
+            ring_offsets, polygon_offsets, part_offsets = offsets
+            rings = np.split(coords, ring_offsets[1:-1])
+            polygons = [rings[start:stop] for start, stop in zip(polygon_offsets[:-1], polygon_offsets[1:])]
+            for index, start, stop in zip(valid, part_offsets[:-1], part_offsets[1:]):
+                shapes[index] = {'type': 'MultiPolygon', 'coordinates': polygons[start:stop]}
+        else:
+            for index in valid:
+                shapes[index] = geometries[index]
+        return shapes
+
+    def get_layers(self, geometries, has_geometry):
+        """Assign footprints to layers without overlapping footprints
+
+        A label raster holds one footprint per pixel, so footprints that overlap
+        (not just share a wall) are rasterized in separate layers. Footprints
+        rarely overlap, so nearly all of them are in the first layer.
+
+        Args:
+            geometries (GeoSeries): Footprint polygons
+            has_geometry (array): Footprints with a (non empty) polygon
+
+        Returns:
+            array: Layer of each footprint
+        """
+        layers = np.zeros(len(geometries), dtype='int64')
+        valid = np.flatnonzero(has_geometry)
+        shapes = geometries.values[valid]
+        left, right = geometries.iloc[valid].sindex.query(shapes, predicate='intersects')
+        overlapping = (left != right) & ~shapely.touches(shapes[left], shapes[right])
+        left, right = valid[left[overlapping]], valid[right[overlapping]]
+        neighbours = {}
+        for a, b in zip(left, right):
+            neighbours.setdefault(a, []).append(b)
+        for footprint in sorted(neighbours):
+            used = {layers[neighbour] for neighbour in neighbours[footprint] if neighbour < footprint}
+            layers[footprint] = min(set(range(len(used) + 1)) - used)
+        return layers
+
+    def get_windows(self, dataset, footprints, bounds):
+        """Group footprints by the dataset windows their bounds overlap
+
+        Args:
+            dataset (DatasetReader): Open rasterio dataset
+            footprints (array): Footprint indexes in the dataset
+            bounds (array): Footprint bounds (minx, miny, maxx, maxy)
+
+        Returns:
+            generator: (window, footprint indexes) for every window with footprints
+        """
+        block_height, block_width = dataset.block_shapes[0]
+        chunk_height = block_height * max(1, self.chunk_size // block_height)
+        chunk_width = block_width * max(1, self.chunk_size // block_width)
+        chunk_rows = -(-dataset.height // chunk_height)
+        chunk_cols = -(-dataset.width // chunk_width)
+        inverse = ~dataset.transform
+        # Pixel extent of the footprint bounds (any orientation of the transform)
+        cols, rows = np.array([inverse * (x, y) for x, y in ((0, 0), (1, 0), (0, 1))]).T
+        corners_x = bounds[footprints][:, [0, 2, 0, 2]]
+        corners_y = bounds[footprints][:, [1, 1, 3, 3]]
+        col = cols[0] + (cols[1] - cols[0]) * corners_x + (cols[2] - cols[0]) * corners_y
+        row = rows[0] + (rows[1] - rows[0]) * corners_x + (rows[2] - rows[0]) * corners_y
+        col_min = np.clip(np.floor(col.min(axis=1)) // chunk_width, 0, chunk_cols - 1).astype('int64')
+        col_max = np.clip(np.floor(col.max(axis=1)) // chunk_width, 0, chunk_cols - 1).astype('int64')
+        row_min = np.clip(np.floor(row.min(axis=1)) // chunk_height, 0, chunk_rows - 1).astype('int64')
+        row_max = np.clip(np.floor(row.max(axis=1)) // chunk_height, 0, chunk_rows - 1).astype('int64')
+        # Expand footprints spanning several windows into one entry per window
+        span_cols = col_max - col_min + 1
+        span = (row_max - row_min + 1) * span_cols
+        entry = np.repeat(np.arange(len(footprints)), span)
+        offset = np.arange(len(entry)) - np.repeat(np.cumsum(span) - span, span)
+        chunk = (row_min[entry] + offset // span_cols[entry]) * chunk_cols + col_min[entry] + offset % span_cols[entry]
+        order = np.argsort(chunk, kind='stable')
+        chunk = chunk[order]
+        entry = entry[order]
+        splits = np.flatnonzero(np.diff(chunk)) + 1
+        for chunk_entries in np.split(np.arange(len(chunk)), splits):
+            chunk_row, chunk_col = divmod(chunk[chunk_entries[0]], chunk_cols)
+            window = Window(
+                chunk_col * chunk_width,
+                chunk_row * chunk_height,
+                min(chunk_width, dataset.width - chunk_col * chunk_width),
+                min(chunk_height, dataset.height - chunk_row * chunk_height),
+            )
+            yield window, footprints[entry[chunk_entries]]
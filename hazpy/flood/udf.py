@@ -42,7 +42,44 @@ class UDF():
         argv = (spreadsheet, os.path.join(cwd, r"lookuptables"), outDir, [os.path.join(cwd, 'rasters', grid) for grid in raster], "False", fmap)        
         objUDF = UDF()
         return objUDF.flood_damage(*argv)
-    
+
+    @staticmethod
+    def index_lut(lut, key, first=True):
+        # Index the rows of a lookup table (list of Dictionary elements) by a key field.
+        # first = keep the first row of a repeated key (as a scan that stops at the first match), else the last one
+        index = {}
+        for lutrow in lut:
+            if first:
+                index.setdefault(lutrow[key], lutrow)
+            else:
+                index[lutrow[key]] = lutrow
+        return index
+
+    @staticmethod
+    def utm_from_latlon(latitudes, longitudes):
+        # Transform all the UDF coordinates to UTM easting, northing at once: one utm call per UTM zone and hemisphere,
+        # with the zone of each point as utm.latlon_to_zone_number. Missing coordinates are left as NaN.
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        eastings = np.full(len(latitudes), np.nan)
+        northings = np.full(len(latitudes), np.nan)
+        valid = ~np.isnan(latitudes) & ~np.isnan(longitudes)
+        lon = (longitudes[valid] % 360 + 540) % 360 - 180
+        lat = latitudes[valid]
+        zones = ((lon + 180) / 6).astype(int) + 1
+        zones = np.where((56 <= lat) & (lat < 64) & (3 <= lon) & (lon < 12), 32, zones)    # Special zone for Norway
+        svalbard = (72 <= lat) & (lat <= 84) & (lon >= 0) & (lon < 42)                      # Special zones for Svalbard
+        zones = np.where(svalbard, np.select([lon < 9, lon < 21, lon < 33], [31, 33, 35], 37), zones)
+        rows = np.flatnonzero(valid)
+        for zone in np.unique(zones):
+            for southern in [False, True]:
+                selection = (zones == zone) & ((lat < 0) == southern)
+                if selection.any():
+                    easting, northing = utm.from_latlon(lat[selection], longitudes[valid][selection], force_zone_number=int(zone))[:2]
+                    eastings[rows[selection]] = easting
+                    northings[rows[selection]] = northing
+        return eastings, northings
+
     @staticmethod
     def flood_damage(UDFOrig, LUT_Dir, ResultsDir, DepthGrids, QC_Warning, fmap):
         # UDFOrig = USer-supplied UDF input file. Full pathname required
@@ -203,16 +240,21 @@ class UDF():
                 debris_lut            = [row for row in csv.DictReader(open(Debris))]
                 rest_lut            = [row for row in csv.DictReader(open(Rest))]
 
-                # Build up lists to use for checking legitimate user-supplied DDF_ID values
-                bddf_lut_full_list = []
-                cddf_lut_full_list = []
-                iddf_lut_full_list = []
-                for x in bddf_lut_full:
-                    bddf_lut_full_list.append(x['BldgDmgFnID'])    # Yes, the capitalization is due to a quirk in the [dbo].[flBldgStructDmgFn].
-                for x in cddf_lut_full:
-                    cddf_lut_full_list.append(x['ContDmgFnId'])  # Yes, the case is inconsistent with Building column name. That's the way the Hazus database is.
-                for x in iddf_lut_full:
-                    iddf_lut_full_list.append(x['InvDmgFnId'])
+                # Index the look-up tables by their keys, so each record is a dictionary lookup instead of a scan of the table.
+                # The indexes also check for legitimate user-supplied DDF_ID values
+                bddf_lut_full_index = UDF.index_lut(bddf_lut_full, 'BldgDmgFnID')    # Yes, the capitalization is due to a quirk in the [dbo].[flBldgStructDmgFn].
+                cddf_lut_full_index = UDF.index_lut(cddf_lut_full, 'ContDmgFnId')  # Yes, the case is inconsistent with Building column name. That's the way the Hazus database is.
+                iddf_lut_full_index = UDF.index_lut(iddf_lut_full, 'InvDmgFnId')
+                bddf_lut_riverine_index = UDF.index_lut(bddf_lut_riverine, 'SpecificOccupId')
+                bddf_lut_coastalA_index = UDF.index_lut(bddf_lut_coastalA, 'SpecificOccupId')
+                bddf_lut_coastalV_index = UDF.index_lut(bddf_lut_coastalV, 'SpecificOccupId')
+                cddf_lut_riverine_index = UDF.index_lut(cddf_lut_riverine, 'SpecificOccupId')
+                cddf_lut_coastalA_index = UDF.index_lut(cddf_lut_coastalA, 'SpecificOccupId')
+                cddf_lut_coastalV_index = UDF.index_lut(cddf_lut_coastalV, 'SpecificOccupId')
+                iddf_lut_riverine_index = UDF.index_lut(iddf_lut_riverine, 'SpecificOccupId')
+                iecon_lut_index = UDF.index_lut(iecon_lut, 'Occupancy')
+                debris_lut_index = UDF.index_lut(debris_lut, 'DebrisID', first=False)
+                rest_lut_index = UDF.index_lut(rest_lut, 'RestFnID')
 
                 Content_x_0p5 = ['RES1', 'RES2', 'RES3A', 'RES3B', 'RES3C', 'RES3D', 'RES3E', 'RES3F', 'RES4', 'RES5', 'RES6', 'COM10']
                 Content_x_1p0 = ['COM1', 'COM2', 'COM3', 'COM4', 'COM5', 'COM8', 'COM9', 'IND6', 'AGR1', 'REL1', 'GOV1', 'EDU1']
@@ -255,6 +297,7 @@ class UDF():
 
                 # Process each depth grid specified by user
                 DGrids = DepthGrids#.split(';')   # Using the interactive window, it's not a list. Make it so.
+                utm_coordinates = None
                 for dgp in DGrids:
                     # Set up the Results file. Extract grid to points, add needed fields, adjust for First Floor Height.
                     # Depth_in_Struc:  The adjusted flood depth
@@ -310,11 +353,19 @@ class UDF():
                     data = band.ReadAsArray(0, 0, cols, rows)
                     IsUTM = True if osr.SpatialReference(wkt=raster.GetProjection()).GetAttrValue('UNIT') == 'metre' else False
                     print('Is it UTM? ', IsUTM)
+                    if IsUTM and utm_coordinates is None:
+                        # Transform the coordinates of all the records before the record loop (once for all the grids)
+                        def toFloat(value):
+                            try: return float(value.strip()) if value is not None and value.strip() != '' else 0.0
+                            except ValueError: return np.nan
+                        with open(UDFOrig, newline='') as csvfile:
+                            coordinates = [(toFloat(row[latitude]), toFloat(row[longitude])) for row in csv.DictReader(csvfile)]
+                        utm_coordinates = UDF.utm_from_latlon(*np.array(coordinates, dtype=float).reshape(-1, 2).T)
                             
                     with open(UDFOrig, newline='') as csvfile:
                         # reset counter
                         counter = 0
-                        writer = csv.DictWriter(file_out, delimiter=', ', lineterminator='\n', fieldnames = field_names)
+                        writer = csv.DictWriter(file_out, delimiter=',', lineterminator='\n', fieldnames = field_names)
                         file = csv.DictReader(csvfile)
                         for row in file:
                             counter += 1#CBH - counter for unmatched SoccIds
@@ -334,7 +385,10 @@ class UDF():
                                 else:                        
                                     X = float(getValue(longitude))
                                     Y = float(getValue(latitude))
-                                    X, Y = list(utm.from_latlon(Y, X)[:2]) if IsUTM else [X, Y]
+                                    if IsUTM:
+                                        X, Y = utm_coordinates[0][counter - 1], utm_coordinates[1][counter - 1]
+                                        if np.isnan(X) or np.isnan(Y):
+                                            X, Y = list(utm.from_latlon(float(getValue(latitude)), float(getValue(longitude)))[:2])
                                     col = int((X - xOrigin) / pixelWidth)
                                     roww = int((yOrigin - Y ) / pixelHeight)
                                     
@@ -442,16 +496,15 @@ class UDF():
                             xt = xt if xt is not None else -1   #  Clean up case where InvCost is supplied but is null
                             if OWDI and xt == -1:
                                 # Use default cost formula
-                                for lutrow in iecon_lut:
-                                    if lutrow['Occupancy'] == OC:
-                                        GrossSales = lutrow['AnnualSalesPerSqFt']
-                                        BusinessInv = lutrow['BusinessInvPctofSales']
-                                        # Table imports as string type (?!) so we must convert tabular data to a float type
-                                        # Yes, raw data is typically in Integer format, be flexible for future data which may be available in dollars.cents
-                                        # Must divide by 100, as BusinessInv in the input table is a Percent figure
-                                        # Area is in Square Feet
-                                        icost = float(GrossSales)*float(BusinessInv)*area/100
-                                        break
+                                lutrow = iecon_lut_index.get(OC)
+                                if lutrow is not None:
+                                    GrossSales = lutrow['AnnualSalesPerSqFt']
+                                    BusinessInv = lutrow['BusinessInvPctofSales']
+                                    # Table imports as string type (?!) so we must convert tabular data to a float type
+                                    # Yes, raw data is typically in Integer format, be flexible for future data which may be available in dollars.cents
+                                    # Must divide by 100, as BusinessInv in the input table is a Percent figure
+                                    # Area is in Square Feet
+                                    icost = float(GrossSales)*float(BusinessInv)*area/100
                             # If a user-supplied Inventory Cost is supplied, use it.
                             elif xt > -1 :
                                 icost = getValue(InvCost)
@@ -539,27 +592,23 @@ class UDF():
                                 BID = getValue(BldgDamageFnID) if ubddf else None
                                 
                                 #print(', OC=' + OC + ', QC_Warning=' + str(QC_Warning)+ ', BID=' + str(int(BID)))
-                                #print(bddf_lut_full_list)
+                                #print(bddf_lut_full_index)
                                 # If BID is specified by the user, and defined, then assume they know what is best, and use the full lookup table.
                                 # Tests are ok if you go left-to-right. Go from most-basic-test-to-more-advanced in the same line.  Can't flip the order here!
-                                if BID is not None and BID != '' and str(int(BID)) in bddf_lut_full_list:
-                                    # Search the  full lookup table to find the DDF_ID that matches the BID
-                                    # 'gotcha' checks for no hits - set a check bit - that should not happen, given the membership test with bddf_lut_full_list.
-                                    # For more efficiency, break out of the loop if it is found
+                                if BID is not None and BID != '' and str(int(BID)) in bddf_lut_full_index:
+                                    # Look up the DDF_ID that matches the BID in the full lookup table index
+                                    # 'gotcha' checks for no hits - set a check bit - that should not happen, given the membership test with the index.
                                     gotcha = 0
                                     #print("inside")
-                                    for lutrow in bddf_lut_full:
-                                        if lutrow['BldgDmgFnID'] == str(int(BID)):    # This is a string match. For completeness and trailing spaces, may want to make it an integer?
-                                            gotcha += 1                                
-                                            ddf1 = lutrow
-                                            # Notify user if the OccupancyClass associated with the user-specified DDFID is inconsistent with the user-supplied OccupancyClass
-                                            # This is not harmful; DOGAMI script has chosen to just process it (Hazus silently reverts back to the default!)
-                                            # Simple notification
-                                            OccClsCheck = ddf1['Occupancy']
-                                            #print('Occupancy =' + OccClsCheck + ', OC=' + OC + ', QC_Warning=' + str(QC_Warning))
-                                            if OccClsCheck != OC and QC_Warning:
-                                                print("FYI: User-supplied Building DDFID " + BID + " Occupancy Class is inconsistent with UDF Occupancy Class " + OC + " versus "+OccClsCheck+ "  " + userDefinedFltyId)
-                                            break
+                                    ddf1 = bddf_lut_full_index[str(int(BID))]
+                                    gotcha += 1
+                                    # Notify user if the OccupancyClass associated with the user-specified DDFID is inconsistent with the user-supplied OccupancyClass
+                                    # This is not harmful; DOGAMI script has chosen to just process it (Hazus silently reverts back to the default!)
+                                    # Simple notification
+                                    OccClsCheck = ddf1['Occupancy']
+                                    #print('Occupancy =' + OccClsCheck + ', OC=' + OC + ', QC_Warning=' + str(QC_Warning))
+                                    if OccClsCheck != OC and QC_Warning:
+                                        print("FYI: User-supplied Building DDFID " + BID + " Occupancy Class is inconsistent with UDF Occupancy Class " + OC + " versus "+OccClsCheck+ "  " + userDefinedFltyId)
                                             
                                     #UKS RTC Task 35520 - Custom DDFs implementation 04/08/2020
                                     if gotcha != 0:
@@ -579,9 +628,8 @@ class UDF():
                                         print("User specified a non-official Building DDFID: " + BID + "    UID: " + userDefinedFltyId )
                                         print("   Reverting to default Building DDF for Occupancy Class " + OC)
 
-                                    # Go through the lookup table, one row at a time to find the Structure of interest
+                                    # Look up the Structure of interest in the lookup table index
                                     # 'gotcha' checks for no hits - set a check bit
-                                    # Also, for more efficiency, break out of the loop if it is found
                                     gotcha = 0
 
                                     # Change DDF table only if Coastal Zone is defined (CoastalZoneSuppled) AND a legitimate Coastal Zone Code (AE, V, VE)
@@ -590,25 +638,24 @@ class UDF():
                                     
                                     #UKS 04/09/2020, RTC Task 35520 - Custom DDFs implementation
                                     #Need to assign default only if blank Building DDF provided by the user                       
-                                    blut = bddf_lut_riverine
+                                    blut = bddf_lut_riverine_index
                                     if CoastalZoneSupplied and OC[:3] =='RES':
                                         if CoastalZoneCode == 'CAE' :
-                                            blut = bddf_lut_coastalA
+                                            blut = bddf_lut_coastalA_index
                                         if CoastalZoneCode == 'VE' or CoastalZoneCode == 'V':
-                                            blut = bddf_lut_coastalV
+                                            blut = bddf_lut_coastalV_index
 
                                     # Now do the lookup in the Default DDF
-                                    for lutrow in blut:
-                                        if lutrow['SpecificOccupId'] == SpecificOccupId:
-                                            gotcha += 1
-                                            ddf1 = lutrow
-                                            #UKS 04/09/2020, RTC Task 35520 - Custom DDFs implementation
-                                            # Not overwriting User's BDDF
-                                            if BID is None or BID == '':
-                                                ddf_id = lutrow['DDF_ID']   # For the Record. Will go in the Results file.
-                                            else:
-                                                ddf_id = int(BID)
-                                            break # Quit once you found it.
+                                    lutrow = blut.get(SpecificOccupId)
+                                    if lutrow is not None:
+                                        gotcha += 1
+                                        ddf1 = lutrow
+                                        #UKS 04/09/2020, RTC Task 35520 - Custom DDFs implementation
+                                        # Not overwriting User's BDDF
+                                        if BID is None or BID == '':
+                                            ddf_id = lutrow['DDF_ID']   # For the Record. Will go in the Results file.
+                                        else:
+                                            ddf_id = int(BID)
 
                                     if gotcha == 0:
                                         # This should not occur
@@ -634,7 +681,7 @@ class UDF():
                                     damage = 0
                                         
                                 if gotcha == 0:
-                                    # This should not occur, given the memebership test with bddf_lut_full_list. Just in case:
+                                    # This should not occur, given the memebership test with bddf_lut_full_index. Just in case:
                                     print("Problem: nothing matches the SpecificOccupId of " + SpecificOccupId + "     Check entry UDFID " + str(userDefinedFltyId) + " with " + OC )
                                     SpecificOccupId = "XXXX"
                                     
@@ -658,22 +705,18 @@ class UDF():
 
                                 # If BID is specified by the user, then assume they know what is best, and use the full lookup table.
                                 # Tests are ok if you go left-to-right. Go from most-basic-test-to-more-advanced in the same line.  Can't flip the order here!                   
-                                if BID is not None and BID != '' and str(int(BID)) in cddf_lut_full_list:
-                                    # Search the  full lookup table to find the DDF_ID that matches the BID
-                                    # 'gotcha' checks for no hits - set a check bit - that should not happen, given the membership test with bddf_lut_full_list.
-                                    # For more efficiency, break out of the loop if it is found
+                                if BID is not None and BID != '' and str(int(BID)) in cddf_lut_full_index:
+                                    # Look up the DDF_ID that matches the BID in the full lookup table index
+                                    # 'gotcha' checks for no hits - set a check bit - that should not happen, given the membership test with the index.
                                     gotcha = 0
-                                    for lutrow in cddf_lut_full:
-                                        if lutrow['ContDmgFnId'] == str(int(BID)):    # This is a string match. For completeness and trailing spaces, may want to make it an integer?
-                                            gotcha += 1
-                                            ddf1 = lutrow
-                                            # Notify user if the OccupancyClass associated with the user-specified DDFID is inconsistent with the user-supplied OccupancyClass
-                                            # This is not harmful; DOGAMI script has chosen to just process it (Hazus silently reverts back to the default!)
-                                            # Simple notification
-                                            OccClsCheck = ddf1['Occupancy']
-                                            if OccClsCheck != OC and QC_Warning:
-                                                print("FYI: User-supplied Content  DDFID " + BID + " Occupancy Class is inconsistent with UDF Occupancy Class " + OC + " versus "+OccClsCheck+ "  " + userDefinedFltyId)
-                                            break
+                                    ddf1 = cddf_lut_full_index[str(int(BID))]
+                                    gotcha += 1
+                                    # Notify user if the OccupancyClass associated with the user-specified DDFID is inconsistent with the user-supplied OccupancyClass
+                                    # This is not harmful; DOGAMI script has chosen to just process it (Hazus silently reverts back to the default!)
+                                    # Simple notification
+                                    OccClsCheck = ddf1['Occupancy']
+                                    if OccClsCheck != OC and QC_Warning:
+                                        print("FYI: User-supplied Content  DDFID " + BID + " Occupancy Class is inconsistent with UDF Occupancy Class " + OC + " versus "+OccClsCheck+ "  " + userDefinedFltyId)
                                     #UKS 04/08/2020, RTC Task 35520 - Custom DDFs implementation
                                     if gotcha !=0:
                                         d_lower = float(ddf1[l_index])
@@ -690,9 +733,8 @@ class UDF():
                                     if QC_Warning and BID is not None and BID != '' and int(BID)>0:
                                         print( "FYI: User specified a non-official Content DDFID: " + BID + "    UID: " + userDefinedFltyId + "   Reverting to default Content DDF for Occupancy Class " + OC)
 
-                                    # Go through the lookup table, one row at a time to find the Structure of interest
+                                    # Look up the Structure of interest in the lookup table index
                                     # 'gotcha' checks for no hits - set a check bit
-                                    # Also, for more efficiency, break out of the loop if it is found
                                     gotcha = 0
 
                                     # Change DDF table if Coastal; otherwise use default ddf.
@@ -701,24 +743,23 @@ class UDF():
                                     
                                     #UKS 04/09/2020, RTC Task 35520 - Custom DDFs implementation
                                     # Need to assign default only if blank Content DDF provided by the user
-                                    clut = cddf_lut_riverine
+                                    clut = cddf_lut_riverine_index
                                     if CoastalZoneSupplied and OC[:3] =='RES':
                                         if CoastalZoneCode == 'CAE' :
-                                            clut = cddf_lut_coastalA
+                                            clut = cddf_lut_coastalA_index
                                         if CoastalZoneCode == 'VE' or CoastalZoneCode == 'V':
-                                            clut = cddf_lut_coastalV
-
-                                    for lutrow in clut:
-                                        if lutrow['SpecificOccupId'] == SpecificOccupId:
-                                            gotcha += 1
-                                            ddf1 = lutrow
-                                            #UKS 04/09/2020, RTC Task 35520 - Custom DDFs implementation
-                                            #Not overwriting User's CDDF
-                                            if BID is None or BID == '':
-                                                ddf_id = lutrow['DDF_ID']   # For the Record. Will go in the Results file.
-                                            else:
-                                                ddf_id = int(BID)
-                                            break # Quit once you found it.
+                                            clut = cddf_lut_coastalV_index
+
+                                    lutrow = clut.get(SpecificOccupId)
+                                    if lutrow is not None:
+                                        gotcha += 1
+                                        ddf1 = lutrow
+                                        #UKS 04/09/2020, RTC Task 35520 - Custom DDFs implementation
+                                        #Not overwriting User's CDDF
+                                        if BID is None or BID == '':
+                                            ddf_id = lutrow['DDF_ID']   # For the Record. Will go in the Results file.
+                                        else:
+                                            ddf_id = int(BID)
                                     if gotcha == 0:
                                         # This should not occur
                                         print("something wrong for Content lookup, no match for Specific Occupancy ID :" + SpecificOccupId + "   Counter:" + str(counter))
@@ -760,22 +801,18 @@ class UDF():
                                 # If BID is specified by the user, then assume they know what is best, and use the full lookup table.
                                 # Tests are ok if you go left-to-right. Go from most-basic-test-to-more-advanced in the same line.  Can't flip the order here!
                                                 
-                                if BID is not None and BID != '' and str(int(BID)) in iddf_lut_full_list:
-                                    # Search the  full lookup table to find the DDF_ID that matches the BID
-                                    # 'gotcha' checks for no hits - set a check bit - that should not happen, given the membership test with bddf_lut_full_list.
-                                    # For more efficiency, break out of the loop if it is found
+                                if BID is not None and BID != '' and str(int(BID)) in iddf_lut_full_index:
+                                    # Look up the DDF_ID that matches the BID in the full lookup table index
+                                    # 'gotcha' checks for no hits - set a check bit - that should not happen, given the membership test with the index.
                                     gotcha = 0
-                                    for lutrow in iddf_lut_full:
-                                        if lutrow['InvDmgFnId'] == str(int(BID)):    # This is a string match. For completeness and trailing spaces, may want to make it an integer?
-                                            gotcha += 1
-                                            ddf1 = lutrow
-                                            # Notify user if the OccupancyClass associated with the user-specified DDFID is inconsistent with the user-supplied OccupancyClass
-                                            # This is not harmful; DOGAMI script has chosen to just process it (Hazus silently reverts back to the default!)
-                                            # Simple notification
-                                            OccClsCheck = ddf1['Occupancy']
-                                            if OccClsCheck != OC and QC_Warning:
-                                                print("FYI: User-supplied Inventory DDFID " + BID + " Occupancy Class is inconsistent with UDF Occupancy Class " + OC + " versus "+OccClsCheck+ "  " + userDefinedFltyId)
-                                            break
+                                    ddf1 = iddf_lut_full_index[str(int(BID))]
+                                    gotcha += 1
+                                    # Notify user if the OccupancyClass associated with the user-specified DDFID is inconsistent with the user-supplied OccupancyClass
+                                    # This is not harmful; DOGAMI script has chosen to just process it (Hazus silently reverts back to the default!)
+                                    # Simple notification
+                                    OccClsCheck = ddf1['Occupancy']
+                                    if OccClsCheck != OC and QC_Warning:
+                                        print("FYI: User-supplied Inventory DDFID " + BID + " Occupancy Class is inconsistent with UDF Occupancy Class " + OC + " versus "+OccClsCheck+ "  " + userDefinedFltyId)
                                     #UKS 04/0982020, RTC Task 35520 - Custom DDFs implementation
                                     if gotcha !=0:
                                         d_lower = float(ddf1[l_index])
@@ -791,26 +828,24 @@ class UDF():
                                     if QC_Warning and BID is not None and BID != '' and int(BID)>0:
                                         print( "User specified a non-official Inventory DDFID: " + BID + "    UID: " + userDefinedFltyId + "   Reverting to default Inventory DDF for Occupancy Class " + OC)
 
-                                    # Go through the lookup table, one row at a time to find the Structure of interest
+                                    # Look up the Structure of interest in the lookup table index
                                     # 'gotcha' checks for no hits - set a check bit
-                                    # Also, for more efficiency, break out of the loop if it is found
                                     gotcha = 0
 
                                     # Inventory: There is no Coastal Flooding default table to use
-                                    ilut = iddf_lut_riverine
+                                    ilut = iddf_lut_riverine_index
 
                                     # Default Inventory DDF defined only for a subset of OccupancyClass types                                               
                                     if OC in Inventory_List:
-                                        for lutrow in ilut:
-                                            if lutrow['SpecificOccupId'] == SpecificOccupId:
-                                                gotcha += 1
-                                                ddf1 = lutrow
-                                                #UKS 04/09/2020- Not overwriting User's IDDF
-                                                if BID is None or BID == '':
-                                                    ddf_id = lutrow['DDF_ID']   # For the Record. Will go in the Results file.
-                                                else:
-                                                    ddf_id = int(BID)
-                                                break # Quit once you found it.
+                                        lutrow = ilut.get(SpecificOccupId)
+                                        if lutrow is not None:
+                                            gotcha += 1
+                                            ddf1 = lutrow
+                                            #UKS 04/09/2020- Not overwriting User's IDDF
+                                            if BID is None or BID == '':
+                                                ddf_id = lutrow['DDF_ID']   # For the Record. Will go in the Results file.
+                                            else:
+                                                ddf_id = int(BID)
                                                 
                                         #UKS 04/10/2020 - commented to clean up
                                         #if gotcha == 0:
@@ -886,10 +921,10 @@ class UDF():
                                         dsuf = ''
                                         
                                     debriskey = OC + bsm + fnd + dsuf
-                                    for lutrow in debris_lut:
-                                        if lutrow['DebrisID'] == debriskey:    # This is a string match. For completeness and trailing spaces, may want to make it an integer?
-                                            gotcha += 1
-                                            ddf1 = lutrow
+                                    lutrow = debris_lut_index.get(debriskey)    # This is a string match. For completeness and trailing spaces, may want to make it an integer?
+                                    if lutrow is not None:
+                                        gotcha += 1
+                                        ddf1 = lutrow
                                     
                                     dfin_rate    =  float(ddf1['Finishes'])
                                     dstruc_rate =  float(ddf1['Structure'])
@@ -921,10 +956,9 @@ class UDF():
                                     dsuf = '0' if depth <0 else '1' if depth < 1 \
                                         else '4' if depth <4 else '8' if depth < 8 else '12' if depth < 12 else '24'
                                     RsFnkey = OC + dsuf
-                                    for lutrow in rest_lut:
-                                        if lutrow['RestFnID'] == RsFnkey:    # This is a string match. For completeness and trailing spaces, may want to make it an integer?
-                                            ddf1 = lutrow
-                                            break
+                                    lutrow = rest_lut_index.get(RsFnkey)    # This is a string match. For completeness and trailing spaces, may want to make it an integer?
+                                    if lutrow is not None:
+                                        ddf1 = lutrow
                                     restdays_min =  int(ddf1['Min_Restor_Days']) # This is the maximum days out (flRsFnGBS has a min and a max)
                                     restdays_max =  int(ddf1['Max_Restor_Days']) # This is the maximum days out (flRsFnGBS has a min and a max)
                                 else:
@@ -1,21 +1,2 @@
-class WhatIf():
-    def __init__(self):
-        pass
-
-    def includeFloodWarningParameters(self):
-        pass
-
-    def riverineLeveeAssessment(self):
-        pass
-
-    def riverineFlowRegulation(self):
-        pass
-
-    def riverineFloodVelocityAssessment(self):
-        pass
-
-    def coastalLongTermErosionAssessment(self):
-        pass
-
-    def coastalShoreProtectionAssessment(self):
-        pass
\ No newline at end of file
+# The what-if engine needs the modules UDF (see modules/what_if.py)
+from .modules.what_if import WhatIf
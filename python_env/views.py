@@ -2,7 +2,7 @@ print('Starting FAST...')
 
 import os
 from os import listdir
-from os.path import isfile, join
+from os.path import isdir, isfile, join
 from pathlib import Path
 import json
 import tkinter as tk
@@ -12,7 +12,6 @@ from tkinter import messagebox as messagebox
 from threading import Thread
 import ctypes
 from .udf_field_mapping import map_udf_fields
-from hazpy.flood import UDF
 
 class GUI(tk.Frame):
     """ Create the controller frame """
@@ -67,9 +66,30 @@ class GUI(tk.Frame):
              dir = os.path.dirname(dir)
         cwd = os.path.join(dir,'rasters') # Default raster directory
         rasters = [f for f in listdir(cwd) if isfile(join(cwd, f)) and f.endswith(('.tif','.tiff','.nc'))] 
+        # Folders of .tif tiles are listed as a single (mosaic) depth grid
+        rasters += [f for f in listdir(cwd) if isdir(join(cwd, f)) and any(t.endswith(('.tif','.tiff')) for t in listdir(join(cwd, f)))]
+        # Multi-band / NetCDF return period stacks: list each band (or variable) as 'raster | band'
+        rasters += [f'{f} | {band}' for f in list(rasters) if isfile(join(cwd, f)) for band in self._load_raster_bands(join(cwd, f))]
         rasters = Tcl().call('lsort', '-dict', rasters)
         return rasters
 
+    def _load_raster_bands(self, raster):
+        ''' List the bands of a multi-band raster, or the variables (and time slices) of a NetCDF file '''
+        import rasterio as rio # Imported when first needed, not before the window is shown
+        bands = []
+        try:
+            with rio.open(raster) as src:
+                if src.subdatasets:
+                    for subdataset in src.subdatasets:
+                        variable = subdataset.split(':')[-1]
+                        with rio.open(subdataset) as sub:
+                            bands += [variable] if sub.count == 1 else [f'{variable}:{band}' for band in range(1, sub.count + 1)]
+                elif src.count > 1:
+                    bands = [str(band) for band in range(1, src.count + 1)]
+        except Exception as e:
+            print(e)
+        return bands
+
 class select_flood_type_frame(ttk.Frame):
     ''' Riverine, Coastal A, Coastal V '''
     def __init__(self, controller):
@@ -498,6 +518,7 @@ class bottom_buttons_frame(ttk.Frame):
         print('--- CHECKING INPUT... ---')
         if self._check_selections() == True:
             print('--- RUNNING ---')
+            from hazpy.flood import UDF # Imported on the first run (pandas, geopandas, rasterio), not at launch
             flood_type = self.controller.selected_flood_type.get()
             flood_type_converted = self.controller.selected_flood_type_converted.get()
             analysis_type = self.controller.selected_analysis_type.get()
@@ -517,8 +538,9 @@ class bottom_buttons_frame(ttk.Frame):
                 lookup_tables = os.path.join(os.getcwd(), 'lookuptables')
                 results_dir = os.path.dirname(udf)
                 fmap = udf_args[:-1]
+                rasters, bands = self._split_raster_bands(rasters)
                 rasters = [os.path.join(os.getcwd(), 'rasters', raster) for raster in rasters]
-                runUDF = UDF(udf, lookup_tables, results_dir, rasters, 'False', fmap, flood_type)
+                runUDF = UDF(udf, lookup_tables, results_dir, rasters, 'False', fmap, flood_type, bands=bands)
                 runUDF.get_flood_damage()
             if self.controller.selected_analysis_type.get() == 'Average Annualized Loss (AAL)':
                 rasters = [raster for raster in self.controller.selected_rasters_aal.values()]
@@ -531,8 +553,9 @@ class bottom_buttons_frame(ttk.Frame):
                 lookup_tables = os.path.join(os.getcwd(), 'lookuptables')
                 results_dir = os.path.dirname(udf)
                 fmap = udf_args[:-1]
+                rasters, bands = self._split_raster_bands(rasters)
                 rasters = [os.path.join(os.getcwd(), 'rasters', raster) for raster in rasters]
-                runUDF = UDF(udf, lookup_tables, results_dir, rasters, 'False', fmap, flood_type, analysis_type, return_periods)
+                runUDF = UDF(udf, lookup_tables, results_dir, rasters, 'False', fmap, flood_type, analysis_type, return_periods, bands=bands)
                 runUDF.get_flood_damage()
             if self.controller.selected_analysis_type.get() == 'Average Annualized Loss (AAL) with PELV':
                 rasters = []
@@ -551,6 +574,16 @@ class bottom_buttons_frame(ttk.Frame):
                 runUDF = UDF(udf, lookup_tables, results_dir, rasters, 'False', fmap, flood_type, analysis_type)
                 runUDF.get_flood_damage()
 
+    def _split_raster_bands(self, rasters):
+        ''' Split 'raster | band' selections into raster file names and bands (None for single band rasters) '''
+        files = []
+        bands = []
+        for raster in rasters:
+            file, _, band = raster.partition(' | ')
+            files.append(file)
+            bands.append(band or None)
+        return files, bands
+
     def _check_selections(self):
         ''' Check if all selections are made, if not prompt user
             Return true unless missing a selection 
@@ -7,25 +7,39 @@ import os
 import requests
 import socket
 import sys
+import threading
+import time
 
 
 class Manage:
-    def __init__(self):
+    def __init__(self, config_file=None, cache_file=None):
+        """Tool launcher: update checks, conda environment & application start
+
+        Args:
+            config_file (str, optional): Config JSON path (e.g. release URLs pointing to a local server). Defaults to None (./src/config.json).
+            cache_file (str, optional): Launcher cache JSON path. Defaults to None (manage_cache.json next to the config).
+        """
 
         # Set script path
-        parent_path = os.path.dirname(os.path.dirname(__file__))
+        parent_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         os.chdir(parent_path)
 
-        try:
-            with open('./src/config.json') as configFile:
+        if config_file is not None:
+            with open(config_file) as configFile:
                 self.config = json.load(configFile)
                 self.tool_version_local = './src/__init__.py'
                 self.env_yaml = './src/environment.yaml'
-        except:
-            with open('./config.json') as configFile:
-                self.config = json.load(configFile)
-                self.tool_version_local = './__init__.py'
-                self.env_yaml = './environment.yaml'
+        else:
+            try:
+                with open('./src/config.json') as configFile:
+                    self.config = json.load(configFile)
+                    self.tool_version_local = './src/__init__.py'
+                    self.env_yaml = './src/environment.yaml'
+            except:
+                with open('./config.json') as configFile:
+                    self.config = json.load(configFile)
+                    self.tool_version_local = './__init__.py'
+                    self.env_yaml = './environment.yaml'
 
         # environmental variables
         self.proxy = self.config['proxies']['fema']
@@ -37,37 +51,108 @@ class Manage:
         self.virtual_environment = self.config[self.release]['virtualEnvironment']
         # in seconds
         self.http_timeout = self.config[self.release]['httpTimeout']
+        # Check the release URL at most once per interval, in the background within the budget (seconds)
+        self.update_check_interval = self.config[self.release].get('updateCheckInterval', 86400)
+        self.update_check_budget = self.config[self.release].get('updateCheckBudget', 3)
+
+        # Launcher cache: conda commands, verified environment & last update check
+        if cache_file is None:
+            cache_file = os.path.join(os.path.dirname(self.tool_version_local), 'manage_cache.json')
+        self.cache_file = cache_file
+        self.cache_lock = threading.Lock()
+        self.cache = self.readCache()
+        self.update_thread = None
 
         self.conda_activate, self.conda_deactivate = self.getCondaActivateDeactivate()
         # init message dialog box
-        self.messageBox = ctypes.windll.user32.MessageBoxW
+        if hasattr(ctypes, 'windll'):
+            self.messageBox = ctypes.windll.user32.MessageBoxW
+        else:
+            self.messageBox = self.printMessage
+
+    def readCache(self):
+        """Read the launcher cache
+
+        Returns:
+            dict: Cached values (empty if the cache is missing or unreadable)
+        """
+        try:
+            with open(self.cache_file) as cacheFile:
+                cache = json.load(cacheFile)
+            return cache if isinstance(cache, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def writeCache(self, **values):
+        """Update the launcher cache (a value of None removes the key)
+
+        Args:
+            **values: Cache keys & values
+        """
+        with self.cache_lock:
+            for key, value in values.items():
+                if value is None:
+                    self.cache.pop(key, None)
+                else:
+                    self.cache[key] = value
+            try:
+                # Write then rename so a concurrent launch never reads a partial file
+                temp_file = self.cache_file + '.tmp'
+                with open(temp_file, 'w') as cacheFile:
+                    json.dump(self.cache, cacheFile, indent=2)
+                os.replace(temp_file, self.cache_file)
+            except OSError as e:
+                print(e)
+
+    def printMessage(self, hwnd, text, caption, style):
+        """Message box stand-in where the Windows API is not available
+
+        Returns:
+            int: 7 (the "No" button), so nothing is installed without a prompt
+        """
+        print('{c}: {t}'.format(c=caption, t=text))
+        return 7
 
     def getCondaActivateDeactivate(self):
         """Determine how to call conda and if it's in the system path
 
+        The result is cached until the conda entries of the PATH change.
+
         Returns:
-            [type]: [description]
+            tuple: conda activate & deactivate commands (None, None if conda was not found)
         """
+        condaPaths = self.getCondaPaths()
+        cached = self.cache.get('conda', {})
+        if cached.get('paths') == condaPaths and cached.get('activate'):
+            return cached['activate'], cached['deactivate']
+        activate, deactivate = None, None
         if call('activate', shell=True) == 0:
-            return 'activate', 'deactivate'
-        if call('conda activate', shell=True) == 0:
-            return 'conda activate', 'conda deactivate'
-        if call('call conda activate', shell=True) == 0:
-            return 'call conda activate', 'call conda deactivate'
-        return None, None
+            activate, deactivate = 'activate', 'deactivate'
+        elif call('conda activate', shell=True) == 0:
+            activate, deactivate = 'conda activate', 'conda deactivate'
+        elif call('call conda activate', shell=True) == 0:
+            activate, deactivate = 'call conda activate', 'call conda deactivate'
+        # Only a successful probe is cached: conda may be installed before the next launch
+        if activate is not None:
+            self.writeCache(conda={'paths': condaPaths, 'activate': activate, 'deactivate': deactivate})
+        return activate, deactivate
+
+    def getCondaPaths(self):
+        """Get the conda entries of the system path
+
+        Returns:
+            list: PATH entries containing conda or miniforge
+        """
+        path = os.environ.get('PATH', '')
+        return [x for x in path.split(';') if 'conda' in x or 'miniforge' in x]
 
     def isCondaInPath(self):
         """Check if conda is in path
 
         Returns:
-            [type]: [description]
+            bool: True if a conda or miniforge folder is in the system path
         """
-        path = os.environ['PATH']
-        condaPaths = [x for x in path.split(';') if 'conda' in x or 'miniforge' in x]
-        if len(condaPaths) > 0:
-            return True
-        else:
-            return False
+        return len(self.getCondaPaths()) > 0
 
     # TODO: See if this is still needed - BC
     def createProxyEnv(self):
@@ -122,59 +207,146 @@ class Manage:
                 0x1000 | 0x4,
             )
 
-    def checkForUpdates(self):
-        print('Checking for tool updates')
+    def getInstalledVersion(self):
+        """Get the installed tool version
+
+        Returns:
+            str: Version in the local src/__init__.py
+        """
+        with open(self.tool_version_local) as init:
+            return self.parseVersionFromInit(init.read())
+
+    def getNewestVersion(self, budget=None):
+        """Get the newest tool version from the release URL
+
+        The URL is requested directly first, then through the FEMA proxy if it
+        is the only way out.
+
+        Args:
+            budget (float, optional): Time limit in seconds for the whole check. Defaults to None (httpTimeout per request).
+
+        Returns:
+            str: Newest version (None if the release URL could not be reached)
+        """
+        deadline = None if budget is None else time.monotonic() + budget
+
+        def remaining():
+            if deadline is None:
+                return self.http_timeout
+            return deadline - time.monotonic()
+
         try:
-            with open(self.tool_version_local) as init:
-                text = init.readlines()
-                textBlob = ''.join(text)
-                installedVersion = self.parseVersionFromInit(textBlob)
+            req = requests.get(self.tool_version_url, timeout=remaining())
+        except requests.RequestException:
+            # Both proxy probes have to fit in the budget
+            if remaining() <= 0 or self.handleProxy(remaining() / 2) is not True or remaining() <= 0:
+                return None
             try:
-                self.handleProxy()
-                req = requests.get(self.tool_version_url, timeout=self.http_timeout)
-            except:
+                req = requests.get(self.tool_version_url, timeout=remaining())
+            except requests.RequestException:
                 self.removeProxy()
-                req = requests.get(self.tool_version_url, timeout=self.http_timeout)
-            status = req.status_code
-
-            if status == 200:
-                newestVersion = self.parseVersionFromInit(req.text)
-                # Check if conda is in path
-                if self.isCondaInPath():
-                    res = run(
-                        '{ca} {ve}'.format(
-                            ca=self.conda_activate, ve=self.virtual_environment
-                        ),
-                        shell=True,
-                        capture_output=True,
-                    )
-                    # Create environmnent if it does not exists (res.returncode == 1)
-                    if newestVersion != installedVersion and res.returncode == 1:
-                        returnValue = self.messageBox(
-                            None,
-                            u"A newer version of the tool was found. Would you like to install it now?",
-                            u"HazPy",
-                            0x1000 | 0x4,
-                        )
-                        if returnValue == 6:
-                            print('Updating tool...')
-                            self.updateTool()
-                            print('Creating the virtual environment...')
-                            self.create_conda_environment()
-                    if newestVersion == installedVersion and (
-                        res.returncode == 1 or b'Could not find' in res.stderr
-                    ):
-                        print('Creating the virtual environment...')
-                        self.create_conda_environment()
-                    # Update the environmnent if it already exists (res.returncode == 0)
-                    if newestVersion != installedVersion and res.returncode == 0:
-                        self.updateTool()
-                        self.update_environment()
-                else:
-                    print('Conda is needed to run this application.')
-                    # TODO: Add function to download miniforge
-            else:
-                print('Unable to connect to url: ' + self.tool_version_url)
+                return None
+        if req.status_code != 200:
+            return None
+        return self.parseVersionFromInit(req.text)
+
+    def recordNewestVersion(self, budget=None):
+        """Get the newest tool version & record it with the check time in the launcher cache
+
+        Args:
+            budget (float, optional): Time limit in seconds. Defaults to None (httpTimeout per request).
+
+        Returns:
+            str: Newest version (None if the release URL could not be reached)
+        """
+        try:
+            newestVersion = self.getNewestVersion(budget)
+        except Exception as e:
+            print(e)
+            newestVersion = None
+        if newestVersion is None:
+            print('Unable to connect to url: ' + self.tool_version_url)
+            return None
+        self.writeCache(newestVersion=newestVersion, lastUpdateCheck=time.time())
+        return newestVersion
+
+    def applyUpdate(self, newestVersion, installedVersion):
+        """Update the tool and create or update its conda environment as needed
+
+        Args:
+            newestVersion (str): Newest version from the release URL
+            installedVersion (str): Installed version
+        """
+        # Check if conda is in path
+        if self.isCondaInPath():
+            res = run(
+                '{ca} {ve}'.format(
+                    ca=self.conda_activate, ve=self.virtual_environment
+                ),
+                shell=True,
+                capture_output=True,
+            )
+            if res.returncode == 0 and b'Could not find' not in res.stderr:
+                self.writeCache(environment=self.virtual_environment)
+            # Create environmnent if it does not exists (res.returncode == 1)
+            if newestVersion != installedVersion and res.returncode == 1:
+                returnValue = self.messageBox(
+                    None,
+                    u"A newer version of the tool was found. Would you like to install it now?",
+                    u"HazPy",
+                    0x1000 | 0x4,
+                )
+                if returnValue == 6:
+                    print('Updating tool...')
+                    self.updateTool()
+                    print('Creating the virtual environment...')
+                    self.create_conda_environment()
+            if newestVersion == installedVersion and (
+                res.returncode == 1 or b'Could not find' in res.stderr
+            ):
+                print('Creating the virtual environment...')
+                self.create_conda_environment()
+            # Update the environmnent if it already exists (res.returncode == 0)
+            if newestVersion != installedVersion and res.returncode == 0:
+                self.updateTool()
+                self.update_environment()
+        else:
+            print('Conda is needed to run this application.')
+            # TODO: Add function to download miniforge
+
+    def checkForUpdates(self):
+        """Check the release URL for tool updates & apply them before starting the tool"""
+        print('Checking for tool updates')
+        try:
+            installedVersion = self.getInstalledVersion()
+            newestVersion = self.recordNewestVersion()
+            if newestVersion is not None:
+                self.applyUpdate(newestVersion, installedVersion)
+        except:
+            self.messageBox(
+                0,
+                'Unable to check for tool updates. If this error persists, contact hazus-support@riskmapcds.com for assistance.',
+                "HazPy",
+                0x1000 | 0x4,
+            )
+
+    def checkForUpdatesInBackground(self):
+        """Check for tool updates without delaying the application start
+
+        An update found by an earlier check (or an environment not verified
+        yet) is handled first, without network access. The release URL is then
+        checked in a daemon thread within updateCheckBudget seconds, at most once
+        per updateCheckInterval seconds; a newer version is offered at the next
+        launch.
+
+        Returns:
+            Thread: Background check (None if the last check is recent)
+        """
+        try:
+            installedVersion = self.getInstalledVersion()
+            newestVersion = self.cache.get('newestVersion', installedVersion)
+            if newestVersion != installedVersion or self.cache.get('environment') != self.virtual_environment:
+                self.applyUpdate(newestVersion, installedVersion)
         except:
             self.messageBox(
                 0,
@@ -182,6 +354,17 @@ class Manage:
                 "HazPy",
                 0x1000 | 0x4,
             )
+        if time.time() - self.cache.get('lastUpdateCheck', 0) < self.update_check_interval:
+            return None
+        print('Checking for tool updates')
+        self.update_thread = threading.Thread(
+            target=self.recordNewestVersion,
+            args=(self.update_check_budget,),
+            name='FAST update check',
+            daemon=True,
+        )
+        self.update_thread.start()
+        return self.update_thread
 
     def updateTool(self):
         try:
@@ -236,14 +419,17 @@ class Manage:
         else:
             return True
 
-    def handleProxy(self):
-        """[summary]
+    def handleProxy(self, timeout=None):
+        """Check the internet connection & set the FEMA proxy if it is only reachable through it
+
+        Args:
+            timeout (float, optional): Connection timeout in seconds. Defaults to None (httpTimeout).
 
         Returns:
-            [type]: [description]
+            bool or int: False (direct connection), True (proxy set) or -1 (no connection)
         """
         try:
-            socket.setdefaulttimeout(self.http_timeout)
+            socket.setdefaulttimeout(self.http_timeout if timeout is None else timeout)
             port = 80
             try:
                 # try without the proxy
@@ -279,12 +465,15 @@ class Manage:
         print('Starting the HAZUS FAST application...')
         if self.isCondaInPath():
             try:
-                run(
+                res = run(
                     '{ca} {ve} && python {ap}'.format(
                         ca=self.conda_activate, ve=self.virtual_environment, ap=app_path
                     ),
                     shell=True,
                 )
+                # Verify the environment again at the next launch
+                if res.returncode != 0:
+                    self.writeCache(environment=None)
             except Exception as e:
                 print(e)
                 error = str(sys.exc_info()[0])